@@ -0,0 +1,76 @@
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Cache de respostas em memória (por processo) com TTL e invalidação explícita.
+    Cada entrada guarda a versão dos dados (data_version) em que foi calculada:
+    quando a Etapa 3 termina uma carga e incrementa a versão, a entrada deixa de valer.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._invalidacoes = 0
+
+    @staticmethod
+    def make_etag(key, versao):
+        return f'"{key}-v{versao}"'
+
+    def get(self, key, versao):
+        """Retorna a entrada válida para a versão atual ou None (miss)."""
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada and entrada["versao"] == versao and entrada["expira_em"] > time.monotonic():
+                self._hits += 1
+                return entrada
+            self._misses += 1
+            return None
+
+    def versao_em_cache(self, key):
+        """Versão dos dados da entrada guardada (None se não houver entrada)."""
+        with self._lock:
+            entrada = self._entradas.get(key)
+            return entrada["versao"] if entrada else None
+
+    def set(self, key, versao, payload):
+        entrada = {
+            "versao": versao,
+            "etag": self.make_etag(key, versao),
+            "payload": payload,
+            "expira_em": time.monotonic() + self.ttl,
+        }
+        with self._lock:
+            self._entradas[key] = entrada
+        return entrada
+
+    def invalidate(self, key=None):
+        """Remove uma entrada (ou todas, se key for None)."""
+        with self._lock:
+            if key is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(key, None)
+            self._invalidacoes += 1
+
+    def registrar_304(self):
+        with self._lock:
+            self._not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "ttl_s": self.ttl,
+                "entries": len(self._entradas),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / total, 4) if total else 0.0,
+                "not_modified": self._not_modified,
+                "invalidations": self._invalidacoes,
+            }
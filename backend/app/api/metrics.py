@@ -0,0 +1,276 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from starlette.routing import Match
+from app.db.connection import get_pool_stats
+
+# Exposição no formato texto do Prometheus (versão 0.0.4), sem dependência extra
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ATIVO = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_LINHAS = (0, 1, 5, 10, 25, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_labels(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _formatar_valor(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    TIPO = None
+
+    def __init__(self, nome, descricao, labels=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.labels = tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, labels):
+        return tuple(labels.get(nome, "") for nome in self.labels)
+
+    def cabecalho(self):
+        return [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.TIPO}"]
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (ex: total de requisições)."""
+    TIPO = "counter"
+
+    def inc(self, valor=1, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def set_total(self, valor, **labels):
+        """Copia um total acumulado mantido fora do registro (ex: contadores do pool)."""
+        with self._lock:
+            self._valores[self._chave(labels)] = valor
+
+    def renderizar(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return self.cabecalho() + [
+            f"{self.nome}{_formatar_labels(self.labels, chave)} {_formatar_valor(v)}" for chave, v in itens]
+
+
+class Medidor(_Metrica):
+    """Valor que sobe e desce (ex: requisições em andamento, conexões em uso)."""
+    TIPO = "gauge"
+
+    def inc(self, valor=1, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def dec(self, valor=1, **labels):
+        self.inc(-valor, **labels)
+
+    def set(self, valor, **labels):
+        with self._lock:
+            self._valores[self._chave(labels)] = valor
+
+    renderizar = Contador.renderizar
+
+
+class Histograma(_Metrica):
+    """Distribuição em buckets cumulativos (latência, linhas por query) + soma e contagem."""
+    TIPO = "histogram"
+
+    def __init__(self, nome, descricao, labels=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nome, descricao, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, valor, **labels):
+        chave = self._chave(labels)
+        # Índice do primeiro bucket com limite >= valor (o +Inf é a contagem total)
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                estado = self._valores[chave] = [[0] * len(self.buckets), 0.0, 0]
+            if indice < len(self.buckets):
+                estado[0][indice] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    def renderizar(self):
+        with self._lock:
+            itens = sorted((chave, (list(b), s, n)) for chave, (b, s, n) in self._valores.items())
+        linhas = self.cabecalho()
+        for chave, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, qtd in zip(self.buckets, contagens):
+                acumulado += qtd
+                le = _formatar_labels(self.labels, chave, ("le", _formatar_valor(float(limite))))
+                linhas.append(f"{self.nome}_bucket{le} {acumulado}")
+            le = _formatar_labels(self.labels, chave, ("le", "+Inf"))
+            linhas.append(f"{self.nome}_bucket{le} {total}")
+            linhas.append(f"{self.nome}_sum{_formatar_labels(self.labels, chave)} {_formatar_valor(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_labels(self.labels, chave)} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """
+    Métricas do processo (por worker do uvicorn: cada processo expõe as suas).
+    coletores: funções chamadas a cada scrape para atualizar medidores (pool, cache).
+    """
+
+    def __init__(self):
+        self._metricas = []
+        self._coletores = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def coletor(self, funcao):
+        self._coletores.append(funcao)
+        return funcao
+
+    def renderizar(self):
+        for coletar in self._coletores:
+            try:
+                coletar()
+            except Exception as e:
+                print(f"⚠️ Falha ao coletar métricas: {e}")
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.renderizar())
+        return "\n".join(linhas) + "\n"
+
+
+registro = RegistroMetricas()
+
+# --- HTTP (middleware) ---
+http_requisicoes = registro.registrar(Contador(
+    "http_requests_total", "Requisições HTTP por rota, método e status.",
+    ("method", "route", "status")))
+http_latencia = registro.registrar(Histograma(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota (segundos).",
+    ("method", "route")))
+http_em_andamento = registro.registrar(Medidor(
+    "http_requests_in_flight", "Requisições HTTP em andamento por rota.",
+    ("method", "route")))
+
+# --- Banco (app.db.async_db) ---
+db_espera_conexao = registro.registrar(Histograma(
+    "db_pool_acquire_seconds", "Tempo para obter uma conexão do pool (segundos)."))
+db_latencia = registro.registrar(Histograma(
+    "db_query_duration_seconds", "Tempo de execução + fetch por query nomeada (segundos).",
+    ("query",)))
+db_linhas = registro.registrar(Histograma(
+    "db_query_rows", "Linhas retornadas por query nomeada.", ("query",), buckets=BUCKETS_LINHAS))
+db_erros = registro.registrar(Contador(
+    "db_query_errors_total", "Queries nomeadas que falharam.", ("query",)))
+
+# --- Pool de conexões (lido de get_pool_stats a cada scrape) ---
+db_pool = registro.registrar(Medidor(
+    "db_pool_connections", "Conexões do pool por estado (open, in_use, idle, max).", ("state",)))
+db_pool_eventos = registro.registrar(Contador(
+    "db_pool_events_total", "Eventos acumulados do pool (checkouts, timeouts, discarded).", ("event",)))
+
+
+@registro.coletor
+def _coletar_pool():
+    stats = get_pool_stats()
+    if stats is None:
+        return
+    for estado in ("open", "in_use", "idle", "max"):
+        db_pool.set(stats[estado], state=estado)
+    for evento in ("checkouts", "timeouts", "discarded"):
+        db_pool_eventos.set_total(stats[evento], event=evento)
+
+
+def observar_query(nome, espera, duracao, linhas=None, erro=False):
+    """Registra uma execução de query nomeada (chamado pelas threads do async_db)."""
+    if not ATIVO:
+        return
+    if espera is not None:
+        db_espera_conexao.observe(espera)
+    if duracao is None:
+        return
+    db_latencia.observe(duracao, query=nome)
+    if erro:
+        db_erros.inc(query=nome)
+    elif linhas is not None:
+        db_linhas.observe(linhas, query=nome)
+
+
+class MetricasMiddleware:
+    """
+    Middleware ASGI: contagem, latência e requisições em andamento por rota.
+    A rota é o template (/api/operadoras/{cnpj}/despesas), não a URL, para o número
+    de séries não crescer com cada CNPJ; caminhos sem rota entram como "<sem_rota>".
+    O template é resolvido uma vez por (método, caminho) e guardado em cache.
+    """
+    SEM_ROTA = "<sem_rota>"
+    # Limite do cache de rotas (caminhos com CNPJ variam muito): ao encher, recomeça vazio
+    MAX_ROTAS_CACHE = 10000
+
+    def __init__(self, app):
+        self.app = app
+        self._rotas = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ATIVO:
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        rota = self._rota(scope)
+        status = {"codigo": 500}
+
+        async def send_com_status(mensagem):
+            if mensagem["type"] == "http.response.start":
+                status["codigo"] = mensagem["status"]
+            await send(mensagem)
+
+        http_em_andamento.inc(method=metodo, route=rota)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            http_latencia.observe(time.perf_counter() - inicio, method=metodo, route=rota)
+            http_requisicoes.inc(method=metodo, route=rota, status=str(status["codigo"]))
+            http_em_andamento.dec(method=metodo, route=rota)
+
+    def _rota(self, scope):
+        chave = (scope["method"], scope["path"])
+        rota = self._rotas.get(chave)
+        if rota is None:
+            rota = self._resolver_rota(scope)
+            if len(self._rotas) >= self.MAX_ROTAS_CACHE:
+                self._rotas.clear()
+            self._rotas[chave] = rota
+        return rota
+
+    def _resolver_rota(self, scope):
+        # O roteamento acontece depois do middleware: casamos aqui com as rotas do app
+        # (PARTIAL = caminho certo com método errado, ex: 405)
+        app = scope.get("app")
+        parcial = self.SEM_ROTA
+        for rota in getattr(getattr(app, "router", None), "routes", []):
+            correspondencia, _ = rota.matches(scope)
+            if correspondencia == Match.FULL:
+                return getattr(rota, "path", self.SEM_ROTA)
+            if correspondencia == Match.PARTIAL and parcial == self.SEM_ROTA:
+                parcial = getattr(rota, "path", self.SEM_ROTA)
+        return parcial
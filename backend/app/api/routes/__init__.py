@@ -1,24 +1,105 @@
 # backend/app/api/routes/__init__.py
 
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import base64
+import json
+import os
+import re
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from typing import Optional, List
-from psycopg2.extras import RealDictCursor
-from app.db.connection import get_db_connection
+from app.api.cache import ResponseCache
+from app.api import metrics
+from app.db.connection import get_pool_stats
+from app.db.async_db import fetch_all, fetch_one, ping, DBConnectionError
 
 router = APIRouter()
 
+# Cache do Dashboard: os dados só mudam quando o ETL roda (a Etapa 3 incrementa data_version)
+estatisticas_cache = ResponseCache(ttl=float(os.getenv("ESTATISTICAS_CACHE_TTL", "300")))
+_estatisticas_lock = asyncio.Lock()
+
+cache_entradas = metrics.registro.registrar(metrics.Medidor(
+    "api_cache_entries", "Entradas guardadas no cache de respostas.", ("cache",)))
+cache_eventos = metrics.registro.registrar(metrics.Contador(
+    "api_cache_events_total", "Eventos acumulados do cache de respostas (hits, misses, not_modified, invalidations).",
+    ("cache", "event")))
+
+
+@metrics.registro.coletor
+def _coletar_cache():
+    stats = estatisticas_cache.stats()
+    cache_entradas.set(stats["entries"], cache="estatisticas")
+    for evento in ("hits", "misses", "not_modified", "invalidations"):
+        cache_eventos.set_total(stats[evento], cache="estatisticas", event=evento)
+
 # Constante para o CNPJ da Operadora "Unknown/Dummy"
 CNPJ_DUMMY = "00000000000000"
 
+
+def _encode_cursor(valores):
+    """Cursor opaco (base64 de JSON) com as chaves de ordenação da última linha."""
+    raw = json.dumps(valores, ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor, tamanho):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    if not isinstance(valores, list) or len(valores) != tamanho:
+        raise HTTPException(
+            status_code=400, detail="Cursor não corresponde à ordenação pedida.")
+    return valores
+
+
+def _escape_like(termo):
+    """Escapa os curingas do LIKE para o termo digitado ser literal."""
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _condicao_busca(search):
+    """
+    Monta o filtro de busca.
+    - Só dígitos (CNPJ / Registro ANS, com ou sem pontuação): prefixo, usa os índices text_pattern_ops.
+    - Texto: substring sem acento/caixa na razão social, servida pelo índice trigram (pg_trgm).
+    Retorna (condição, params, é_texto).
+    """
+    digitos = re.sub(r'[.\-/\s]', '', search)
+    if digitos.isdigit():
+        prefixo = _escape_like(digitos) + '%'
+        return "(cnpj LIKE %s OR registro_ans LIKE %s)", [prefixo, prefixo], False
+
+    term = '%' + _escape_like(search.strip()) + '%'
+    return "f_unaccent(lower(razao_social)) LIKE f_unaccent(lower(%s))", [term], True
+
+
+async def _contar(where_clause, params, count_mode):
+    """
+    Total de registros do filtro.
+    'exact' = COUNT(*), 'estimated' = estimativa do planner (EXPLAIN), 'none' = não conta.
+    """
+    if count_mode == 'none':
+        return None
+    if count_mode == 'estimated':
+        plano = await fetch_one(
+            f"EXPLAIN (FORMAT JSON) SELECT 1 FROM operadoras {where_clause}", params, nome="count_estimated")
+        return int(plano['QUERY PLAN'][0]['Plan']['Plan Rows'])
+    contagem = await fetch_one(
+        f"SELECT COUNT(*) as total FROM operadoras {where_clause}", params, nome="count")
+    return contagem['total']
+
 # --- ROTA DE SAÚDE DA API ---
 @router.get("/health", tags=["System"])
 async def health_check():
-    """Verifica se a API está online."""
-    conn = get_db_connection()
-    status = "connected" if conn else "error"
-    if conn:
-        conn.close()
-    return {"status": "healthy", "database": status}
+    """Verifica se a API está online (e expõe as métricas do pool de conexões)."""
+    status = "connected" if await ping() else "error"
+    return {
+        "status": "healthy",
+        "database": status,
+        "pool": get_pool_stats(),
+        "cache": {"estatisticas": estatisticas_cache.stats()}
+    }
 
 # --- ROTA 1: Listar Operadoras (Busca + Paginação + Filtros + Ordenação) ---
 
@@ -31,41 +112,52 @@ async def listar_operadoras(
     limit: int = Query(10, ge=1, le=100, description="Itens por página"),
     filter_type: str = Query(
         'todas', description="todas, com_dados, sem_dados, desconhecidas"),
-    sort_uf: Optional[str] = Query(None, description="asc, desc")
+    sort_uf: Optional[str] = Query(None, description="asc, desc"),
+    pagination: str = Query(
+        'offset', description="offset (page/limit) ou keyset (cursor)"),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor da página anterior (modo keyset)"),
+    count: str = Query(
+        'exact', description="exact, estimated, none")
 ):
     """
     Lista operadoras com suporte a busca, paginação, filtros e ordenação.
+    O modo keyset evita o OFFSET (páginas profundas custam o mesmo que a primeira)
+    e 'count' permite pular ou estimar o COUNT(*).
     """
-    conn = get_db_connection()
-    if not conn:
+    if pagination not in ('offset', 'keyset'):
+        raise HTTPException(
+            status_code=400, detail="pagination deve ser 'offset' ou 'keyset'.")
+    if count not in ('exact', 'estimated', 'none'):
         raise HTTPException(
-            status_code=500, detail="Erro de conexão com o banco.")
+            status_code=400, detail="count deve ser 'exact', 'estimated' ou 'none'.")
 
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         offset = (page - 1) * limit
 
         # 1. Construção Dinâmica do WHERE
         conditions = ["1=1"]  # Base verdadeira para concatenar ANDs
         params = []
 
-        # --- Filtro de Texto (Busca) - POSTGRES (ILIKE)  ---
-        if search:
-            conditions.append("(razao_social ILIKE %s OR cnpj ILIKE %s)")
-            term = f"%{search}%"
-            params.extend([term, term])
-            
+        # --- Filtro de Texto (Busca) - POSTGRES (pg_trgm / prefixo)  ---
+        busca_texto = False
+        if search and search.strip():
+            condicao, busca_params, busca_texto = _condicao_busca(search)
+            conditions.append(condicao)
+            params.extend(busca_params)
+
         # --- LÓGICA DE FILTROS  ---
         if filter_type == 'com_dados':
             # Retorna quem TEM registro E NÃO É a dummy
+            # (operadoras_atividade é mantida pela Etapa 3: lookup por PK, sem varrer despesas)
             conditions.append(
-                f"cnpj IN (SELECT DISTINCT cnpj_operadora FROM despesas) AND cnpj != '{CNPJ_DUMMY}'")
-            
+                f"EXISTS (SELECT 1 FROM operadoras_atividade a WHERE a.cnpj = operadoras.cnpj AND a.has_despesas) AND cnpj != '{CNPJ_DUMMY}'")
+
         elif filter_type == 'sem_dados':
             # Retorna quem NÃO TEM registro E NÃO É a dummy
             conditions.append(
-                f"cnpj NOT IN (SELECT DISTINCT cnpj_operadora FROM despesas) AND cnpj != '{CNPJ_DUMMY}'")
-            
+                f"NOT EXISTS (SELECT 1 FROM operadoras_atividade a WHERE a.cnpj = operadoras.cnpj AND a.has_despesas) AND cnpj != '{CNPJ_DUMMY}'")
+
         elif filter_type == 'desconhecidas':
             # [NOVO] Retorna APENAS a operadora dummy (que segura as despesas órfãs)
             conditions.append(f"cnpj = '{CNPJ_DUMMY}'")
@@ -73,25 +165,30 @@ async def listar_operadoras(
         else:  # 'todas'
             # Retorna todas, mas ESCONDE a dummy para não poluir a lista geral
             conditions.append(f"cnpj != '{CNPJ_DUMMY}'")
-            
+
         where_clause = " WHERE " + " AND ".join(conditions)
 
-        # 2. Contagem Total (Essencial para a paginação funcionar com filtro)
-        count_sql = f"SELECT COUNT(*) as total FROM operadoras {where_clause}"
-        cursor.execute(count_sql, params)
-        total_records = cursor.fetchone()['total']
+        if pagination == 'keyset':
+            return await _listar_keyset(
+                where_clause, params, limit, sort_uf, cursor, count)
 
-        # 3. Definição da Ordenação (ORDER BY)
+        # 2. Definição da Ordenação (ORDER BY)
         order_clause = "ORDER BY razao_social ASC"  # Padrão
+        order_params = []
 
         if sort_uf == 'asc':
             order_clause = "ORDER BY uf ASC, razao_social ASC"
         elif sort_uf == 'desc':
             order_clause = "ORDER BY uf DESC, razao_social ASC"
+        elif busca_texto:
+            # Relevância: nomes mais parecidos com o termo primeiro
+            order_clause = """ORDER BY similarity(f_unaccent(lower(razao_social)), f_unaccent(lower(%s))) DESC,
+                razao_social ASC"""
+            order_params = [search.strip()]
 
-        # 4. Busca Final Paginada
+        # 3. Busca Final Paginada
         sql = f"""
-            SELECT cnpj, razao_social, uf, modalidade 
+            SELECT cnpj, razao_social, uf, modalidade
             FROM operadoras
             {where_clause}
             {order_clause}
@@ -99,10 +196,19 @@ async def listar_operadoras(
         """
 
         # Adiciona params de limite e offset no final da lista
-        query_params = params + [limit, offset]
+        query_params = params + order_params + [limit, offset]
 
-        cursor.execute(sql, query_params)
-        operadoras = cursor.fetchall()
+        # 4. Contagem Total (Essencial para a paginação funcionar com filtro)
+        # COUNT e página são independentes: rodam ao mesmo tempo em duas conexões do pool
+        total_records, operadoras = await asyncio.gather(
+            _contar(where_clause, params, count),
+            fetch_all(sql, query_params, nome="page")
+        )
+
+        if total_records is None:
+            total_pages = None
+        else:
+            total_pages = (total_records + limit - 1) // limit if total_records > 0 else 1
 
         return {
             "data": operadoras,
@@ -110,14 +216,86 @@ async def listar_operadoras(
                 "total": total_records,
                 "page": page,
                 "limit": limit,
-                "total_pages": (total_records + limit - 1) // limit if total_records > 0 else 1
+                "total_pages": total_pages,
+                "count_mode": count
             }
         }
+    except HTTPException:
+        raise
+    except DBConnectionError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         print(f"Erro ao listar operadoras: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+
+
+async def _listar_keyset(where_clause, params, limit, sort_uf, cursor, count_mode):
+    """
+    Paginação por cursor (keyset): WHERE (chaves) > (última linha) ORDER BY chaves LIMIT n.
+    O cnpj entra como desempate para a ordenação ser total.
+    Aqui a busca não é ordenada por relevância (o cursor depende de chaves estáveis).
+    """
+    # COALESCE casa com os índices idx_ops_keyset / idx_ops_uf_keyset
+    razao = "COALESCE(razao_social, '')"
+    uf = "COALESCE(uf, '')"
+
+    if sort_uf == 'asc':
+        chaves = [uf, razao, "cnpj"]
+        order_clause = f"ORDER BY {uf} ASC, {razao} ASC, cnpj ASC"
+    elif sort_uf == 'desc':
+        chaves = [uf, razao, "cnpj"]
+        order_clause = f"ORDER BY {uf} DESC, {razao} ASC, cnpj ASC"
+    else:
+        chaves = [razao, "cnpj"]
+        order_clause = f"ORDER BY {razao} ASC, cnpj ASC"
+
+    page_where = where_clause
+    page_params = list(params)
+
+    if cursor:
+        valores = _decode_cursor(cursor, len(chaves))
+        if sort_uf == 'desc':
+            # Direções mistas: não dá para usar comparação de tupla direto
+            page_where += f" AND ({uf} < %s OR ({uf} = %s AND ({razao}, cnpj) > (%s, %s)))"
+            page_params.extend([valores[0], valores[0], valores[1], valores[2]])
+        else:
+            page_where += f" AND ({', '.join(chaves)}) > ({', '.join(['%s'] * len(chaves))})"
+            page_params.extend(valores)
+
+    # Pede uma linha a mais só para saber se existe próxima página
+    sql = f"""
+        SELECT cnpj, razao_social, uf, modalidade
+        FROM operadoras
+        {page_where}
+        {order_clause}
+        LIMIT %s
+    """
+
+    total_records, operadoras = await asyncio.gather(
+        _contar(where_clause, params, count_mode),
+        fetch_all(sql, page_params + [limit + 1], nome="page_keyset")
+    )
+
+    has_more = len(operadoras) > limit
+    operadoras = operadoras[:limit]
+
+    next_cursor = None
+    if has_more and operadoras:
+        ultima = operadoras[-1]
+        valores = [ultima['razao_social'] or '', ultima['cnpj']]
+        if sort_uf in ('asc', 'desc'):
+            valores.insert(0, ultima['uf'] or '')
+        next_cursor = _encode_cursor(valores)
+
+    return {
+        "data": operadoras,
+        "meta": {
+            "total": total_records,
+            "limit": limit,
+            "count_mode": count_mode,
+            "next_cursor": next_cursor
+        }
+    }
 
 # --- ROTA 2: Detalhes e Histórico da Operadora ---
 
@@ -127,150 +305,174 @@ async def obter_detalhes_operadora(cnpj: str):
     """
     Retorna detalhes cadastrais e histórico de despesas de uma operadora.
     """
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Erro de conexão.")
+    # 1. Dados Cadastrais (Usando %s)
+    sql_operadora = "SELECT * FROM operadoras WHERE cnpj = %s"
+
+    # 2. Histórico de Despesas (lido do rollup despesas_trimestrais)
+    params_despesas = (cnpj,)
+    if cnpj == CNPJ_DUMMY:
+        # --- VISÃO DETALHADA PARA DESCONHECIDAS --- (direto da quarentena, sem tocar na tabela fato)
+        # Mostra o 'codigo_origem' (REG_ANS) para sabermos quem são os 15 registros
+        sql_despesas = """
+            SELECT
+                ano,
+                trimestre,
+                codigo_origem as registro_ans_original,
+                valor_total as valor_despesa
+            FROM despesas_quarentena
+            ORDER BY ano DESC, trimestre DESC, valor_despesa DESC
+        """
+        params_despesas = None
+    else:
+        # VISÃO PADRÃO (Agrupada por Trimestre)
+        sql_despesas = """
+            SELECT
+                ano,
+                trimestre,
+                SUM(valor_total) as valor_despesa
+            FROM despesas_trimestrais
+            WHERE cnpj_operadora = %s
+            GROUP BY ano, trimestre
+            ORDER BY ano DESC, trimestre DESC
+        """
 
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # 1. Dados Cadastrais (Usando %s)
-        cursor.execute("SELECT * FROM operadoras WHERE cnpj = %s", (cnpj,))
-        op = cursor.fetchone()
-
-        if not op:
-            raise HTTPException(
-                status_code=404, detail="Operadora não encontrada")
-
-        # 2. Histórico de Despesas
-        if cnpj == CNPJ_DUMMY:
-            # --- VISÃO DETALHADA PARA DESCONHECIDAS ---
-            # Mostra o 'codigo_origem' (REG_ANS) para sabermos quem são os 15 registros
-            cursor.execute("""
-                SELECT 
-                    ano, 
-                    trimestre, 
-                    codigo_origem as registro_ans_original, 
-                    SUM(valor_despesa) as valor_despesa 
-                FROM despesas 
-                WHERE cnpj_operadora = %s 
-                GROUP BY ano, trimestre, codigo_origem
-                ORDER BY ano DESC, trimestre DESC, valor_despesa DESC
-            """, (cnpj,))
-        else:
-            # VISÃO PADRÃO (Agrupada por Trimestre)
-            cursor.execute("""
-                SELECT 
-                    ano, 
-                    trimestre, 
-                    SUM(valor_despesa) as valor_despesa 
-                FROM despesas 
-                WHERE cnpj_operadora = %s 
-                GROUP BY ano, trimestre
-                ORDER BY ano DESC, trimestre DESC
-            """, (cnpj,))
-
-        despesas = cursor.fetchall()
-        conn.close()
+        op, despesas = await asyncio.gather(
+            fetch_one(sql_operadora, (cnpj,), nome="detail"),
+            fetch_all(sql_despesas, params_despesas, nome="detail_despesas")
+        )
+    except DBConnectionError:
+        raise HTTPException(status_code=500, detail="Erro de conexão.")
 
-        return {
-            "operadora": op,
-            "despesas": despesas
-        }
-    finally:
-        conn.close()
+    if not op:
+        raise HTTPException(
+            status_code=404, detail="Operadora não encontrada")
+
+    return {
+        "operadora": op,
+        "despesas": despesas
+    }
 
 
 # --- ROTA 3: Estatísticas Gerais (Dashboard) ---
 
+async def _versao_dados():
+    """Versão atual dos dados (incrementada pela Etapa 3 ao fim de cada carga)."""
+    row = await fetch_one("SELECT versao FROM data_version WHERE id = 1", nome="data_version")
+    return row['versao'] if row else 0
+
+
 @router.get("/estatisticas", tags=["Dashboard"])
-async def obter_estatisticas():
+async def obter_estatisticas(request: Request, response: Response):
     """
     Retorna KPIs lendo da Tabela de Agregados (Data Mart).
-    Estratégia: Pré-cálculo (Opção C do teste).
-    Vantagem: Performance extrema (lê poucas linhas).
+    Estratégia: Pré-cálculo (Opção C do teste) + cache em memória por versão dos dados.
+    Vantagem: Performance extrema (lê poucas linhas) e 304 via ETag para o Dashboard.
     """
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Erro de conexão.")
-
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # 1. KPIs Globais (Apenas de operadoras válidas)
-        # Somamos os totais e tiramos a média das médias trimestrais
-        cursor.execute("""
-            SELECT 
-                SUM(total_despesas) as total_geral,
-                AVG(media_trimestral) as media_geral
-            FROM despesas_agregadas
-            WHERE razao_social != 'OPERADORA DESCONHECIDA / INATIVA'
-              AND uf != 'BR'
-        """)
-        kpis = cursor.fetchone()
-
-        # 2. Top 5 Operadoras (EXCLUI o Dummy para o ranking ser justo)
-        cursor.execute("""
-            SELECT razao_social, uf, total_despesas as total, desvio_padrao
-            FROM despesas_agregadas
-            WHERE razao_social != 'OPERADORA DESCONHECIDA / INATIVA'
-            ORDER BY total_despesas DESC
-            LIMIT 5
-        """)
-        top_5 = cursor.fetchall()
-
-        # 3. Distribuição por UF (Remove a UF 'BR' ou o nome da Dummy)
-        cursor.execute("""
-            SELECT uf, SUM(total_despesas) as total
-            FROM despesas_agregadas
-            WHERE uf != 'BR' 
-              AND razao_social != 'OPERADORA DESCONHECIDA / INATIVA'
-            GROUP BY uf
-            ORDER BY total DESC
-            LIMIT 5
-        """)
-        top_ufs = cursor.fetchall()
-
-        # --- Query 1 (Maior Crescimento % entre 1º e Último Tri) ---
-        # 4. Top Crescimento (EXCLUI o Dummy) 
-        cursor.execute("""
-            WITH limites AS (
-                SELECT MIN(ano * 10 + trimestre) as periodo_ini, 
-                       MAX(ano * 10 + trimestre) as periodo_fim 
-                FROM despesas
-            ),
-            valores_pontas AS (
-                SELECT 
-                    d.cnpj_operadora,
-                    SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_ini THEN d.valor_despesa ELSE 0 END) as vlr_inicial,
-                    SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_fim THEN d.valor_despesa ELSE 0 END) as vlr_final
-                FROM despesas d, limites l
-                WHERE d.cnpj_operadora != %s
-                GROUP BY d.cnpj_operadora
-            )
-            SELECT 
-                o.razao_social,
-                o.uf,
-                ROUND(((v.vlr_final - v.vlr_inicial) / NULLIF(v.vlr_inicial, 0)) * 100, 2) as crescimento_pct
-            FROM valores_pontas v
-            JOIN operadoras o ON v.cnpj_operadora = o.cnpj
-            WHERE v.vlr_inicial > 0
-            ORDER BY crescimento_pct DESC
-            LIMIT 5
-        """, (CNPJ_DUMMY,))
-        top_crescimento = cursor.fetchall()
-
-        return {
-            "kpis": {
-                "total_despesas": kpis['total_geral'] or 0,
-                "media_trimestral_media": kpis['media_geral'] or 0
-            },
-            "top_operadoras": top_5,
-            "distribuicao_uf": top_ufs,
-            "top_crescimento": top_crescimento  
-        }
+        versao = await _versao_dados()
+
+        # Nova carga do ETL desde o último cálculo: descarta o snapshot antigo
+        if estatisticas_cache.versao_em_cache("estatisticas") not in (None, versao):
+            estatisticas_cache.invalidate("estatisticas")
+
+        entrada = estatisticas_cache.get("estatisticas", versao)
+        if entrada is None:
+            # Evita que várias requisições simultâneas recalculem o mesmo snapshot
+            async with _estatisticas_lock:
+                entrada = estatisticas_cache.get("estatisticas", versao)
+                if entrada is None:
+                    payload = await _calcular_estatisticas()
+                    entrada = estatisticas_cache.set("estatisticas", versao, payload)
     except Exception as e:
         print(f"Erro estatisticas: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
\ No newline at end of file
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if entrada["etag"] in [t.strip() for t in if_none_match.split(",")]:
+        estatisticas_cache.registrar_304()
+        return Response(status_code=304, headers={"ETag": entrada["etag"]})
+
+    response.headers["ETag"] = entrada["etag"]
+    response.headers["Cache-Control"] = "no-cache"
+    return entrada["payload"]
+
+
+async def _calcular_estatisticas():
+    """Executa as 4 consultas do Dashboard (só roda em cache miss)."""
+    # 1. KPIs Globais (Apenas de operadoras válidas)
+    # Somamos os totais e tiramos a média das médias trimestrais
+    sql_kpis = """
+        SELECT
+            SUM(total_despesas) as total_geral,
+            AVG(media_trimestral) as media_geral
+        FROM despesas_agregadas
+        WHERE razao_social != 'OPERADORA DESCONHECIDA / INATIVA'
+          AND uf != 'BR'
+    """
+
+    # 2. Top 5 Operadoras (EXCLUI o Dummy para o ranking ser justo)
+    sql_top_5 = """
+        SELECT razao_social, uf, total_despesas as total, desvio_padrao
+        FROM despesas_agregadas
+        WHERE razao_social != 'OPERADORA DESCONHECIDA / INATIVA'
+        ORDER BY total_despesas DESC
+        LIMIT 5
+    """
+
+    # 3. Distribuição por UF (Remove a UF 'BR' ou o nome da Dummy)
+    sql_top_ufs = """
+        SELECT uf, SUM(total_despesas) as total
+        FROM despesas_agregadas
+        WHERE uf != 'BR'
+          AND razao_social != 'OPERADORA DESCONHECIDA / INATIVA'
+        GROUP BY uf
+        ORDER BY total DESC
+        LIMIT 5
+    """
+
+    # --- Query 1 (Maior Crescimento % entre 1º e Último Tri) ---
+    # 4. Top Crescimento (EXCLUI o Dummy)
+    sql_crescimento = """
+        WITH limites AS (
+            SELECT MIN(ano * 10 + trimestre) as periodo_ini,
+                   MAX(ano * 10 + trimestre) as periodo_fim
+            FROM despesas_trimestrais
+        ),
+        valores_pontas AS (
+            SELECT
+                d.cnpj_operadora,
+                SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_ini THEN d.valor_total ELSE 0 END) as vlr_inicial,
+                SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_fim THEN d.valor_total ELSE 0 END) as vlr_final
+            FROM despesas_trimestrais d, limites l
+            WHERE d.cnpj_operadora != %s
+            GROUP BY d.cnpj_operadora
+        )
+        SELECT
+            o.razao_social,
+            o.uf,
+            ROUND(((v.vlr_final - v.vlr_inicial) / NULLIF(v.vlr_inicial, 0)) * 100, 2) as crescimento_pct
+        FROM valores_pontas v
+        JOIN operadoras o ON v.cnpj_operadora = o.cnpj
+        WHERE v.vlr_inicial > 0
+        ORDER BY crescimento_pct DESC
+        LIMIT 5
+    """
+
+    # As 4 consultas são independentes: disparamos todas juntas
+    kpis, top_5, top_ufs, top_crescimento = await asyncio.gather(
+        fetch_one(sql_kpis, nome="kpis"),
+        fetch_all(sql_top_5, nome="top_5"),
+        fetch_all(sql_top_ufs, nome="top_ufs"),
+        fetch_all(sql_crescimento, (CNPJ_DUMMY,), nome="crescimento")
+    )
+
+    return {
+        "kpis": {
+            "total_despesas": kpis['total_geral'] or 0,
+            "media_trimestral_media": kpis['media_geral'] or 0
+        },
+        "top_operadoras": top_5,
+        "distribuicao_uf": top_ufs,
+        "top_crescimento": top_crescimento
+    }
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from psycopg2.extras import RealDictCursor
+from app.db.connection import get_db_connection, release_db_connection
+from app.api.metrics import observar_query
+
+
+class DBConnectionError(Exception):
+    """Nenhuma conexão disponível (banco fora do ar ou pool esgotado)."""
+
+
+def _executar(sql, params, modo, nome):
+    """
+    Executa a query em uma conexão do pool (roda fora do event loop).
+    'nome' identifica a query nas métricas (/metrics): espera pela conexão, tempo e linhas.
+    """
+    inicio = time.perf_counter()
+    conn = get_db_connection()
+    espera = time.perf_counter() - inicio
+    if not conn:
+        observar_query(nome, espera, None)
+        raise DBConnectionError("Erro de conexão com o banco.")
+    inicio = time.perf_counter()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(sql, params)
+            if modo == "one":
+                resultado = cursor.fetchone()
+                linhas = 0 if resultado is None else 1
+            else:
+                resultado = cursor.fetchall()
+                linhas = len(resultado)
+        observar_query(nome, espera, time.perf_counter() - inicio, linhas)
+        return resultado
+    except Exception:
+        observar_query(nome, espera, time.perf_counter() - inicio, erro=True)
+        raise
+    finally:
+        release_db_connection(conn)
+
+
+async def fetch_all(sql, params=None, nome="outra"):
+    """
+    Versão assíncrona de cursor.execute + fetchall.
+    O psycopg2 é bloqueante, então a query roda em uma thread e o event loop
+    do uvicorn continua atendendo as outras requisições enquanto isso.
+    """
+    return await asyncio.to_thread(_executar, sql, params, "all", nome)
+
+
+async def fetch_one(sql, params=None, nome="outra"):
+    """Versão assíncrona de cursor.execute + fetchone."""
+    return await asyncio.to_thread(_executar, sql, params, "one", nome)
+
+
+async def ping():
+    """Testa se é possível obter uma conexão do pool."""
+    def _ping():
+        inicio = time.perf_counter()
+        conn = get_db_connection()
+        observar_query("ping", time.perf_counter() - inicio, None)
+        release_db_connection(conn)
+        return conn is not None
+    return await asyncio.to_thread(_ping)
@@ -1,7 +1,12 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from html import unescape
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
+import re
+import threading
 import time
 
 class ANSScraper:
@@ -14,92 +19,178 @@ class ANSScraper:
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
 
+    # Downloads: paralelismo, tentativas e manifesto (ETag/Last-Modified/Content-Length por arquivo)
+    MAX_DOWNLOAD_WORKERS = int(os.getenv("ANS_DOWNLOAD_WORKERS", "4"))
+    MAX_TENTATIVAS = 3
+    BACKOFF_BASE = 2  # segundos (2, 4, 8...)
+    MANIFEST_NAME = ".download_manifest.json"
+
+    # Crawler das listagens de diretório (anos/subpastas)
+    MAX_CRAWL_WORKERS = int(os.getenv("ANS_CRAWL_WORKERS", "8"))
+    LISTING_CACHE_NAME = ".listing_cache.json"
+    # As listagens do portal são páginas simples de índice: um regex de href basta (sem montar DOM)
+    _HREF_RE = re.compile(r'<a\s[^>]*?href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+    _session = None
+    _session_lock = threading.Lock()
+    _manifest_lock = threading.Lock()
+    _listing_lock = threading.Lock()
+
+    @classmethod
+    def _get_session(cls):
+        """Sessão HTTP compartilhada (keep-alive: reaproveita as conexões com o portal)."""
+        with cls._session_lock:
+            if cls._session is None:
+                session = requests.Session()
+                session.headers.update(cls.HEADERS)
+                pool = max(cls.MAX_DOWNLOAD_WORKERS, cls.MAX_CRAWL_WORKERS)
+                adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._session = session
+            return cls._session
+
     @classmethod
-    def _get_soup(cls, url):
+    def _listar_links(cls, url, cache_dir=None):
         """
-        Retorna um objeto BeautifulSoup para a URL fornecida.
+        Retorna os hrefs da página de índice.
+        Com cache_dir, guarda a listagem em disco e revalida com GET condicional
+        (If-None-Match / If-Modified-Since): resposta 304 reaproveita a listagem salva.
         """
+        cache_path = os.path.join(cache_dir, cls.LISTING_CACHE_NAME) if cache_dir else None
+        registro = {}
+        if cache_path:
+            with cls._listing_lock:
+                registro = cls._carregar_manifesto(cache_path).get(url, {})
+
+        headers = {}
+        if registro.get('etag'):
+            headers['If-None-Match'] = registro['etag']
+        if registro.get('last_modified'):
+            headers['If-Modified-Since'] = registro['last_modified']
+
         try:
-            response = requests.get(url, headers=cls.HEADERS, timeout=15)
+            response = cls._get_session().get(url, headers=headers, timeout=15)
+            if response.status_code == 304 and 'links' in registro:
+                return registro['links']
             response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
         except requests.exceptions.RequestException as e:
             print(f"❌ Erro de conexão ao aceder a {url}: {e}")
             raise
 
+        links = [unescape(h) for h in cls._HREF_RE.findall(response.text)]
+
+        if cache_path and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            with cls._listing_lock:
+                cache = cls._carregar_manifesto(cache_path)
+                cache[url] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'links': links,
+                }
+                tmp = cache_path + ".tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, ensure_ascii=False)
+                os.replace(tmp, cache_path)
+        return links
+
+    @classmethod
+    def _listar_varios(cls, urls, cache_dir):
+        """Busca várias listagens em paralelo. Retorna {url: links ou a exceção}."""
+        def _seguro(url):
+            try:
+                return cls._listar_links(url, cache_dir)
+            except Exception as e:
+                return e
+
+        if not urls:
+            return {}
+        workers = max(1, min(cls.MAX_CRAWL_WORKERS, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(urls, executor.map(_seguro, urls)))
+
     @classmethod
-    def identificar_arquivos_trimestrais(cls, base_url):
+    def identificar_arquivos_trimestrais(cls, base_url, n_trimestres=3, cache_dir=None):
         """
         Identifica os arquivos trimestrais mais recentes disponíveis no portal da ANS.
+        As listagens dos anos (e das subpastas) são buscadas em paralelo, em janelas
+        de MAX_CRAWL_WORKERS anos; a seleção final segue a mesma ordem da busca sequencial.
         """
         print(f"📂 Scraper: Explorando portal ANS em: {base_url}")
         try:
-            soup = cls._get_soup(base_url)
+            links_raiz = cls._listar_links(base_url, cache_dir)
 
             # 1. Identificar anos (Ex: 2025, 2024...)
-            links_raiz = [a['href'] for a in soup.find_all('a', href=True)]
             anos = sorted([l for l in links_raiz if l.strip(
                 '/').isdigit() and len(l.strip('/')) == 4], reverse=True)
 
             arquivos_para_baixar = []
 
-            for ano in anos:
-                if len(arquivos_para_baixar) >= 3:
+            for i in range(0, len(anos), cls.MAX_CRAWL_WORKERS):
+                if len(arquivos_para_baixar) >= n_trimestres:
                     break
 
-                url_ano = urljoin(base_url, ano)
-                if not url_ano.endswith('/'):
-                    url_ano += '/'
+                janela = []
+                for ano in anos[i:i + cls.MAX_CRAWL_WORKERS]:
+                    url_ano = urljoin(base_url, ano)
+                    if not url_ano.endswith('/'):
+                        url_ano += '/'
+                    janela.append((ano, url_ano))
+
+                listagens = cls._listar_varios([u for _, u in janela], cache_dir)
 
-                print(f"  📂 Acedendo ano: {ano.strip('/')}")
+                for ano, url_ano in janela:
+                    if len(arquivos_para_baixar) >= n_trimestres:
+                        break
 
-                try:
-                    soup_ano = cls._get_soup(url_ano)
-                    links_ano = soup_ano.find_all('a', href=True)
+                    print(f"  📂 Acedendo ano: {ano.strip('/')}")
+                    links_ano = listagens[url_ano]
+                    if isinstance(links_ano, Exception):
+                        print(f"    ⚠️ Falha ao processar o ano {ano}: {links_ano}")
+                        continue
 
                     # Procura ZIPs que contenham 'T' (ex: 1T2025.zip) diretamente no ano
                     zips = sorted([
-                        urljoin(url_ano, l['href'])
-                        for l in links_ano if l['href'].lower().endswith('.zip') and 'T' in l['href'].upper()
+                        urljoin(url_ano, l)
+                        for l in links_ano if l.lower().endswith('.zip') and 'T' in l.upper()
                     ], reverse=True)
 
                     for z in zips:
-                        if len(arquivos_para_baixar) >= 3:
+                        if len(arquivos_para_baixar) >= n_trimestres:
                             break
                         arquivos_para_baixar.append(z)
                         print(
                             f"    ✅ Arquivo identificado: {z.split('/')[-1]}")
 
-                    # Se não achou 3, tenta subpastas (Resiliência)
-                    if len(arquivos_para_baixar) < 3:
-                        subpastas = [l['href'] for l in links_ano if l['href'].endswith(
-                            '/') and not l['href'].startswith('.')]
-                        for sub in sorted(subpastas, reverse=True):
-                            if len(arquivos_para_baixar) >= 3:
+                    # Se não achou o suficiente, tenta subpastas (Resiliência)
+                    if len(arquivos_para_baixar) < n_trimestres:
+                        subpastas = sorted([l for l in links_ano if l.endswith(
+                            '/') and not l.startswith('.')], reverse=True)
+                        urls_sub = [urljoin(url_ano, sub) for sub in subpastas]
+                        listagens_sub = cls._listar_varios(urls_sub, cache_dir)
+
+                        for sub, url_sub in zip(subpastas, urls_sub):
+                            if len(arquivos_para_baixar) >= n_trimestres:
                                 break
 
-                            url_sub = urljoin(url_ano, sub)
                             print(
                                 f"    🔍 Explorando subpasta: {sub.strip('/')}")
-                            try:
-                                soup_sub = cls._get_soup(url_sub)
-                                zips_sub = [urljoin(url_sub, z['href']) for z in soup_sub.find_all(
-                                    'a', href=True) if z['href'].lower().endswith('.zip')]
-                                for zs in zips_sub:
-                                    if len(arquivos_para_baixar) >= 3:
-                                        break
-                                    arquivos_para_baixar.append(zs)
-                                    print(
-                                        f"      ✅ Arquivo encontrado: {zs.split('/')[-1]}")
-                            except Exception as e:
+                            links_sub = listagens_sub[url_sub]
+                            if isinstance(links_sub, Exception):
                                 print(
-                                    f"      ⚠️ Falha ao explorar subpasta {sub}: {e}")
-
-                except Exception as e:
-                    print(f"    ⚠️ Falha ao processar o ano {ano}: {e}")
-                    continue
+                                    f"      ⚠️ Falha ao explorar subpasta {sub}: {links_sub}")
+                                continue
+
+                            zips_sub = [urljoin(url_sub, z)
+                                        for z in links_sub if z.lower().endswith('.zip')]
+                            for zs in zips_sub:
+                                if len(arquivos_para_baixar) >= n_trimestres:
+                                    break
+                                arquivos_para_baixar.append(zs)
+                                print(
+                                    f"      ✅ Arquivo encontrado: {zs.split('/')[-1]}")
 
-            return arquivos_para_baixar[:3]
+            return arquivos_para_baixar[:n_trimestres]
 
         except Exception as e:
             print(f"💥 Erro crítico na identificação dos trimestres: {e}")
@@ -118,14 +209,12 @@ class ANSScraper:
 
         try:
             # 1. Acessa a pasta para ver o que tem dentro
-            soup = cls._get_soup(url_base_cadop)
+            links = cls._listar_links(url_base_cadop, data_dir)
 
             # 2. Procura links que terminam em .csv (ou .CSV)
-            links = soup.find_all('a', href=True)
             csv_link = None
 
-            for link in links:
-                href = link['href']
+            for href in links:
                 # Filtro simples: deve ser CSV e geralmente tem "Relatorio" ou "Cadop" no nome
                 if href.lower().endswith('.csv') and 'relatorio' in href.lower():
                     csv_link = href
@@ -133,9 +222,9 @@ class ANSScraper:
 
             # Fallback: Se não achou com "relatorio", pega o primeiro CSV que encontrar
             if not csv_link:
-                for link in links:
-                    if link['href'].lower().endswith('.csv'):
-                        csv_link = link['href']
+                for href in links:
+                    if href.lower().endswith('.csv'):
+                        csv_link = href
                         break
 
             if not csv_link:
@@ -158,9 +247,10 @@ class ANSScraper:
         return None
 
     @classmethod
-    def baixar_arquivos(cls, urls, data_dir):
+    def baixar_arquivos(cls, urls, data_dir, max_workers=None):
         """
         Realiza o download dos arquivos identificados para a pasta data/.
+        Os downloads rodam em paralelo (threads) e a ordem do retorno segue a ordem das URLs.
         """
         if not urls:
             print("⚠️ Nenhuma URL encontrada para download.")
@@ -169,32 +259,150 @@ class ANSScraper:
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
 
-        baixados = []
-        for url in urls:
-            nome_arquivo = url.split("/")[-1]
-            caminho_local = os.path.join(data_dir, nome_arquivo)
+        destinos = [os.path.join(data_dir, url.split("/")[-1]) for url in urls]
+        workers = max(1, min(max_workers or cls.MAX_DOWNLOAD_WORKERS, len(urls)))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resultados = list(executor.map(cls._download_file, urls, destinos))
 
-            if cls._download_file(url, caminho_local):
-                baixados.append(caminho_local)
-        return baixados
+        return [destino for destino, ok in zip(destinos, resultados) if ok]
         
 
     @classmethod
     def _download_file(cls, url, destino):
-        """Método auxiliar DRY para downloads."""
+        """
+        Método auxiliar DRY para downloads.
+        - Pula o arquivo se o servidor informar os mesmos ETag/Last-Modified/Content-Length do manifesto.
+        - Retoma downloads parciais (.part) com HTTP Range.
+        - Tenta novamente com backoff exponencial em caso de falha.
+        """
+        nome = os.path.basename(destino)
+        session = cls._get_session()
+
+        # 1. Metadados remotos (HEAD) para decidir se precisa baixar
+        remoto = {}
         try:
-            print(f"📥 Baixando: {os.path.basename(destino)}...")
-            # Stream=True para lidar com ficheiros grandes sem estourar a RAM
-            with requests.get(url, stream=True, headers=cls.HEADERS, timeout=30) as r:
-                r.raise_for_status()
-                with open(destino, 'wb') as f:
-                    # 1MB chunks
-                    for chunk in r.iter_content(chunk_size=1024 * 1024):
-                        if chunk:
-                            f.write(chunk)           
-            print(f"    💾 Guardado em: {destino}")
+            head = session.head(url, timeout=15, allow_redirects=True)
+            if head.ok:
+                remoto = cls._extrair_validadores(head.headers)
+        except requests.exceptions.RequestException:
+            pass  # Sem HEAD, baixamos normalmente
+
+        if remoto and cls._arquivo_atualizado(destino, remoto):
+            print(f"⏭️ Já atualizado (manifesto): {nome}")
             return True
-        except Exception as e:
-            print(f"❌ Falha ao baixar {os.path.basename(destino)}: {e}")
+
+        parcial = destino + ".part"
+        for tentativa in range(1, cls.MAX_TENTATIVAS + 1):
+            try:
+                print(f"📥 Baixando: {nome}..." if tentativa == 1 else
+                      f"🔁 Tentativa {tentativa}/{cls.MAX_TENTATIVAS}: {nome}...")
+
+                headers = {}
+                ja_baixado = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+                if ja_baixado:
+                    headers['Range'] = f"bytes={ja_baixado}-"
+                    # If-Range: se o arquivo mudou no servidor, ele devolve 200 com o arquivo inteiro
+                    if remoto.get('etag') or remoto.get('last_modified'):
+                        headers['If-Range'] = remoto.get('etag') or remoto.get('last_modified')
+
+                # Stream=True para lidar com ficheiros grandes sem estourar a RAM
+                with session.get(url, stream=True, headers=headers, timeout=30) as r:
+                    if r.status_code == 416:
+                        # Range além do fim: o .part já está completo (ou inválido) -> recomeça
+                        os.remove(parcial)
+                        raise requests.exceptions.RequestException("Range inválido, reiniciando download")
+                    r.raise_for_status()
+
+                    modo = 'ab' if r.status_code == 206 else 'wb'
+                    if modo == 'ab':
+                        print(f"    ⏯️ Retomando de {ja_baixado / (1024 * 1024):.1f} MB")
+                    with open(parcial, modo) as f:
+                        # 1MB chunks
+                        for chunk in r.iter_content(chunk_size=1024 * 1024):
+                            if chunk:
+                                f.write(chunk)
+
+                    if not remoto:
+                        remoto = cls._extrair_validadores(r.headers) if r.status_code == 200 else {}
+
+                # Confere o tamanho final quando o servidor informa
+                esperado = remoto.get('content_length')
+                if esperado is not None and os.path.getsize(parcial) != esperado:
+                    raise IOError(
+                        f"tamanho {os.path.getsize(parcial)} != {esperado} bytes")
+
+                os.replace(parcial, destino)
+                cls._registrar_no_manifesto(destino, remoto)
+                print(f"    💾 Guardado em: {destino}")
+                return True
+            except Exception as e:
+                if tentativa == cls.MAX_TENTATIVAS:
+                    print(f"❌ Falha ao baixar {nome}: {e}")
+                    return False
+                espera = cls.BACKOFF_BASE ** tentativa
+                print(f"    ⚠️ Erro em {nome} ({e}). Nova tentativa em {espera}s...")
+                time.sleep(espera)
+        return False
+
+
+    @staticmethod
+    def _extrair_validadores(headers):
+        validadores = {}
+        if headers.get('ETag'):
+            validadores['etag'] = headers['ETag']
+        if headers.get('Last-Modified'):
+            validadores['last_modified'] = headers['Last-Modified']
+        # Content-Length de respostas comprimidas não é o tamanho do arquivo
+        if headers.get('Content-Length') and not headers.get('Content-Encoding'):
+            validadores['content_length'] = int(headers['Content-Length'])
+        return validadores
+
+
+    @classmethod
+    def _manifest_path(cls, destino):
+        return os.path.join(os.path.dirname(destino), cls.MANIFEST_NAME)
+
+
+    @classmethod
+    def _carregar_manifesto(cls, caminho):
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+    @classmethod
+    def _arquivo_atualizado(cls, destino, remoto):
+        """O arquivo local existe e o servidor devolveu os mesmos validadores do último download?"""
+        if not os.path.exists(destino):
+            return False
+        with cls._manifest_lock:
+            registro = cls._carregar_manifesto(cls._manifest_path(destino)).get(os.path.basename(destino))
+        if not registro:
+            return False
+        if remoto.get('content_length') is not None and os.path.getsize(destino) != remoto['content_length']:
             return False
+        # Exige pelo menos um validador forte (ETag ou Last-Modified) e que todos os informados batam
+        chaves = [k for k in ('etag', 'last_modified', 'content_length') if k in remoto]
+        if not any(k in remoto for k in ('etag', 'last_modified')):
+            return False
+        return all(registro.get(k) == remoto[k] for k in chaves)
+
+
+    @classmethod
+    def _registrar_no_manifesto(cls, destino, remoto):
+        caminho = cls._manifest_path(destino)
+        with cls._manifest_lock:
+            manifesto = cls._carregar_manifesto(caminho)
+            manifesto[os.path.basename(destino)] = {
+                **remoto,
+                'tamanho_local': os.path.getsize(destino),
+                'baixado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            tmp = caminho + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, caminho)
 
@@ -11,65 +11,106 @@ try:
     from app.services.step1_etl import Step1ETL
     from app.services.step2_transformation import Step2Transformation
     from app.services.step3_db_ingestion import Step3DBIngestion
+    from app.services.pipeline_manifest import PipelineManifest
+    from app.services.pipeline_dag import PipelineDAG, Tarefa
+    from app.services.ans_scrapper import ANSScraper
+    from app.services.cadop_index import CadopIndex
+    from app.services.pipeline_profiler import PipelineProfiler
 except ImportError:
     # Fallback para importação direta se estiver rodando scripts soltos (menos comum, mas seguro)
     from step1_etl import Step1ETL
     from step2_transformation import Step2Transformation
     from step3_db_ingestion import Step3DBIngestion
+    from pipeline_manifest import PipelineManifest
+    from pipeline_dag import PipelineDAG, Tarefa
+    from ans_scrapper import ANSScraper
+    from cadop_index import CadopIndex
+    from pipeline_profiler import PipelineProfiler
 
 
 
 class ANSService:
     """
     Orquestrador Central do Pipeline.
-    Responsável por executar a Etapa 1 e, se bem-sucedida, a Etapa 2.
+    As etapas viram tarefas de um grafo (PipelineDAG): cada uma declara dependências e arquivos
+    de entrada/saída, tarefas independentes rodam em paralelo e uma tarefa cujas entradas não
+    mudaram desde a última execução bem-sucedida é pulada.
+
+        zips ──────────► consolidar ──┐
+        cadop ──► indice_cadop ───────┼──► transformar ──┐
+        banco ────────────────────────┴──► operadoras ───┴──► fatos
     """
 
+    @classmethod
+    def montar_tarefas(cls):
+        data_dir = Step1ETL.DATA_DIR
+        arquivo_cadop = os.path.join(data_dir, "Relatorio_Cadop.csv")
+
+        def consolidar(r):
+            Step1ETL.consolidar(r['zips'])
+            # Verificação de segurança: Se o consolidado (CSV ou Parquet) não foi gerado, não adianta ir para a etapa 2
+            arquivo_consolidado = os.path.join(data_dir, "consolidado_despesas.csv")
+            if not os.path.exists(arquivo_consolidado) and not os.path.exists(Step1ETL.PARQUET_CONSOLIDADO):
+                print("❌ Erro Crítico: O arquivo consolidado não foi gerado na Etapa 1.")
+                return False
+
+        def indice_cadop(r):
+            if not r['cadop']:
+                return False
+            CadopIndex.carregar(r['cadop'])
+
+        def transformar(r):
+            return Step2Transformation.execute(caminho_cadop=r['cadop'])
+
+        return [
+            # Downloads (sempre rodam: o manifesto de downloads já pula o que não mudou no servidor)
+            Tarefa("zips", lambda r: Step1ETL.baixar_zips()),
+            Tarefa("cadop", lambda r: ANSScraper.baixar_cadop(data_dir, Step2Transformation.URL_CADOP)),
+            # Etapa 1: só trimestres novos/alterados (manifesto do pipeline)
+            Tarefa("consolidar", consolidar, depende=["zips"]),
+            Tarefa("indice_cadop", indice_cadop, depende=["cadop"],
+                   entradas=[arquivo_cadop], saidas=[arquivo_cadop + CadopIndex.SUFIXO]),
+            # Etapa 2: pulada se o consolidado e o CADOP não mudaram desde a última transformação
+            Tarefa("transformar", transformar, depende=["consolidar", "indice_cadop"],
+                   entradas=[Step2Transformation.PARQUET_CONSOLIDADO, arquivo_cadop],
+                   saidas=[Step2Transformation.PARQUET_ENRIQUECIDO, Step2Transformation.PARQUET_AGREGADO]),
+            # Etapa 3: operadoras só precisam do CADOP (rodam junto com a Etapa 2)
+            Tarefa("banco", lambda r: Step3DBIngestion.preparar_banco()),
+            Tarefa("operadoras", lambda r: Step3DBIngestion.processar_e_inserir_operadoras(),
+                   depende=["banco", "indice_cadop"]),
+            Tarefa("fatos", lambda r: Step3DBIngestion.carregar_fatos(),
+                   depende=["transformar", "operadoras"]),
+        ]
+
     @classmethod
     def executar_pipeline_completo(cls):
         print("========================================================")
         print("🏁 INICIANDO PIPELINE DE DADOS DA EMPRESA_X")
+        # Incremental: só trimestres com ZIP novo/alterado passam pelas etapas (manifesto em data/)
+        modo = "incremental" if PipelineManifest.INCREMENTAL else "completo"
+        print(f"   Modo: {modo} (PIPELINE_INCREMENTAL)")
         print("========================================================\n")
 
-        # --- ETAPA 1: ETL (Extração e Consolidação Bruta) ---
-        try:
-            print(">>> EXECUTANDO ETAPA 1: Integração ANS e Consolidação")
-            Step1ETL.execute()
-
-            # Verificação de segurança: Se o arquivo não foi gerado, não adianta ir para a etapa 2
-            arquivo_consolidado = os.path.join(
-                Step1ETL.DATA_DIR, "consolidado_despesas.csv")
-            if not os.path.exists(arquivo_consolidado):
-                print("❌ Erro Crítico: O arquivo consolidado não foi gerado na Etapa 1.")
-                return
-
-        except Exception as e:
-            print(f"❌ Falha fatal na Etapa 1: {e}")
-            return  # Interrompe tudo
-
-        print("\n--------------------------------------------------------\n")
-
-        # --- ETAPA 2: Transformação (Enriquecimento e Agregação) ---
-        try:
-            print(">>> EXECUTANDO ETAPA 2: Transformação e Enriquecimento (CADOP)")
-            Step2Transformation.execute()
-        except Exception as e:
-            print(f"❌ Falha fatal na Etapa 2: {e}")
-            return
-
-        print("\n--------------------------------------------------------\n")
-        # --- ETAPA 3: Ingestão no Banco de Dados ---
-        try:
-            print(">>> EXECUTANDO ETAPA 3: Ingestão no Banco de Dados")
-            Step3DBIngestion.execute()
-        except Exception as e:
-            print(f"❌ Falha fatal na Etapa 3: {e}")
-            return
+        PipelineProfiler.iniciar_execucao(Step1ETL.DATA_DIR)
+        dag = PipelineDAG(cls.montar_tarefas(),
+                          dir_carimbos=os.path.join(Step1ETL.DATA_DIR, ".pipeline_dag"))
+        sucesso = dag.executar()
 
+        print("\n--------------------------------------------------------")
+        print("📋 Resumo das tarefas:")
+        print(dag.resumo())
+        # Tempo, CPU, memória, linhas e bytes por etapa/sub-etapa (PIPELINE_PROFILING)
+        relatorio = PipelineProfiler.salvar_relatorio()
+        if relatorio:
+            print(f"⏱️ Relatório de profiling: {relatorio}")
 
         print("\n========================================================")
-        print("✨ PIPELINE FINALIZADO COM SUCESSO! ✨")
+        if sucesso:
+            print("✨ PIPELINE FINALIZADO COM SUCESSO! ✨")
+        else:
+            print("❌ PIPELINE INTERROMPIDO: veja as tarefas com falha acima.")
         print("========================================================")
+        return sucesso
 
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+import pandas as pd
+
+try:
+    from csv_reader import CSVReader
+except ImportError:
+    from app.services.csv_reader import CSVReader
+
+
+class CadopIndex:
+    """
+    Dimensão de operadoras montada a partir do CADOP (Relatorio_Cadop.csv), compartilhada pelas Etapas 2 e 3.
+    - Limpeza (regex de CNPJ/Registro ANS, mapeamento de colunas) feita uma vez por versão do arquivo.
+    - Serializada ao lado do CSV (Relatorio_Cadop.idx.pkl) e refeita só quando o sha256 do CADOP muda.
+    - Em memória por processo: no pipeline completo a Etapa 3 reaproveita o índice da Etapa 2.
+    """
+    SUFIXO = ".idx.pkl"
+    # Incrementar quando as colunas/limpeza mudarem (invalida os índices já gravados)
+    VERSAO_FORMATO = 1
+
+    # Colunas da dimensão = colunas da tabela operadoras
+    COLUNAS = [
+        'registro_ans', 'cnpj', 'razao_social', 'nome_fantasia',
+        'modalidade', 'logradouro', 'numero', 'complemento',
+        'bairro', 'cidade', 'uf', 'cep', 'telefone', 'email'
+    ]
+    # Colunas opcionais do CSV (palavra-chave no nome da coluna)
+    EXTRAS = {
+        'logradouro': 'LOGRADOURO', 'numero': 'NUMERO',
+        'complemento': 'COMPLEMENTO', 'bairro': 'BAIRRO',
+        'cidade': 'CIDADE', 'cep': 'CEP',
+        'telefone': 'TELEFONE', 'email': 'ELETRONICO'  # Endereco_eletronico
+    }
+
+    _memoria = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def carregar(cls, caminho_cadop):
+        """DataFrame da dimensão (uma linha por CNPJ), do cache em memória, do disco ou reconstruído."""
+        stat = os.stat(caminho_cadop)
+        chave = (os.path.abspath(caminho_cadop), stat.st_size, stat.st_mtime_ns)
+        # Uma carga por vez: as Etapas 2 e 3 podem pedir o índice ao mesmo tempo (orquestrador)
+        with cls._lock:
+            if chave not in cls._memoria:
+                cls._memoria = {chave: cls._carregar_ou_construir(caminho_cadop)}
+            return cls._memoria[chave]
+
+    @classmethod
+    def _carregar_ou_construir(cls, caminho_cadop):
+        assinatura = cls._hash(caminho_cadop)
+        caminho_idx = caminho_cadop + cls.SUFIXO
+        dim = cls._ler_indice(caminho_idx, assinatura)
+        if dim is None:
+            print("🗂️ Montando índice de operadoras a partir do CADOP...")
+            dim = cls._construir(caminho_cadop)
+            tmp = caminho_idx + ".tmp"
+            pd.to_pickle({'versao': cls.VERSAO_FORMATO, 'sha256': assinatura, 'dim': dim}, tmp)
+            os.replace(tmp, caminho_idx)
+        else:
+            print("🗂️ Índice de operadoras reaproveitado (CADOP não mudou).")
+        return dim
+
+    @classmethod
+    def _ler_indice(cls, caminho_idx, assinatura):
+        try:
+            salvo = pd.read_pickle(caminho_idx)
+        except Exception:
+            return None
+        if salvo.get('versao') != cls.VERSAO_FORMATO or salvo.get('sha256') != assinatura:
+            return None
+        return salvo['dim']
+
+    @staticmethod
+    def _hash(caminho):
+        h = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(bloco)
+        return h.hexdigest()
+
+    @classmethod
+    def _construir(cls, caminho_cadop):
+        # Lendo CADOP com tratamento de encoding para corrigir o "SAÚDE"
+        # (UTF-8 ou Latin-1, detectado uma vez e em cache)
+        cadop = CSVReader.ler(caminho_cadop, sep=';', quotechar='"')
+
+        # Normalização de Colunas
+        cadop.columns = [c.upper().strip() for c in cadop.columns]
+
+        # Mapeamento Inteligente das Colunas (Acha a coluna certa mesmo se o nome variar)
+        try:
+            col_cnpj = next(c for c in cadop.columns if 'CNPJ' in c)
+            col_razao = next(c for c in cadop.columns if 'RAZAO' in c or 'RAZÃO' in c)
+            # Pega REGISTRO_OPERADORA mas evita DATA_REGISTRO
+            col_reg = next(c for c in cadop.columns if 'REGISTRO' in c and 'DATA' not in c)
+            col_mod = next(c for c in cadop.columns if 'MODALIDADE' in c)
+            col_uf = next(c for c in cadop.columns if 'UF' in c)
+        except StopIteration:
+            raise ValueError("Colunas obrigatórias não encontradas no CADOP.")
+
+        # Limpeza Crítica de Strings
+        dim = pd.DataFrame()
+        dim['registro_ans'] = cadop[col_reg].str.replace(r'\D', '', regex=True).str.zfill(6)
+        dim['cnpj'] = cadop[col_cnpj].str.replace(r'\D', '', regex=True).str.zfill(14)
+        dim['razao_social'] = cadop[col_razao]
+        dim['modalidade'] = cadop[col_mod]
+        dim['uf'] = cadop[col_uf]
+
+        for db_col, csv_keyword in cls.EXTRAS.items():
+            csv_col = next((c for c in cadop.columns if csv_keyword in c), None)
+            dim[db_col] = cadop[csv_col] if csv_col else None
+
+        # Colunas que não existem no CSV
+        dim['nome_fantasia'] = None
+        # CNPJ é a PK da tabela operadoras
+        dim = dim.drop_duplicates(subset=['cnpj'])
+        # Strings Arrow viram object: o pickle não depende do pyarrow para ser lido
+        return dim[cls.COLUNAS].astype(object).reset_index(drop=True)
+
+    @classmethod
+    def enriquecer(cls, dim, codigos):
+        """
+        Join vetorizado Registro ANS -> (cnpj, razao_social, uf, modalidade).
+        'codigos' é a coluna como veio do consolidado (milhões de linhas, ~mil valores distintos):
+        a limpeza e a busca rodam só nos valores distintos (factorize) e o resultado volta
+        para as linhas com um take posicional, sem merge em chave de texto.
+        Retorna um DataFrame alinhado a 'codigos' (NaN onde o registro não está no CADOP).
+        """
+        por_registro = dim.drop_duplicates(subset=['registro_ans']).set_index('registro_ans')
+
+        posicoes_codigo, distintos = pd.factorize(codigos)
+        chaves = pd.Series(distintos, dtype=object).astype(str).str.replace(r'\D', '', regex=True).str.zfill(6)
+        posicoes_dim = por_registro.index.get_indexer(chaves)
+
+        # -1 (não achou / código nulo) vira NaN no take
+        linhas = pd.api.extensions.take(posicoes_dim, posicoes_codigo, allow_fill=True, fill_value=-1)
+        resultado = pd.DataFrame(index=codigos.index)
+        for col in ('cnpj', 'razao_social', 'uf', 'modalidade'):
+            valores = por_registro[col].to_numpy()
+            resultado[col] = pd.api.extensions.take(valores, linhas, allow_fill=True)
+        return resultado
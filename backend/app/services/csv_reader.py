@@ -0,0 +1,114 @@
+import csv
+import logging
+import os
+import threading
+import time
+import pandas as pd
+
+try:
+    import pyarrow.csv as pa_csv
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+logger = logging.getLogger(__name__)
+
+
+class CSVReader:
+    """
+    Camada única de leitura de CSV do pipeline.
+    - engine 'pyarrow' (parse multithread + strings Arrow) quando disponível, senão o engine C do pandas.
+    - Encoding detectado uma única vez por arquivo (cache por caminho + tamanho + mtime).
+    """
+    # auto = pyarrow se estiver instalado; 'c' força o engine padrão do pandas
+    ENGINE = os.getenv("CSV_ENGINE", "auto")
+    TAMANHO_AMOSTRA = 1024 * 1024  # 1MB para detectar encoding
+
+    _encodings = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def engine(cls):
+        if cls.ENGINE == 'pyarrow' or (cls.ENGINE == 'auto' and PYARROW_DISPONIVEL):
+            return 'pyarrow' if PYARROW_DISPONIVEL else 'c'
+        return 'c'
+
+    @classmethod
+    def detectar_encoding(cls, caminho):
+        """
+        UTF-8 (com ou sem BOM) se a amostra decodificar, senão Latin-1
+        (o padrão dos arquivos governamentais). Resultado fica em cache.
+        """
+        stat = os.stat(caminho)
+        chave = (os.path.abspath(caminho), stat.st_size, stat.st_mtime_ns)
+        with cls._lock:
+            if chave in cls._encodings:
+                return cls._encodings[chave]
+
+        with open(caminho, 'rb') as f:
+            amostra = f.read(cls.TAMANHO_AMOSTRA)
+        encoding = cls.detectar_encoding_bytes(amostra)
+
+        with cls._lock:
+            cls._encodings[chave] = encoding
+        return encoding
+
+    @staticmethod
+    def detectar_encoding_bytes(amostra):
+        try:
+            amostra.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A amostra pode ter cortado um caractere multibyte no final
+            if e.start < len(amostra) - 3:
+                return 'latin-1'
+        return 'utf-8-sig'
+
+    @classmethod
+    def ler(cls, caminho, sep=';', dtype=str, encoding=None, **kwargs):
+        """
+        Lê o CSV inteiro. Com dtype=str todas as colunas chegam como texto
+        (no engine pyarrow, como strings Arrow).
+        """
+        encoding = encoding or cls.detectar_encoding(caminho)
+        engine = cls.engine()
+
+        inicio = time.perf_counter()
+        if engine == 'pyarrow':
+            try:
+                if dtype is str:
+                    df = cls._ler_pyarrow_texto(caminho, sep, encoding, **kwargs)
+                else:
+                    df = pd.read_csv(
+                        caminho, sep=sep, dtype=dtype, encoding=encoding,
+                        engine='pyarrow', dtype_backend='pyarrow', **kwargs)
+            except (ValueError, TypeError) as e:
+                # Opção não suportada pelo pyarrow (ex: usecols com função): volta para o engine C
+                logger.warning(f"⚠️ pyarrow não leu {os.path.basename(caminho)} ({e}); usando engine C.")
+                engine = 'c'
+        if engine == 'c':
+            df = pd.read_csv(caminho, sep=sep, dtype=dtype, encoding=encoding, **kwargs)
+
+        # debug: ler() roda em toda leitura do pipeline; a medição por etapa fica com o PipelineProfiler
+        logger.debug("⏱️ %s: %d linhas em %.2fs (engine=%s, encoding=%s)",
+                     os.path.basename(caminho), len(df), time.perf_counter() - inicio, engine, encoding)
+        return df
+
+    @staticmethod
+    def _ler_pyarrow_texto(caminho, sep, encoding, quotechar='"', **kwargs):
+        """
+        dtype=str no pyarrow direto: o engine pyarrow do pandas infere os tipos e só depois
+        converte para texto (CNPJ 0123... virava 123..., 10.50 virava 10.5).
+        Aqui todas as colunas do cabeçalho são declaradas como string antes do parse.
+        """
+        if kwargs:
+            raise TypeError(f"opções não suportadas no modo texto: {', '.join(kwargs)}")
+        with open(caminho, encoding=encoding, newline='') as f:
+            colunas = next(csv.reader(f, delimiter=sep, quotechar=quotechar), [])
+        tabela = pa_csv.read_csv(
+            caminho,
+            read_options=pa_csv.ReadOptions(encoding=encoding),
+            parse_options=pa_csv.ParseOptions(delimiter=sep, quote_char=quotechar),
+            # Vazios e marcadores de nulo viram NaN, como no engine C
+            convert_options=pa_csv.ConvertOptions(
+                column_types={c: 'string' for c in colunas}, strings_can_be_null=True))
+        return tabela.to_pandas()
@@ -1,7 +1,22 @@
 import pandas as pd
+import re
 import zipfile
 import shutil
 import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+try:
+    from pipeline_profiler import PipelineProfiler
+except ImportError:
+    from app.services.pipeline_profiler import PipelineProfiler
 
 
 class DataProcessor:
@@ -9,153 +24,362 @@ class DataProcessor:
     Servico responsavel pelo processamento e normalizacao de grandes volumes de dados da ANS.
     Implementa processamento incremental para otimizacao de memoria.
     """
+    EXTENSOES_ALVO = ('.csv', '.xlsx', '.xls')
+    # Bytes lidos do inicio de cada membro para descobrir o cabecalho
+    TAMANHO_SNIFF = 64 * 1024
+    # Processos paralelos (1 = serial, 0 = um por nucleo de CPU)
+    WORKERS = int(os.getenv("ETL_WORKERS", "1"))
+
+    # Mapeamento e Normalizacao das colunas dos arquivos da ANS
+    MAPEAMENTO = {
+        'REG_ANS': 'REGISTRO_ANS',
+        'CD_OPERADORA': 'REGISTRO_ANS',
+        'NR_CNPJ': 'CNPJ',
+        'CNPJ': 'CNPJ',
+        'NM_RAZAO_SOCIAL': 'RAZAOSOCIAL',
+        'RAZAO_SOCIAL': 'RAZAOSOCIAL',
+        'VL_SALDO_FINAL': 'VALORDESPESAS',
+        'VL_SALDO_INICIAL': 'VALOR_INICIAL'  # Só para garantir
+    }
+    COLUNAS_ID = ('REG_ANS', 'CD_OPERADORA', 'NR_CNPJ', 'CNPJ')
+    # Formatos conhecidos da conta 411 (evita regex na maioria das linhas)
+    VARIANTES_411 = frozenset({'411', '4.1.1', '4-1-1', '4 1 1'})
+    # Nome padrao dos ZIPs trimestrais da ANS (ex: 1T2025.zip)
+    PADRAO_PERIODO = re.compile(r'(\d)T(\d{4})', re.IGNORECASE)
+    # Cache: codigo de conta (como vem no arquivo) -> e 411? (poucos milhares de codigos distintos).
+    # Os validos ficam num set a parte, atualizado so quando aparece codigo novo.
+    # Os dois sao zerados a cada execucao (iterar_normalizado).
+    _contas_411 = {}
+    _contas_411_validas = set()
+
     @classmethod
-    def processar_e_normalizar(cls, caminhos_zips, data_dir):
+    def processar_e_normalizar(cls, caminhos_zips, data_dir, modo='stream', workers=None):
         """
-        Extrai ZIPs, identifica arquivos de despesas (411) e normaliza colunas.
-        Retorna lista de DataFrames.
+        Identifica arquivos de despesas (411) dentro dos ZIPs e normaliza colunas.
+        Retorna lista de DataFrames (acumula tudo: para memoria constante use iterar_normalizado).
         """
-        temp_extract_dir = os.path.join(data_dir, "temp_extract")
-        os.makedirs(temp_extract_dir, exist_ok=True)
+        return list(cls.iterar_normalizado(caminhos_zips, data_dir, modo=modo, workers=workers))
+
+    @classmethod
+    def iterar_normalizado(cls, caminhos_zips, data_dir, modo='stream', workers=None):
+        """
+        Gera os chunks filtrados e normalizados um a um, na ordem dos ZIPs/arquivos.
+        modo='stream': le os membros direto do ZIP (ZipFile.open), sem gravar nada em disco.
+        modo='extract': extrai o ZIP para data/temp_extract (comportamento antigo).
+        workers > 1 (somente no modo stream, precisa do pyarrow): cada membro de cada ZIP vira
+        uma tarefa em um pool de processos; a ordem e as linhas sao as mesmas do modo serial.
+        """
+        cls._contas_411.clear()
+        cls._contas_411_validas.clear()
+        workers = cls.WORKERS if workers is None else workers
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        if modo == 'stream' and workers > 1:
+            if PYARROW_DISPONIVEL:
+                yield from cls._processar_paralelo(caminhos_zips, data_dir, workers)
+                return
+            print("⚠️ ETL_WORKERS > 1 precisa do pyarrow (partes Parquet dos processos); rodando em serie.")
 
-        dados_consolidados = []
+        for zip_path in caminhos_zips:
+            try:
+                if modo == 'extract':
+                    yield from cls._processar_zip_extraindo(zip_path, data_dir)
+                else:
+                    yield from cls._processar_zip_streaming(zip_path)
+            except Exception as e:
+                print(f"❌ Falha ao processar ZIP {zip_path}: {e}")
 
+    @classmethod
+    def _processar_paralelo(cls, caminhos_zips, data_dir, workers):
+        """
+        Distribui os membros (ZIP, arquivo) entre processos. Cada processo grava seus chunks
+        numa parte Parquet (um row group por chunk) e devolve so o caminho; aqui as partes sao
+        relidas um row group por vez, entao a memoria continua limitada ao tamanho do chunk.
+        """
+        tarefas = []
         for zip_path in caminhos_zips:
-            print(f"📦 Extraindo: {os.path.basename(zip_path)}")
             try:
                 with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_extract_dir)
-
-                # 1. Varredura dos arquivos extraidos
-                for root, dirs, files in os.walk(temp_extract_dir):
-                    for file in files:
-                        if file.lower().endswith(('.csv', '.xlsx', '.xls')):
-                            caminho_arquivo = os.path.join(root, file)
-
-                            try:
-                                # --- PASSO A: Inspecao Rapida (Duck Typing) ---
-                                # 1. Identificação (Lê apenas o cabeçalho)
-                                # A ANS muda o encoding as vezes (latin-1 ou utf-8)
-                                try:
-                                    header = pd.read_csv(
-                                        caminho_arquivo, sep=';', encoding='latin-1', nrows=0)
-                                except:
-                                    header = pd.read_csv(
-                                        caminho_arquivo, sep=';', encoding='utf-8', nrows=0)
-                                    
-                                colunas_reais = [str(c).upper().strip()
-                                                 for c in header.columns]
-
-                                # Criterios de Identificacao
-                                is_alvo = 'CD_CONTA_CONTABIL' in colunas_reais or 'VL_DESPESA' in colunas_reais
-                                has_values = any(c in colunas_reais for c in [
-                                                 'VL_EVENTO', 'VL_DESPESA', 'VL_SALDO_FINAL'])
-
-                                # --- PASSO B: Decisao de Processamento ---
-                                if is_alvo or has_values:
-                                    print(
-                                        f"  🎯 Alvo identificado pelo conteúdo: {file}")
-
-                                    # --- PASSO C: Processamento Incremental (Chunks) ---
-                                    # Processamos em pedacos para suportar arquivos de 700k+ linhas
-                                    chunks = pd.read_csv(
-                                        caminho_arquivo,
-                                        sep=';',
-                                        encoding='latin-1',
-                                        chunksize=100000,
-                                        dtype=str,
-                                        decimal=','  # Garante que pontos decimais sejam lidos corretamente
-                                    )
-
-                                    for chunk in chunks:
-                                        chunk.columns = [
-                                            str(c).strip().upper() for c in chunk.columns]
-
-                                        # --- 3. Filtro de Sinistros/Eventos (Regra de Negocio) ---
-                                        # Filtramos contas que iniciam com 411 (Padrao ANS para Eventos/Sinistros)
-                                        if 'CD_CONTA_CONTABIL' in chunk.columns:
-                                            # Remove pontos da conta (ex: 4.1.1 -> 411) para filtrar
-                                            conta_limpa = chunk['CD_CONTA_CONTABIL'].str.replace(
-                                                r'\D', '', regex=True)
-                                            mask = (conta_limpa == '411')
-                                            df_filtrado = chunk[mask].copy()
-                                        else:
-                                            # Fallback: Tenta achar "EVENTO" na descrição
-                                            mask = chunk.apply(lambda x: x.str.contains(
-                                                'EVENTO', case=False, na=False)).any(axis=1)
-                                            df_filtrado = chunk[mask].copy()
-
-                                        if df_filtrado.empty:
-                                            continue
-
-                                        # Mapeamento e Normalizacao ---
-                                        mapeamento = {
-                                            'REG_ANS': 'REGISTRO_ANS',
-                                            'CD_OPERADORA': 'REGISTRO_ANS',
-                                            'NR_CNPJ': 'CNPJ',
-                                            'CNPJ': 'CNPJ',
-                                            'NM_RAZAO_SOCIAL': 'RAZAOSOCIAL',
-                                            'RAZAO_SOCIAL': 'RAZAOSOCIAL',
-                                            'VL_SALDO_FINAL': 'VALORDESPESAS',
-                                            'VL_SALDO_INICIAL': 'VALOR_INICIAL'  # Só para garantir
-                                        }
-                                        df_filtrado.rename(
-                                            columns=mapeamento, inplace=True)
-
-                                        # Se não tiver CNPJ, usamos o Registro ANS provisoriamente (será corrigido na Etapa 2)
-                                        if 'CNPJ' not in df_filtrado.columns and 'REGISTRO_ANS' in df_filtrado.columns:
-                                            df_filtrado['CNPJ'] = df_filtrado['REGISTRO_ANS']
-
-                                        # Garante que temos a coluna chave
-                                        if 'REGISTRO_ANS' not in df_filtrado.columns:
-                                            # Tenta achar a primeira coluna que parece ID
-                                            df_filtrado['REGISTRO_ANS'] = df_filtrado.iloc[:, 0]
-
-
-                                        # Se RAZAOSOCIAL nao existir no arquivo, criamos como N/A para consolidar
-                                        if 'RAZAOSOCIAL' not in df_filtrado.columns:
-                                            df_filtrado['RAZAOSOCIAL'] = "NAO DISPONIVEL NO ARQUIVO FONTE"
-
-                                        # Metadados do Arquivo
-                                        nome_zip = os.path.basename(
-                                            zip_path).upper()
-                                        # Tenta extrair ano
-                                        df_filtrado['ANO'] = nome_zip[-8:-
-                                                                  4] if '20' in nome_zip else '0000'
-                                        df_filtrado['TRIMESTRE'] = nome_zip[0] if 'T' in nome_zip else '0'
-
-                                        # Garantir colunas minimas para o CSV final
-                                        cols_finais = [
-                                            'CNPJ', 'RAZAOSOCIAL', 'ANO', 'TRIMESTRE', 'VALORDESPESAS']
-                                        # Garante que as colunas existem
-                                        for c in cols_finais:
-                                            if c not in df_filtrado.columns:
-                                                df_filtrado[c] = ''
-                                        dados_consolidados.append(
-                                            df_filtrado[[c for c in cols_finais if c in df_filtrado.columns]])
-
-                                    print(
-                                        f"    ✅ Sucesso: Dados extraidos de {file}")
-
-                                else:
-                                    # Opcional:
-                                    print(
-                                        f"  ⏭️ Ignorado: {file}")
-                                    pass
-
-                            except Exception as e:
-                                print(
-                                    f"    ⚠️ Erro ao processar conteúdo de {file}: {e}")
-
-                # Limpar pasta temporária após cada ZIP para economizar espaço
-                shutil.rmtree(temp_extract_dir)
-                os.makedirs(temp_extract_dir, exist_ok=True)
-
+                    tarefas.extend((zip_path, m) for m in cls._membros_alvo(zip_ref))
             except Exception as e:
                 print(f"❌ Falha ao processar ZIP {zip_path}: {e}")
 
-        # Limpeza final
-        if os.path.exists(temp_extract_dir):
-            shutil.rmtree(temp_extract_dir)
+        if not tarefas:
+            return
+
+        workers = min(workers, len(tarefas))
+        pasta_partes = os.path.join(data_dir, "temp_partes", uuid.uuid4().hex)
+        os.makedirs(pasta_partes, exist_ok=True)
+        destinos = [os.path.join(pasta_partes, f"parte-{i:05d}.parquet") for i in range(len(tarefas))]
+        print(f"⚡ Processando {len(tarefas)} arquivo(s) em {workers} processos...")
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # map preserva a ordem de submissão -> resultado determinístico
+                partes = executor.map(
+                    cls._processar_membro_isolado,
+                    [t[0] for t in tarefas], [t[1] for t in tarefas], destinos)
+                for parte in partes:
+                    if parte is None:
+                        continue
+                    arquivo = pq.ParquetFile(parte)
+                    for i in range(arquivo.num_row_groups):
+                        yield arquivo.read_row_group(i).to_pandas()
+                    os.remove(parte)
+        finally:
+            shutil.rmtree(pasta_partes, ignore_errors=True)
+
+    @classmethod
+    def _processar_membro_isolado(cls, zip_path, nome_membro, destino):
+        """Tarefa do pool: grava os chunks do arquivo em 'destino' (Parquet). Retorna o caminho ou None."""
+        escritor = None
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                for df in cls._processar_membro(zip_ref, nome_membro, zip_path):
+                    # Tudo texto (dtype=str no read_csv): o schema fixo evita coluna nula virar tipo "null"
+                    tabela = pa.Table.from_pandas(
+                        df, schema=pa.schema([(c, pa.string()) for c in df.columns]), preserve_index=False)
+                    if escritor is None:
+                        escritor = pq.ParquetWriter(destino, tabela.schema)
+                    escritor.write_table(tabela)
+        except Exception as e:
+            print(f"❌ Falha ao processar {nome_membro} de {zip_path}: {e}")
+            if escritor is not None:
+                escritor.close()
+                escritor = None
+            if os.path.exists(destino):
+                os.remove(destino)
+            return None
+        if escritor is None:
+            return None
+        escritor.close()
+        return destino
+
+    @classmethod
+    def _membros_alvo(cls, zip_ref):
+        return [
+            m.filename for m in zip_ref.infolist()
+            if not m.is_dir() and m.filename.lower().endswith(cls.EXTENSOES_ALVO)
+        ]
+
+    @classmethod
+    def _processar_zip_streaming(cls, zip_path):
+        """Le cada CSV do ZIP como stream (descompressao sob demanda, sem arquivos temporarios)."""
+        print(f"📦 Lendo (streaming): {os.path.basename(zip_path)}")
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for nome_membro in cls._membros_alvo(zip_ref):
+                yield from cls._processar_membro(zip_ref, nome_membro, zip_path)
+
+    @classmethod
+    def _processar_membro(cls, zip_ref, nome_membro, zip_path):
+        file = os.path.basename(nome_membro)
+        try:
+            # PASSO A: cabecalho a partir dos primeiros bytes do membro
+            with zip_ref.open(nome_membro) as f:
+                amostra = f.read(cls.TAMANHO_SNIFF)
+            colunas_reais = cls._colunas_do_cabecalho(amostra)
+
+            if not cls._is_arquivo_alvo(colunas_reais):
+                print(f"  ⏭️ Ignorado: {file}")
+                return
+
+            print(f"  🎯 Alvo identificado pelo conteúdo: {file}")
+            with zip_ref.open(nome_membro) as f:
+                yield from cls._iterar_chunks(f, zip_path, colunas_reais)
+            print(f"    ✅ Sucesso: Dados extraidos de {file}")
+        except Exception as e:
+            print(f"    ⚠️ Erro ao processar conteúdo de {file}: {e}")
+
+    @classmethod
+    def _processar_zip_extraindo(cls, zip_path, data_dir):
+        """Caminho antigo: extrai tudo para disco, varre a pasta e apaga no final."""
+        temp_extract_dir = os.path.join(data_dir, "temp_extract")
+        os.makedirs(temp_extract_dir, exist_ok=True)
+
+        print(f"📦 Extraindo: {os.path.basename(zip_path)}")
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                zip_ref.extractall(temp_extract_dir)
+
+            # 1. Varredura dos arquivos extraidos
+            for root, dirs, files in os.walk(temp_extract_dir):
+                for file in files:
+                    if not file.lower().endswith(cls.EXTENSOES_ALVO):
+                        continue
+                    caminho_arquivo = os.path.join(root, file)
+                    try:
+                        with open(caminho_arquivo, 'rb') as f:
+                            colunas_reais = cls._colunas_do_cabecalho(f.read(cls.TAMANHO_SNIFF))
+
+                        if not cls._is_arquivo_alvo(colunas_reais):
+                            print(f"  ⏭️ Ignorado: {file}")
+                            continue
+
+                        print(f"  🎯 Alvo identificado pelo conteúdo: {file}")
+                        yield from cls._iterar_chunks(caminho_arquivo, zip_path, colunas_reais)
+                        print(f"    ✅ Sucesso: Dados extraidos de {file}")
+                    except Exception as e:
+                        print(f"    ⚠️ Erro ao processar conteúdo de {file}: {e}")
+        finally:
+            # Limpar pasta temporária após cada ZIP para economizar espaço
+            shutil.rmtree(temp_extract_dir, ignore_errors=True)
+
+    @staticmethod
+    def periodo_do_arquivo(zip_path):
+        """(ano, trimestre) como texto a partir do nome do ZIP (ex: 1T2025.zip -> ('2025', '1'))."""
+        nome_zip = os.path.basename(zip_path).upper()
+        # Tenta extrair ano
+        ano = nome_zip[-8:-4] if '20' in nome_zip else '0000'
+        trimestre = nome_zip[0] if 'T' in nome_zip else '0'
+        return ano, trimestre
+
+    @classmethod
+    def periodo_numerico(cls, zip_path):
+        """(ano, trimestre) inteiros a partir do nome do ZIP, ou None se o nome nao segue o padrao NTAAAA."""
+        encontrado = cls.PADRAO_PERIODO.search(os.path.basename(zip_path))
+        if not encontrado:
+            return None
+        return int(encontrado.group(2)), int(encontrado.group(1))
+
+    @classmethod
+    def _colunas_do_cabecalho(cls, amostra):
+        """
+        --- PASSO A: Inspecao Rapida (Duck Typing) ---
+        Identificação lendo apenas a primeira linha dos bytes amostrados.
+        A ANS muda o encoding as vezes (latin-1 ou utf-8); o cabecalho e ASCII nos dois.
+        """
+        primeira_linha = amostra.split(b'\n', 1)[0]
+        try:
+            texto = primeira_linha.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            texto = primeira_linha.decode('latin-1')
+        return [cls._normalizar_coluna(c) for c in texto.rstrip('\r').split(';')]
+
+    @staticmethod
+    def _normalizar_coluna(coluna):
+        """
+        Nome de coluna comparavel entre o cabecalho amostrado e o read_csv.
+        Os chunks sao lidos em latin-1: um BOM UTF-8 chega como 'ï»¿' colado na
+        primeira coluna (e as aspas dela nao sao removidas pelo parser).
+        """
+        return str(coluna).replace('\ufeff', '').replace('ï»¿', '').strip().strip('"').upper().strip()
+
+    @staticmethod
+    def _is_arquivo_alvo(colunas_reais):
+        # Criterios de Identificacao
+        is_alvo = 'CD_CONTA_CONTABIL' in colunas_reais or 'VL_DESPESA' in colunas_reais
+        has_values = any(c in colunas_reais for c in [
+                         'VL_EVENTO', 'VL_DESPESA', 'VL_SALDO_FINAL'])
+        return is_alvo or has_values
+
+    @staticmethod
+    def _is_coluna_descricao(coluna):
+        return 'DESCRI' in coluna or coluna.startswith('DS_')
+
+    @classmethod
+    def _colunas_necessarias(cls, colunas_reais):
+        """
+        Colunas que o filtro e a normalizacao usam (usecols): o resto do arquivo nem e parseado.
+        Retorna None quando nao da para restringir (fallback que varre todas as colunas).
+        """
+        necessarias = {c for c in colunas_reais if c in cls.MAPEAMENTO}
+        if 'CD_CONTA_CONTABIL' in colunas_reais:
+            necessarias.add('CD_CONTA_CONTABIL')
+        else:
+            descricoes = {c for c in colunas_reais if cls._is_coluna_descricao(c)}
+            if not descricoes:
+                return None
+            necessarias |= descricoes
+
+        # Sem coluna de ID conhecida, a normalizacao usa a primeira coluna do arquivo
+        if not any(c in colunas_reais for c in cls.COLUNAS_ID) and colunas_reais:
+            necessarias.add(colunas_reais[0])
+        return necessarias
+
+    @classmethod
+    def _mascara_411(cls, contas):
+        """
+        Equivalente a contas.str.replace(r'\\D', '') == '411', mas sem regex por linha:
+        classifica so os codigos distintos (com cache entre chunks) e aplica via isin.
+        """
+        # tolist(): iterar o array do pandas direto (ex.: strings Arrow) embrulha cada item e custa mais
+        for codigo in pd.unique(contas.dropna()).tolist():
+            if codigo not in cls._contas_411:
+                valido = (codigo in cls.VARIANTES_411
+                          or ''.join(ch for ch in codigo if ch.isdigit()) == '411')
+                cls._contas_411[codigo] = valido
+                if valido:
+                    cls._contas_411_validas.add(codigo)
+        return contas.isin(cls._contas_411_validas)
+
+    @classmethod
+    def _iterar_chunks(cls, fonte, zip_path, colunas_reais=None):
+        """
+        --- PASSO C: Processamento Incremental (Chunks) ---
+        Processamos em pedacos para suportar arquivos de 700k+ linhas.
+        'fonte' pode ser um caminho ou um arquivo binario aberto (membro do ZIP).
+        Gera cada chunk filtrado assim que fica pronto (nada e acumulado aqui).
+        """
+        necessarias = cls._colunas_necessarias(colunas_reais) if colunas_reais else None
+        usecols = (lambda c: cls._normalizar_coluna(c) in necessarias) if necessarias else None
+
+        # Leitura em chunks: o engine pyarrow do pandas não suporta chunksize, então fica o engine C
+        chunks = pd.read_csv(
+            fonte,
+            sep=';',
+            encoding='latin-1',
+            chunksize=100000,
+            dtype=str,
+            usecols=usecols,
+            decimal=','  # Garante que pontos decimais sejam lidos corretamente
+        )
+
+        for chunk in chunks:
+            chunk.columns = [cls._normalizar_coluna(c) for c in chunk.columns]
+
+            # --- 3. Filtro de Sinistros/Eventos (Regra de Negocio) ---
+            # Filtramos contas que iniciam com 411 (Padrao ANS para Eventos/Sinistros)
+            with PipelineProfiler.etapa("filtro_411", agregar=True) as medicao:
+                if 'CD_CONTA_CONTABIL' in chunk.columns:
+                    # Conta sem pontuacao == 411 (ex: 4.1.1 -> 411)
+                    mask = cls._mascara_411(chunk['CD_CONTA_CONTABIL'])
+                else:
+                    # Fallback: Tenta achar "EVENTO" na descrição (so nas colunas de descricao, se houver)
+                    descricoes = [c for c in chunk.columns if cls._is_coluna_descricao(c)]
+                    alvo = chunk[descricoes] if descricoes else chunk
+                    mask = pd.Series(False, index=chunk.index)
+                    for col in alvo.columns:
+                        mask |= alvo[col].str.contains('EVENTO', case=False, na=False, regex=False)
+                df_filtrado = chunk[mask].copy()
+                medicao.contar(entrada=len(chunk), saida=len(df_filtrado))
+
+            if df_filtrado.empty:
+                continue
+
+            # Mapeamento e Normalizacao ---
+            df_filtrado.rename(
+                columns=cls.MAPEAMENTO, inplace=True)
+
+            # Se não tiver CNPJ, usamos o Registro ANS provisoriamente (será corrigido na Etapa 2)
+            if 'CNPJ' not in df_filtrado.columns and 'REGISTRO_ANS' in df_filtrado.columns:
+                df_filtrado['CNPJ'] = df_filtrado['REGISTRO_ANS']
+
+            # Garante que temos a coluna chave
+            if 'REGISTRO_ANS' not in df_filtrado.columns:
+                # Tenta achar a primeira coluna que parece ID
+                df_filtrado['REGISTRO_ANS'] = df_filtrado.iloc[:, 0]
+
+            # Se RAZAOSOCIAL nao existir no arquivo, criamos como N/A para consolidar
+            if 'RAZAOSOCIAL' not in df_filtrado.columns:
+                df_filtrado['RAZAOSOCIAL'] = "NAO DISPONIVEL NO ARQUIVO FONTE"
+
+            # Metadados do Arquivo
+            df_filtrado['ANO'], df_filtrado['TRIMESTRE'] = cls.periodo_do_arquivo(zip_path)
 
-        return dados_consolidados
+            # Garantir colunas minimas para o CSV final
+            cols_finais = [
+                'CNPJ', 'RAZAOSOCIAL', 'ANO', 'TRIMESTRE', 'VALORDESPESAS']
+            # Garante que as colunas existem
+            for c in cols_finais:
+                if c not in df_filtrado.columns:
+                    df_filtrado[c] = ''
+            yield df_filtrado[[c for c in cols_finais if c in df_filtrado.columns]]
@@ -0,0 +1,60 @@
+import pandas as pd
+
+
+class EstatisticasOnline:
+    """
+    Estados mergeáveis de média/variância por grupo (Welford/Chan): N, SOMA, MEDIA e M2
+    (soma dos quadrados dos desvios em relação à média do grupo).
+    Dois estados do mesmo grupo se combinam sem revisitar as linhas:
+        M2 = M2_a + M2_b + n_a * (media_a - media)^2 + n_b * (media_b - media)^2
+    Isso permite agregar bloco a bloco / trimestre a trimestre e guardar o estado de cada trimestre.
+    Ao contrário de soma + soma dos quadrados, não perde precisão com valores grandes.
+    """
+    COLUNAS = ['N', 'SOMA', 'MEDIA', 'M2']
+
+    @classmethod
+    def estados(cls, df, chaves, coluna):
+        """Estado de cada grupo de um bloco (duas passadas vetorizadas: média, depois desvios)."""
+        valores = df[coluna]
+        media = valores.groupby([df[c] for c in chaves], sort=False).transform('mean')
+        trabalho = df[chaves].copy()
+        trabalho['_VALOR'] = valores
+        trabalho['_D2'] = (valores - media) ** 2
+        estado = trabalho.groupby(chaves, sort=False).agg(
+            N=('_VALOR', 'count'),
+            SOMA=('_VALOR', 'sum'),
+            M2=('_D2', 'sum'),
+        ).reset_index()
+        estado['MEDIA'] = estado['SOMA'] / estado['N']
+        return estado[chaves + cls.COLUNAS]
+
+    @classmethod
+    def combinar(cls, estados, chaves):
+        """Funde todos os estados de cada grupo (chaves) em um só (fórmula de Chan para k partes)."""
+        if estados.empty:
+            return pd.DataFrame(columns=chaves + cls.COLUNAS)
+        grupos = [estados[c] for c in chaves]
+        n_total = estados['N'].groupby(grupos, sort=False).transform('sum')
+        media_total = estados['SOMA'].groupby(grupos, sort=False).transform('sum') / n_total
+        trabalho = estados[chaves + ['N', 'SOMA']].copy()
+        trabalho['_M2'] = estados['M2'] + estados['N'] * (estados['MEDIA'] - media_total) ** 2
+        combinado = trabalho.groupby(chaves, sort=False).agg(
+            N=('N', 'sum'),
+            SOMA=('SOMA', 'sum'),
+            M2=('_M2', 'sum'),
+        ).reset_index()
+        combinado['MEDIA'] = combinado['SOMA'] / combinado['N']
+        return combinado[chaves + cls.COLUNAS]
+
+    @classmethod
+    def acumular(cls, estado, novo, chaves):
+        """Atualização online: estado corrente + estado de um novo bloco."""
+        if estado is None or estado.empty:
+            return novo
+        return cls.combinar(pd.concat([estado, novo], ignore_index=True), chaves)
+
+    @staticmethod
+    def desvio_padrao(estado):
+        """Desvio padrão amostral (ddof=1, como o std do pandas); NaN para grupos com 1 linha."""
+        variancia = (estado['M2'] / (estado['N'] - 1)).where(estado['N'] > 1)
+        return variancia.clip(lower=0) ** 0.5
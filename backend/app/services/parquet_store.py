@@ -0,0 +1,153 @@
+import os
+import shutil
+import uuid
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+
+class ParquetStore:
+    """
+    Formato intermediário entre as etapas do pipeline: Parquet tipado e particionado
+    por ANO/TRIMESTRE (ex: data/despesas_enriquecidas/ANO=2025/TRIMESTRE=1/*.parquet).
+    As etapas seguintes leem só as colunas/trimestres de que precisam, sem re-parsear CSV.
+    Sem pyarrow instalado o pipeline continua usando os CSVs.
+    """
+    PARTICOES = ['ANO', 'TRIMESTRE']
+    # Os CSV/ZIP continuam sendo gerados como entregáveis (desligue com ETL_EXPORTAR_CSV=false)
+    EXPORTAR_CSV = os.getenv("ETL_EXPORTAR_CSV", "true").lower() == "true"
+
+    @classmethod
+    def disponivel(cls):
+        return PYARROW_DISPONIVEL
+
+    @staticmethod
+    def tipar_despesas(df):
+        """Tipos das colunas de despesas: ano/trimestre inteiros, valor float, textos como string."""
+        df = df.copy()
+        df['ANO'] = pd.to_numeric(df['ANO'], errors='coerce').fillna(0).astype('int16')
+        df['TRIMESTRE'] = pd.to_numeric(df['TRIMESTRE'], errors='coerce').fillna(0).astype('int8')
+        df['VALORDESPESAS'] = pd.to_numeric(df['VALORDESPESAS'], errors='coerce').astype('float64')
+        for col in ('CNPJ', 'RAZAOSOCIAL'):
+            if col in df.columns:
+                df[col] = df[col].astype('string')
+        return df
+
+    @classmethod
+    def existe(cls, caminho):
+        if not cls.disponivel() or not os.path.exists(caminho):
+            return False
+        if os.path.isfile(caminho):
+            return True
+        return any(f.endswith('.parquet') for _, _, files in os.walk(caminho) for f in files)
+
+    # --- Datasets particionados ---
+    @staticmethod
+    def novo_dataset(caminho):
+        """Abre um diretório temporário para escrita; publique com publicar_dataset()."""
+        tmp = caminho + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        return tmp
+
+    @classmethod
+    def anexar(cls, tmp_dir, df):
+        """Grava um bloco (chunk) nas partições ANO/TRIMESTRE correspondentes."""
+        if df.empty:
+            return
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(
+            tabela, tmp_dir, partition_cols=cls.PARTICOES,
+            basename_template=f"parte-{uuid.uuid4().hex}-{{i}}.parquet")
+
+    @staticmethod
+    def publicar_dataset(tmp_dir, caminho):
+        """Troca o dataset antigo pelo novo (a etapa seguinte nunca vê um dataset pela metade)."""
+        antigo = caminho + ".old"
+        shutil.rmtree(antigo, ignore_errors=True)
+        if os.path.exists(caminho):
+            os.rename(caminho, antigo)
+        os.rename(tmp_dir, caminho)
+        shutil.rmtree(antigo, ignore_errors=True)
+
+    @staticmethod
+    def _dir_particao(caminho, ano, trimestre):
+        return os.path.join(caminho, f"ANO={int(ano)}", f"TRIMESTRE={int(trimestre)}")
+
+    @classmethod
+    def periodos(cls, caminho):
+        """Trimestres (ano, trimestre) presentes no dataset, pelo nome das partições."""
+        encontrados = set()
+        if not os.path.isdir(caminho):
+            return encontrados
+        for dir_ano in os.listdir(caminho):
+            if not dir_ano.startswith('ANO='):
+                continue
+            for dir_tri in os.listdir(os.path.join(caminho, dir_ano)):
+                if dir_tri.startswith('TRIMESTRE=') and os.listdir(os.path.join(caminho, dir_ano, dir_tri)):
+                    encontrados.add((int(dir_ano[4:]), int(dir_tri[10:])))
+        return encontrados
+
+    @classmethod
+    def substituir_particoes(cls, caminho, tmp_dir, periodos):
+        """
+        Troca só as partições de 'periodos' pelas gravadas em tmp_dir (modo incremental);
+        um período sem partição em tmp_dir é removido do dataset. As demais ficam intactas.
+        """
+        os.makedirs(caminho, exist_ok=True)
+        for ano, trimestre in periodos:
+            destino = cls._dir_particao(caminho, ano, trimestre)
+            novo = cls._dir_particao(tmp_dir, ano, trimestre) if tmp_dir else None
+            # Nome com '.' na frente: o leitor do dataset ignora enquanto a troca acontece
+            antigo = os.path.join(caminho, f".old-{int(ano)}-{int(trimestre)}")
+            shutil.rmtree(antigo, ignore_errors=True)
+            if os.path.exists(destino):
+                os.rename(destino, antigo)
+            if novo and os.path.exists(novo):
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.rename(novo, destino)
+            shutil.rmtree(antigo, ignore_errors=True)
+            dir_ano = os.path.dirname(destino)
+            if os.path.isdir(dir_ano) and not os.listdir(dir_ano):
+                os.rmdir(dir_ano)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def ler(cls, caminho, columns=None, periodos=None):
+        """
+        Lê o dataset. 'periodos' = [(ano, trimestre), ...] lê só essas partições.
+        As colunas de partição voltam como inteiros.
+        """
+        filtros = None
+        if periodos:
+            filtros = [[('ANO', '=', int(a)), ('TRIMESTRE', '=', int(t))] for a, t in periodos]
+        df = pd.read_parquet(caminho, columns=columns, filters=filtros)
+        if 'ANO' in df.columns:
+            df['ANO'] = df['ANO'].astype('int16')
+        if 'TRIMESTRE' in df.columns:
+            df['TRIMESTRE'] = df['TRIMESTRE'].astype('int8')
+        return df
+
+    @classmethod
+    def salvar_dataset(cls, df, caminho):
+        """Grava um DataFrame inteiro como dataset particionado (substitui o anterior)."""
+        tmp = cls.novo_dataset(caminho)
+        cls.anexar(tmp, df)
+        cls.publicar_dataset(tmp, caminho)
+
+    # --- Tabelas pequenas (arquivo único) ---
+    @staticmethod
+    def salvar_tabela(df, caminho):
+        tmp = caminho + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, caminho)
+
+    @staticmethod
+    def ler_tabela(caminho, columns=None):
+        return pd.read_parquet(caminho, columns=columns)
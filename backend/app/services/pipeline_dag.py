@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    from pipeline_profiler import PipelineProfiler
+except ImportError:
+    from app.services.pipeline_profiler import PipelineProfiler
+
+
+class Tarefa:
+    """
+    Unidade de trabalho do pipeline.
+    - depende: nomes das tarefas que precisam terminar antes (dados em memória ou no banco).
+    - entradas/saidas: arquivos/diretórios em data/. Se todas as saídas existem e nenhuma entrada
+      mudou desde a última execução bem-sucedida da tarefa (carimbo), ela é pulada (como um make).
+      Sem entradas declaradas (ex: downloads, banco) ela sempre roda.
+    - funcao(resultados): recebe os resultados das tarefas anteriores; retornar False = falha.
+    """
+
+    def __init__(self, nome, funcao, depende=(), entradas=(), saidas=()):
+        self.nome = nome
+        self.funcao = funcao
+        self.depende = tuple(depende)
+        self.entradas = tuple(entradas)
+        self.saidas = tuple(saidas)
+
+
+class PipelineDAG:
+    """
+    Executa um grafo de Tarefas: cada uma começa assim que suas dependências terminam,
+    e tarefas independentes rodam em paralelo (threads: o trabalho pesado é I/O, pandas e banco).
+    Se uma tarefa falha, as que dependem dela são canceladas; as demais seguem.
+    dir_carimbos: onde fica o carimbo (<tarefa>.stamp) de cada execução bem-sucedida;
+    sem ele nenhuma tarefa é pulada.
+    """
+    MAX_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+
+    OK, PULADA, FALHOU, CANCELADA = "ok", "pulada", "falhou", "cancelada"
+
+    def __init__(self, tarefas, max_workers=None, dir_carimbos=None):
+        self.tarefas = {t.nome: t for t in tarefas}
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.dir_carimbos = dir_carimbos
+        self.resultados = {}
+        self.status = {}
+        self.duracoes = {}
+        self._lock = threading.Lock()
+        self._validar()
+
+    def _validar(self):
+        for t in self.tarefas.values():
+            faltando = [d for d in t.depende if d not in self.tarefas]
+            if faltando:
+                raise ValueError(f"Tarefa '{t.nome}' depende de tarefas inexistentes: {faltando}")
+        # Detecção de ciclo (ordenação topológica)
+        visitadas, pilha = set(), set()
+
+        def visitar(nome):
+            if nome in pilha:
+                raise ValueError(f"Ciclo no pipeline envolvendo '{nome}'")
+            if nome in visitadas:
+                return
+            pilha.add(nome)
+            for d in self.tarefas[nome].depende:
+                visitar(d)
+            pilha.discard(nome)
+            visitadas.add(nome)
+
+        for nome in self.tarefas:
+            visitar(nome)
+
+    # --- Verificação de atualização (mtime) ---
+    @staticmethod
+    def _mtimes(caminho):
+        """
+        mtime do arquivo ou de todos os arquivos e subdiretórios do diretório (datasets particionados).
+        Os diretórios entram porque remover/trocar uma partição só altera o mtime do diretório pai.
+        """
+        if os.path.isfile(caminho):
+            return [os.path.getmtime(caminho)]
+        mtimes = []
+        for raiz, _, arquivos in os.walk(caminho):
+            mtimes.append(os.path.getmtime(raiz))
+            mtimes.extend(os.path.getmtime(os.path.join(raiz, f)) for f in arquivos)
+        return mtimes
+
+    def _carimbo(self, tarefa):
+        return os.path.join(self.dir_carimbos, f"{tarefa.nome}.stamp")
+
+    def atualizada(self, tarefa):
+        """
+        Compara as entradas com o carimbo da última execução bem-sucedida, e não com as saídas:
+        a troca incremental de partições só regrava os trimestres alterados, então as
+        partições antigas das saídas continuam com o mtime antigo.
+        """
+        if not self.dir_carimbos or not tarefa.entradas or not tarefa.saidas:
+            return False
+        carimbo = self._carimbo(tarefa)
+        if not os.path.exists(carimbo):
+            return False
+        if not all(os.path.exists(c) for c in tarefa.entradas + tarefa.saidas):
+            return False
+        entradas = [m for c in tarefa.entradas for m in self._mtimes(c)]
+        return bool(entradas) and os.path.getmtime(carimbo) >= max(entradas)
+
+    def _carimbar(self, tarefa):
+        if not self.dir_carimbos or not tarefa.entradas or not tarefa.saidas:
+            return
+        os.makedirs(self.dir_carimbos, exist_ok=True)
+        with open(self._carimbo(tarefa), 'w', encoding='utf-8') as f:
+            f.write(time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+    # --- Execução ---
+    def _rodar(self, tarefa):
+        if self.atualizada(tarefa):
+            print(f"⏭️ [{tarefa.nome}] Entradas sem alteração desde a última execução: pulando.")
+            with PipelineProfiler.etapa(tarefa.nome) as medicao:
+                medicao.status = self.PULADA
+            return self.PULADA, None, 0.0
+
+        print(f"▶️ [{tarefa.nome}] Iniciando...")
+        # Carimbo removido antes de rodar: se a tarefa cair no meio, a próxima execução não pula
+        if self.dir_carimbos and os.path.exists(self._carimbo(tarefa)):
+            os.remove(self._carimbo(tarefa))
+        inicio = time.perf_counter()
+        try:
+            with self._lock:
+                anteriores = dict(self.resultados)
+            # Cada tarefa é uma etapa de primeiro nível no relatório de profiling
+            with PipelineProfiler.etapa(tarefa.nome) as medicao:
+                resultado = tarefa.funcao(anteriores)
+                status = self.FALHOU if resultado is False else self.OK
+                medicao.status = status
+            if status == self.OK:
+                self._carimbar(tarefa)
+        except Exception as e:
+            print(f"❌ [{tarefa.nome}] Falha fatal: {e}")
+            resultado, status = None, self.FALHOU
+        duracao = time.perf_counter() - inicio
+        print(f"{'✅' if status == self.OK else '❌'} [{tarefa.nome}] {status} em {duracao:.2f}s")
+        return status, resultado, duracao
+
+    def executar(self):
+        """Roda o grafo inteiro. Retorna True se nenhuma tarefa falhou ou foi cancelada."""
+        pendentes = dict(self.tarefas)
+        em_execucao = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pendentes or em_execucao:
+                # Cancela quem depende de tarefa que não terminou bem
+                for nome, t in list(pendentes.items()):
+                    falhas = [d for d in t.depende if self.status.get(d) in (self.FALHOU, self.CANCELADA)]
+                    if falhas:
+                        print(f"🚫 [{nome}] Cancelada (dependência falhou: {', '.join(falhas)})")
+                        self.status[nome] = self.CANCELADA
+                        del pendentes[nome]
+
+                # Dispara todas as tarefas prontas
+                for nome, t in list(pendentes.items()):
+                    if all(self.status.get(d) in (self.OK, self.PULADA) for d in t.depende):
+                        em_execucao[executor.submit(self._rodar, t)] = nome
+                        del pendentes[nome]
+
+                if not em_execucao:
+                    break
+
+                concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidas:
+                    nome = em_execucao.pop(futuro)
+                    status, resultado, duracao = futuro.result()
+                    with self._lock:
+                        self.status[nome] = status
+                        self.resultados[nome] = resultado
+                        self.duracoes[nome] = duracao
+
+        return all(s in (self.OK, self.PULADA) for s in self.status.values())
+
+    def resumo(self):
+        linhas = []
+        for nome in self.tarefas:
+            status = self.status.get(nome, self.CANCELADA)
+            linhas.append(f"   {nome:<22} {status:<10} {self.duracoes.get(nome, 0.0):8.2f}s")
+        return "\n".join(linhas)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import time
+
+
+class PipelineManifest:
+    """
+    Manifesto das execuções incrementais (data/.pipeline_manifest.json).
+
+    - arquivos: ZIPs de origem já processados pela Etapa 1 (nome -> tamanho, sha256, períodos).
+    - pendentes: trimestres (ano, trimestre) reprocessados que a Etapa 3 ainda não gravou no banco.
+      A Etapa 1 adiciona, a Etapa 2 (re)processa e a Etapa 3 remove depois do COMMIT;
+      se o pipeline cair no meio, a próxima execução retoma os mesmos trimestres.
+    """
+    NOME = ".pipeline_manifest.json"
+    # false = toda execução reprocessa todos os trimestres (modo completo)
+    INCREMENTAL = os.getenv("PIPELINE_INCREMENTAL", "true").lower() == "true"
+    TAMANHO_BLOCO_HASH = 1024 * 1024
+
+    @classmethod
+    def caminho(cls, data_dir):
+        return os.path.join(data_dir, cls.NOME)
+
+    @classmethod
+    def carregar(cls, data_dir):
+        try:
+            with open(cls.caminho(data_dir), 'r', encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            manifesto = {}
+        manifesto.setdefault('arquivos', {})
+        manifesto.setdefault('pendentes', [])
+        return manifesto
+
+    @classmethod
+    def salvar(cls, data_dir, manifesto):
+        caminho = cls.caminho(data_dir)
+        tmp = caminho + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, caminho)
+
+    @classmethod
+    def hash_arquivo(cls, caminho):
+        h = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(cls.TAMANHO_BLOCO_HASH), b''):
+                h.update(bloco)
+        return h.hexdigest()
+
+    @classmethod
+    def descrever_arquivo(cls, caminho, periodo):
+        return {
+            'tamanho': os.path.getsize(caminho),
+            'sha256': cls.hash_arquivo(caminho),
+            'periodos': [list(periodo)],
+            'processado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    @classmethod
+    def arquivo_alterado(cls, manifesto, caminho):
+        """Novo ou com conteúdo diferente do registrado (tamanho primeiro, hash só se bater)."""
+        registro = manifesto['arquivos'].get(os.path.basename(caminho))
+        if not registro or registro.get('tamanho') != os.path.getsize(caminho):
+            return True
+        return registro.get('sha256') != cls.hash_arquivo(caminho)
+
+    # --- Trimestres pendentes ---
+    @classmethod
+    def pendentes(cls, data_dir):
+        """Lista de (ano, trimestre) ainda não gravados no banco, ou None se não há manifesto."""
+        if not os.path.exists(cls.caminho(data_dir)):
+            return None
+        return sorted(tuple(p) for p in cls.carregar(data_dir)['pendentes'])
+
+    @classmethod
+    def concluir_pendentes(cls, data_dir, periodos):
+        manifesto = cls.carregar(data_dir)
+        concluidos = {tuple(p) for p in periodos}
+        manifesto['pendentes'] = [p for p in manifesto['pendentes'] if tuple(p) not in concluidos]
+        cls.salvar(data_dir, manifesto)
@@ -0,0 +1,370 @@
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class Medicao:
+    """
+    Métricas de uma etapa/sub-etapa. O código instrumentado preenche os contadores
+    (linhas_entrada/linhas_saida/bytes_lidos/bytes_gravados/extras); tempos e memória são automáticos.
+    """
+
+    def __init__(self, nome, caminho):
+        self.nome = nome
+        self.caminho = caminho
+        self.linhas_entrada = 0
+        self.linhas_saida = 0
+        self.bytes_lidos = 0
+        self.bytes_gravados = 0
+        self.extras = {}
+        self.chamadas = 0
+        self.inicio = None
+        self.duracao_s = 0.0
+        self.cpu_thread_s = 0.0
+        self.cpu_processo_s = 0.0
+        self.cpu_filhos_s = 0.0
+        self.rss_inicio_mb = None
+        self.rss_fim_mb = None
+        self.pico_rss_processo_mb = None
+        self.pico_tracemalloc_mb = None
+        self.status = "ok"
+        self.erro = None
+        self.thread = threading.current_thread().name
+
+    def contar(self, entrada=0, saida=0, lidos=0, gravados=0):
+        self.linhas_entrada += entrada
+        self.linhas_saida += saida
+        self.bytes_lidos += lidos
+        self.bytes_gravados += gravados
+
+    def como_dict(self, inicio_execucao):
+        return {
+            'etapa': self.caminho,
+            'thread': self.thread,
+            'status': self.status,
+            'erro': self.erro,
+            'chamadas': self.chamadas,
+            'inicio_s': round(self.inicio - inicio_execucao, 4),
+            'duracao_s': round(self.duracao_s, 4),
+            'cpu_thread_s': round(self.cpu_thread_s, 4),
+            'cpu_processo_s': round(self.cpu_processo_s, 4),
+            'cpu_filhos_s': round(self.cpu_filhos_s, 4),
+            'rss_inicio_mb': self.rss_inicio_mb,
+            'rss_fim_mb': self.rss_fim_mb,
+            'pico_rss_processo_mb': self.pico_rss_processo_mb,
+            'pico_tracemalloc_mb': self.pico_tracemalloc_mb,
+            'linhas_entrada': self.linhas_entrada,
+            'linhas_saida': self.linhas_saida,
+            'bytes_lidos': self.bytes_lidos,
+            'bytes_gravados': self.bytes_gravados,
+            'extras': self.extras,
+        }
+
+
+class PipelineProfiler:
+    """
+    Instrumentação do pipeline: tempo de parede, CPU, memória, linhas e bytes por etapa/sub-etapa.
+
+        with PipelineProfiler.etapa("merge_cadop") as m:
+            ...
+            m.contar(entrada=len(df), saida=len(df_merged))
+
+        @PipelineProfiler.medir("refresh_rollup")
+        def atualizar(...): ...
+
+    Etapas abertas dentro de outra (na mesma thread) viram sub-etapas: "consolidar/extracao/filtro_411".
+    agregar=True soma as chamadas repetidas (um bloco por chunk) numa linha só do relatório.
+    No fim da execução, salvar_relatorio() grava o JSON em data/relatorios/.
+
+    - cpu_thread_s: CPU da thread que rodou a etapa; cpu_processo_s inclui as outras threads
+      (etapas concorrentes do orquestrador e threads nativas do pyarrow).
+    - cpu_filhos_s: processos filhos encerrados durante a etapa (pool do DataProcessor com ETL_WORKERS > 1).
+    - pico_rss_processo_mb: pico do processo até o fim da etapa (o SO não permite zerar o pico).
+    - pico_tracemalloc_mb (PIPELINE_TRACEMALLOC=true): pico de alocações Python enquanto a etapa
+      estava aberta. Deixa o pipeline bem mais lento, por isso vem desligado.
+    """
+    ATIVO = os.getenv("PIPELINE_PROFILING", "true").lower() == "true"
+    # Dump de perfil por etapa de primeiro nível: "" (desligado), "cprofile" ou "pyinstrument"
+    DUMP = os.getenv("PIPELINE_PROFILE_DUMP", "").lower()
+    TRACEMALLOC = os.getenv("PIPELINE_TRACEMALLOC", "false").lower() == "true"
+    PASTA_RELATORIOS = "relatorios"
+
+    _lock = threading.RLock()
+    _local = threading.local()
+    _medicoes = []
+    _agregadas = {}
+    _abertas = set()
+    _execucao_id = None
+    _inicio_execucao = None
+    _inicio_wall = None
+    _data_dir = None
+    # Modo de dump efetivo da execução atual (DUMP validado; None = ainda não resolvido)
+    _dump_execucao = None
+
+    # --- Ciclo da execução ---
+    @classmethod
+    def iniciar_execucao(cls, data_dir):
+        """Zera as medições (uma execução do pipeline = um relatório em data_dir/relatorios)."""
+        with cls._lock:
+            cls._data_dir = data_dir
+            cls._medicoes = []
+            cls._agregadas = {}
+            cls._abertas = set()
+            cls._execucao_id = time.strftime('%Y%m%d-%H%M%S') + "-" + uuid.uuid4().hex[:6]
+            cls._inicio_execucao = time.perf_counter()
+            cls._inicio_wall = time.strftime('%Y-%m-%dT%H:%M:%S')
+            cls._dump_execucao = None
+        if cls.ATIVO and cls.TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return cls._execucao_id
+
+    @classmethod
+    def relatorio(cls):
+        with cls._lock:
+            inicio = cls._inicio_execucao or 0.0
+            etapas = sorted(cls._medicoes, key=lambda m: m.inicio)
+            return {
+                'execucao_id': cls._execucao_id,
+                'inicio': cls._inicio_wall,
+                'duracao_s': round(time.perf_counter() - inicio, 4) if cls._inicio_execucao else None,
+                'python': sys.version.split()[0],
+                'pid': os.getpid(),
+                'config': {
+                    'dump': cls._modo_dump() or None,
+                    'tracemalloc': cls.TRACEMALLOC,
+                    'pipeline_incremental': os.getenv("PIPELINE_INCREMENTAL", "true"),
+                    'pipeline_workers': os.getenv("PIPELINE_WORKERS", "4"),
+                    'etl_workers': os.getenv("ETL_WORKERS", "1"),
+                },
+                'etapas': [m.como_dict(inicio) for m in etapas],
+            }
+
+    @classmethod
+    def salvar_relatorio(cls):
+        """Grava data/relatorios/pipeline_<execucao>.json (e pipeline_ultimo.json). Retorna o caminho."""
+        if not cls.ATIVO or cls._execucao_id is None:
+            return None
+        pasta = os.path.join(cls._data_dir, cls.PASTA_RELATORIOS)
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"pipeline_{cls._execucao_id}.json")
+        conteudo = json.dumps(cls.relatorio(), indent=2, ensure_ascii=False)
+        for destino in (caminho, os.path.join(pasta, "pipeline_ultimo.json")):
+            tmp = destino + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(conteudo)
+            os.replace(tmp, destino)
+        if cls.TRACEMALLOC and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return caminho
+
+    # --- API de instrumentação ---
+    @classmethod
+    @contextmanager
+    def etapa(cls, nome, agregar=False):
+        if not cls.ATIVO:
+            yield Medicao(nome, nome)
+            return
+
+        pilha = cls._pilha()
+        caminho = f"{pilha[-1].caminho}/{nome}" if pilha else nome
+        medicao = cls._nova_medicao(nome, caminho, agregar)
+        # Dump só na etapa de primeiro nível da thread (cProfile não aninha)
+        perfil = cls._iniciar_dump() if not pilha else None
+
+        cls._coletar_pico_tracemalloc()
+        with cls._lock:
+            cls._abertas.add(medicao)
+        pilha.append(medicao)
+        rss_inicio = cls._rss_atual_mb()
+        if medicao.rss_inicio_mb is None:
+            medicao.rss_inicio_mb = rss_inicio
+        inicio = time.perf_counter()
+        cpu_thread = time.thread_time()
+        cpu_processo = time.process_time()
+        cpu_filhos = cls._cpu_filhos()
+        try:
+            yield medicao
+        except BaseException as e:
+            medicao.status = "erro"
+            medicao.erro = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            with cls._lock:
+                medicao.chamadas += 1
+                medicao.duracao_s += time.perf_counter() - inicio
+                medicao.cpu_thread_s += time.thread_time() - cpu_thread
+                medicao.cpu_processo_s += time.process_time() - cpu_processo
+                medicao.cpu_filhos_s += cls._cpu_filhos() - cpu_filhos
+            medicao.rss_fim_mb = cls._rss_atual_mb()
+            medicao.pico_rss_processo_mb = cls._pico_rss_mb()
+            cls._coletar_pico_tracemalloc()
+            pilha.pop()
+            with cls._lock:
+                cls._abertas.discard(medicao)
+            if perfil is not None:
+                cls._salvar_dump(perfil, caminho)
+
+    @classmethod
+    def medir(cls, nome=None, agregar=False):
+        """Decorator: a função inteira vira uma etapa (nome padrão = nome da função)."""
+        def decorador(funcao):
+            @wraps(funcao)
+            def envolvida(*args, **kwargs):
+                with cls.etapa(nome or funcao.__name__, agregar=agregar):
+                    return funcao(*args, **kwargs)
+            return envolvida
+        return decorador
+
+    @classmethod
+    def iterar(cls, nome, iteravel, linhas=len):
+        """
+        Mede o tempo gasto produzindo cada item de um gerador (leitura/descompressão/parse),
+        sem contar o que o consumidor faz com ele. Conta itens e linhas (linhas(item)) produzidos.
+        """
+        iterador = iter(iteravel)
+        while True:
+            with cls.etapa(nome, agregar=True) as m:
+                try:
+                    item = next(iterador)
+                except StopIteration:
+                    return
+                m.extras['itens'] = m.extras.get('itens', 0) + 1
+                m.contar(saida=linhas(item))
+            yield item
+
+    @staticmethod
+    def tamanho(*caminhos):
+        """Bytes de arquivos ou diretórios (datasets particionados); caminhos inexistentes contam 0."""
+        total = 0
+        for caminho in caminhos:
+            if not caminho or not os.path.exists(caminho):
+                continue
+            if os.path.isfile(caminho):
+                total += os.path.getsize(caminho)
+                continue
+            for raiz, _, arquivos in os.walk(caminho):
+                total += sum(os.path.getsize(os.path.join(raiz, f)) for f in arquivos)
+        return total
+
+    # --- Internos ---
+    @classmethod
+    def _pilha(cls):
+        if not hasattr(cls._local, 'pilha'):
+            cls._local.pilha = []
+        return cls._local.pilha
+
+    @classmethod
+    def _nova_medicao(cls, nome, caminho, agregar):
+        with cls._lock:
+            if agregar and caminho in cls._agregadas:
+                return cls._agregadas[caminho]
+            medicao = Medicao(nome, caminho)
+            medicao.inicio = time.perf_counter()
+            cls._medicoes.append(medicao)
+            if agregar:
+                cls._agregadas[caminho] = medicao
+            return medicao
+
+    @staticmethod
+    def _rss_atual_mb():
+        # /proc só existe no Linux (o container do pipeline); fora dele fica só o pico
+        try:
+            with open('/proc/self/statm') as f:
+                paginas = int(f.read().split()[1])
+            return round(paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def _pico_rss_mb():
+        if resource is None:
+            return None
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux devolve KB, macOS devolve bytes
+        return round(pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024, 1)
+
+    @staticmethod
+    def _cpu_filhos():
+        if resource is None:
+            return 0.0
+        uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return uso.ru_utime + uso.ru_stime
+
+    @classmethod
+    def _coletar_pico_tracemalloc(cls):
+        """Repassa o pico desde a última coleta para todas as etapas abertas e zera o contador."""
+        if not tracemalloc.is_tracing():
+            return
+        with cls._lock:
+            pico = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            for medicao in cls._abertas:
+                medicao.pico_tracemalloc_mb = max(medicao.pico_tracemalloc_mb or 0.0, pico)
+            tracemalloc.reset_peak()
+
+    @classmethod
+    def _modo_dump(cls):
+        """
+        DUMP validado uma vez por execução: sem o pyinstrument instalado, a execução
+        atual fica sem dump (avisa uma vez), mas DUMP não muda para as próximas.
+        """
+        with cls._lock:
+            if cls._dump_execucao is None:
+                modo = cls.DUMP
+                if modo == "pyinstrument":
+                    try:
+                        import pyinstrument  # noqa: F401
+                    except ImportError:
+                        logger.warning(
+                            "⚠️ PIPELINE_PROFILE_DUMP=pyinstrument, mas o pyinstrument não está instalado.")
+                        modo = ""
+                cls._dump_execucao = modo
+            return cls._dump_execucao
+
+    @classmethod
+    def _iniciar_dump(cls):
+        modo = cls._modo_dump()
+        if modo == "cprofile":
+            perfil = cProfile.Profile()
+        elif modo == "pyinstrument":
+            from pyinstrument import Profiler
+            perfil = Profiler()
+        else:
+            return None
+        try:
+            # Um profiler por vez no interpretador (etapas concorrentes ficam sem dump)
+            perfil.start() if modo == "pyinstrument" else perfil.enable()
+        except (ValueError, RuntimeError) as e:
+            logger.warning(f"⚠️ Dump de perfil indisponível para esta etapa: {e}")
+            return None
+        return perfil
+
+    @classmethod
+    def _salvar_dump(cls, perfil, caminho_etapa):
+        # Etapa rodada fora do pipeline (ex: python step1_etl.py) grava no diretório atual
+        pasta = os.path.join(cls._data_dir or os.getcwd(), cls.PASTA_RELATORIOS, "perfis",
+                             cls._execucao_id or "avulso")
+        os.makedirs(pasta, exist_ok=True)
+        base = os.path.join(pasta, re.sub(r'[^\w.-]+', '_', caminho_etapa))
+        if isinstance(perfil, cProfile.Profile):
+            perfil.disable()
+            perfil.dump_stats(base + ".prof")
+        else:
+            perfil.stop()
+            with open(base + ".html", 'w', encoding='utf-8') as f:
+                f.write(perfil.output_html())
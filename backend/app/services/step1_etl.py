@@ -1,4 +1,5 @@
 import os
+import shutil
 import pandas as pd
 import zipfile
 from dotenv import load_dotenv
@@ -7,9 +8,15 @@ from dotenv import load_dotenv
 try:
     from ans_scrapper import ANSScraper
     from data_processor import DataProcessor
+    from parquet_store import ParquetStore
+    from pipeline_manifest import PipelineManifest
+    from pipeline_profiler import PipelineProfiler
 except ImportError:
     from app.services.ans_scrapper import ANSScraper
     from app.services.data_processor import DataProcessor
+    from app.services.parquet_store import ParquetStore
+    from app.services.pipeline_manifest import PipelineManifest
+    from app.services.pipeline_profiler import PipelineProfiler
 
 load_dotenv()
 
@@ -30,48 +37,197 @@ class Step1ETL:
         ROOT_DIR = possible_root_docker
 
     DATA_DIR = os.path.join(ROOT_DIR, "data")
+    # Quantos trimestres mais recentes processar
+    N_TRIMESTRES = int(os.getenv("ANS_N_TRIMESTRES", "3"))
+    COLUNAS_CONSOLIDADO = ['CNPJ', 'RAZAOSOCIAL', 'ANO', 'TRIMESTRE', 'VALORDESPESAS']
+    # Intermediário tipado (Parquet particionado por ANO/TRIMESTRE) lido pela Etapa 2
+    PARQUET_CONSOLIDADO = os.path.join(DATA_DIR, "consolidado_despesas")
 
     @classmethod
     def execute(cls):
         print("🚀 [ETAPA 1] Iniciando Integração e Consolidação...")
-        
-        # 1. Identificar e Baixar ZIPs
-        urls = ANSScraper.identificar_arquivos_trimestrais(cls.BASE_URL)
-        zips = ANSScraper.baixar_arquivos(urls, cls.DATA_DIR)
-        
+        cls.consolidar(cls.baixar_zips())
+
+    @classmethod
+    def baixar_zips(cls):
+        """1. Identificar e Baixar ZIPs (tarefa independente do CADOP no orquestrador)."""
+        with PipelineProfiler.etapa("listagem") as m:
+            urls = ANSScraper.identificar_arquivos_trimestrais(
+                cls.BASE_URL, n_trimestres=cls.N_TRIMESTRES, cache_dir=cls.DATA_DIR)
+            m.extras['urls'] = len(urls or [])
+        with PipelineProfiler.etapa("download") as m:
+            zips = ANSScraper.baixar_arquivos(urls, cls.DATA_DIR)
+            # ZIPs pulados pelo manifesto de downloads também entram (tamanho do que está em disco)
+            m.extras['arquivos'] = len(zips or [])
+            m.extras['bytes_zips'] = PipelineProfiler.tamanho(*(zips or []))
+        return zips
+
+    @classmethod
+    def consolidar(cls, zips):
+        """2. Processa os ZIPs baixados e publica o consolidado (CSV/Parquet)."""
         if not zips:
             print("❌ Nenhum arquivo baixado.")
             return
 
-        # 2. Processar (Apenas extração)
+        # ZIP fora do padrão NTAAAA (ex: pasta com outros arquivos) não tem trimestre: fica de fora
+        periodo_zip = {}
+        for z in zips:
+            periodo = DataProcessor.periodo_numerico(z)
+            if periodo is None:
+                print(f"⚠️ Ignorando {os.path.basename(z)}: nome fora do padrão de trimestre (ex: 1T2025.zip).")
+                continue
+            periodo_zip[z] = periodo
+        zips = list(periodo_zip)
+        if not zips:
+            print("❌ Nenhum ZIP trimestral válido.")
+            return
+
+        usar_parquet = ParquetStore.disponivel()
+        exportar_csv = ParquetStore.EXPORTAR_CSV or not usar_parquet
+        manifesto = PipelineManifest.carregar(cls.DATA_DIR)
+        periodos_fonte = set(periodo_zip.values())
+
+        # 1.1 Modo incremental: só os trimestres com ZIP novo/alterado (manifesto: tamanho + sha256)
+        # Precisa do Parquet particionado de uma execução anterior para trocar só essas partições
+        incremental = (PipelineManifest.INCREMENTAL and usar_parquet
+                       and ParquetStore.existe(cls.PARQUET_CONSOLIDADO))
+        if incremental:
+            periodos_alterados = {
+                periodo_zip[z] for z in zips if PipelineManifest.arquivo_alterado(manifesto, z)}
+            # Trimestres que saíram da janela de N_TRIMESTRES somem dos arquivos (o banco guarda o histórico)
+            fora_da_janela = ParquetStore.periodos(cls.PARQUET_CONSOLIDADO) - periodos_fonte
+            if not periodos_alterados and not fora_da_janela:
+                print("⏭️ Nenhum ZIP novo ou alterado desde a última execução.")
+                print("✅ [FIM ETAPA 1] Consolidado já atualizado.")
+                return
+            # Todos os ZIPs de um trimestre alterado são relidos (a partição é trocada inteira)
+            a_processar = [z for z in zips if periodo_zip[z] in periodos_alterados]
+            print(f"♻️ Modo incremental: {len(a_processar)} de {len(zips)} ZIPs a processar "
+                  f"(trimestres {sorted(periodos_alterados)}).")
+        else:
+            periodos_alterados = periodos_fonte
+            fora_da_janela = set()
+            a_processar = zips
+
+        # 2. Processar + Consolidar em streaming (memória constante)
+        # Cada chunk é normalizado, convertido, filtrado e gravado antes do próximo ser lido
         print("\n⚙️ Processando arquivos brutos...")
-        lista_dfs = DataProcessor.processar_e_normalizar(zips, cls.DATA_DIR)
-        
-        if not lista_dfs:
+        csv_path = os.path.join(cls.DATA_DIR, "consolidado_despesas.csv")
+        tmp_path = csv_path + ".tmp"
+        tmp_parquet = ParquetStore.novo_dataset(cls.PARQUET_CONSOLIDADO) if usar_parquet else None
+
+        linhas_lidas = 0
+        linhas_gravadas = 0
+        # No incremental o CSV completo é regerado a partir do Parquet no final
+        saida = None
+        if exportar_csv and not incremental:
+            saida = open(tmp_path, 'w', encoding='utf-8-sig', newline='')
+        with PipelineProfiler.etapa("processamento") as medicao:
+            try:
+                # extracao = leitura do ZIP + parse do CSV + filtro 411 (tempo do gerador)
+                for chunk in PipelineProfiler.iterar(
+                        "extracao", DataProcessor.iterar_normalizado(a_processar, cls.DATA_DIR)):
+                    linhas_lidas += len(chunk)
+                    with PipelineProfiler.etapa("tratamento", agregar=True) as m:
+                        m.contar(entrada=len(chunk))
+                        chunk = cls._tratar_chunk(chunk)
+                        m.contar(saida=len(chunk))
+                    if chunk.empty:
+                        continue
+                    with PipelineProfiler.etapa("gravacao", agregar=True) as m:
+                        if usar_parquet:
+                            ParquetStore.anexar(tmp_parquet, ParquetStore.tipar_despesas(chunk))
+                        if saida:
+                            # Cabeçalho só no primeiro bloco gravado
+                            chunk.to_csv(saida, index=False, sep=';', header=(linhas_gravadas == 0))
+                        m.contar(entrada=len(chunk))
+                    linhas_gravadas += len(chunk)
+
+                if saida and linhas_gravadas == 0:
+                    saida.write(';'.join(cls.COLUNAS_CONSOLIDADO) + '\n')
+            finally:
+                if saida:
+                    saida.close()
+            medicao.contar(entrada=linhas_lidas, saida=linhas_gravadas,
+                           lidos=PipelineProfiler.tamanho(*a_processar),
+                           gravados=PipelineProfiler.tamanho(tmp_parquet, tmp_path if saida else None))
+
+        if a_processar and linhas_lidas == 0:
+            if saida:
+                os.remove(tmp_path)
+            if tmp_parquet:
+                shutil.rmtree(tmp_parquet, ignore_errors=True)
             print("❌ Nenhum dado encontrado.")
             return
 
-        # 3. Consolidação e Tratamento Básico (Remover duplicados exatos)
-        print("\n📊 Consolidando...")
-        df_final = pd.concat(lista_dfs, ignore_index=True)
+        # Publica as saídas (troca atômica: nunca ficam meio escritas)
+        if incremental:
+            ParquetStore.substituir_particoes(
+                cls.PARQUET_CONSOLIDADO, tmp_parquet, periodos_alterados | fora_da_janela)
+            print(f"🧱 Partições atualizadas: {sorted(periodos_alterados)}"
+                  + (f" | removidas: {sorted(fora_da_janela)}" if fora_da_janela else ""))
+        elif usar_parquet:
+            ParquetStore.publicar_dataset(tmp_parquet, cls.PARQUET_CONSOLIDADO)
+            print(f"🧱 Parquet particionado: {cls.PARQUET_CONSOLIDADO}")
+        print(f"\n📊 Consolidado: {linhas_gravadas} linhas gravadas ({linhas_lidas} lidas).")
 
-        # Tratamento de valores numéricos (Vírgula -> Ponto)
-        df_final['VALORDESPESAS'] = df_final['VALORDESPESAS'].astype(str).str.replace(',', '.')
-        df_final['VALORDESPESAS'] = pd.to_numeric(df_final['VALORDESPESAS'], errors='coerce').fillna(0)
-        
-        # Filtra valores zerados (conforme pedido na Análise de Inconsistências)
-        df_final = df_final[df_final['VALORDESPESAS'] > 0]
+        cls._registrar_manifesto(manifesto, zips, periodo_zip, periodos_alterados, incremental)
+
+        if not exportar_csv:
+            print("✅ [FIM ETAPA 1] Exportação CSV/ZIP desligada (ETL_EXPORTAR_CSV=false).")
+            return
 
-        # Salva o arquivo "Bruto/Consolidado"
-        csv_path = os.path.join(cls.DATA_DIR, "consolidado_despesas.csv")
-        df_final.to_csv(csv_path, index=False, sep=';', encoding='utf-8-sig')
-        
         zip_path = os.path.join(cls.DATA_DIR, "consolidado_despesas.zip")
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
-            z.write(csv_path, arcname="consolidado_despesas.csv")
+        with PipelineProfiler.etapa("exportar_csv") as m:
+            if incremental:
+                cls._exportar_csv_do_parquet(tmp_path)
+            os.replace(tmp_path, csv_path)
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+                z.write(csv_path, arcname="consolidado_despesas.csv")
+            m.contar(gravados=PipelineProfiler.tamanho(csv_path, zip_path))
 
         print(f"✅ [FIM ETAPA 1] Arquivo gerado: {zip_path}")
         print("⚠️ Nota: Este arquivo pode conter 'NAO DISPONIVEL' na Razão Social. Isso será corrigido na Etapa 2.")
 
+    @classmethod
+    def _registrar_manifesto(cls, manifesto, zips, periodo_zip, periodos_alterados, incremental):
+        """Grava os ZIPs processados e marca os trimestres alterados como pendentes para as Etapas 2 e 3."""
+        arquivos = {}
+        for z in zips:
+            nome = os.path.basename(z)
+            if periodo_zip[z] in periodos_alterados or nome not in manifesto['arquivos']:
+                arquivos[nome] = PipelineManifest.descrever_arquivo(z, periodo_zip[z])
+            else:
+                arquivos[nome] = manifesto['arquivos'][nome]
+        manifesto['arquivos'] = arquivos
+
+        # Modo completo: todos os trimestres da janela serão regravados
+        pendentes = {tuple(p) for p in manifesto['pendentes']} if incremental else set()
+        pendentes |= periodos_alterados
+        manifesto['pendentes'] = [list(p) for p in sorted(pendentes)]
+        PipelineManifest.salvar(cls.DATA_DIR, manifesto)
+
+    @classmethod
+    def _exportar_csv_do_parquet(cls, destino):
+        """Regera o CSV entregável a partir do dataset, um trimestre por vez."""
+        periodos = sorted(ParquetStore.periodos(cls.PARQUET_CONSOLIDADO))
+        with open(destino, 'w', encoding='utf-8-sig', newline='') as saida:
+            if not periodos:
+                saida.write(';'.join(cls.COLUNAS_CONSOLIDADO) + '\n')
+            for i, periodo in enumerate(periodos):
+                df = ParquetStore.ler(cls.PARQUET_CONSOLIDADO, periodos=[periodo])
+                df[cls.COLUNAS_CONSOLIDADO].to_csv(saida, index=False, sep=';', header=(i == 0))
+
+    @staticmethod
+    def _tratar_chunk(chunk):
+        """Tratamento Básico de um bloco já normalizado pelo DataProcessor."""
+        chunk = chunk.copy()
+        # Tratamento de valores numéricos (Vírgula -> Ponto)
+        chunk['VALORDESPESAS'] = chunk['VALORDESPESAS'].astype(str).str.replace(',', '.')
+        chunk['VALORDESPESAS'] = pd.to_numeric(chunk['VALORDESPESAS'], errors='coerce').fillna(0)
+
+        # Filtra valores zerados (conforme pedido na Análise de Inconsistências)
+        return chunk[chunk['VALORDESPESAS'] > 0]
+
 if __name__ == "__main__":
     Step1ETL.execute()
\ No newline at end of file
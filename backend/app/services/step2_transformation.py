@@ -5,8 +5,20 @@ from dotenv import load_dotenv
 
 try:
     from ans_scrapper import ANSScraper
+    from csv_reader import CSVReader
+    from parquet_store import ParquetStore
+    from pipeline_manifest import PipelineManifest
+    from cadop_index import CadopIndex
+    from estatisticas_online import EstatisticasOnline
+    from pipeline_profiler import PipelineProfiler
 except ImportError:
     from app.services.ans_scrapper import ANSScraper
+    from app.services.csv_reader import CSVReader
+    from app.services.parquet_store import ParquetStore
+    from app.services.pipeline_manifest import PipelineManifest
+    from app.services.cadop_index import CadopIndex
+    from app.services.estatisticas_online import EstatisticasOnline
+    from app.services.pipeline_profiler import PipelineProfiler
 
 load_dotenv()
 
@@ -28,97 +40,200 @@ class Step2Transformation:
     DATA_DIR = os.path.join(ROOT_DIR, "data")
     URL_CADOP = os.getenv("ANS_CADASTRO_OPERADORAS_URL", "")
 
+    # Intermediários Parquet (entrada da Etapa 1 / saídas lidas pela Etapa 3)
+    PARQUET_CONSOLIDADO = os.path.join(DATA_DIR, "consolidado_despesas")
+    PARQUET_ENRIQUECIDO = os.path.join(DATA_DIR, "despesas_enriquecidas")
+    PARQUET_AGREGADO = os.path.join(DATA_DIR, "despesas_agregadas.parquet")
+    # Estados por trimestre (N, soma, média, M2) de onde o agregado é recombinado
+    PARQUET_ESTADOS = os.path.join(DATA_DIR, "estados_agregado")
+    CHAVES_AGREGADO = ['RAZAO_FINAL', 'UF']
+    # Mantendo as colunas exigidas no item 1.3 do desafio
+    COLS_FINAIS_CONSOLIDADO = ['CNPJ', 'RAZAOSOCIAL', 'ANO', 'TRIMESTRE', 'VALORDESPESAS']
+
     @classmethod
-    def execute(cls):
+    def execute(cls, caminho_cadop=None):
+        """
+        caminho_cadop: CADOP já baixado (pelo orquestrador); sem ele a etapa baixa o arquivo.
+        Retorna True se o enriquecido/agregado foi gerado e False em caso de falha.
+        """
         print("\n🚀 [ETAPA 2] Transformação, Validação e Enriquecimento...")
         
         input_csv = os.path.join(cls.DATA_DIR, "consolidado_despesas.csv")
-        if not os.path.exists(input_csv):
+        usar_parquet = ParquetStore.existe(cls.PARQUET_CONSOLIDADO)
+        if not usar_parquet and not os.path.exists(input_csv):
             print("❌ Execute a Etapa 1 primeiro!")
-            return
+            return False
+
+        # 0. Modo incremental: só os trimestres pendentes no manifesto (os demais já estão enriquecidos)
+        pendentes = PipelineManifest.pendentes(cls.DATA_DIR)
+        incremental = (PipelineManifest.INCREMENTAL and usar_parquet and pendentes is not None
+                       and ParquetStore.existe(cls.PARQUET_ESTADOS))
+        if incremental:
+            periodos_atuais = ParquetStore.periodos(cls.PARQUET_CONSOLIDADO)
+            # Trimestres que saíram do consolidado também saem dos derivados
+            removidos = (ParquetStore.periodos(cls.PARQUET_ENRIQUECIDO)
+                         | ParquetStore.periodos(cls.PARQUET_ESTADOS)) - periodos_atuais
+            alvo = set(pendentes) | removidos
+            periodos_leitura = sorted(p for p in alvo if p in periodos_atuais)
+            print(f"♻️ Modo incremental: trimestres a reprocessar {sorted(alvo)}")
+
+        if incremental and not alvo:
+            print("⏭️ Nenhum trimestre pendente: recombinando o agregado a partir dos estados salvos.")
+            estado = None
+        else:
+            # 1. Cadastro de operadoras (uma vez para todos os trimestres)
+            dim = cls._carregar_cadop(caminho_cadop)
+            if dim is None:
+                return False
+
+            # 2. Consolidado da Etapa 1, um trimestre por vez (Parquet) ou inteiro (CSV sem pyarrow)
+            if usar_parquet:
+                periodos = periodos_leitura if incremental else sorted(ParquetStore.periodos(cls.PARQUET_CONSOLIDADO))
+                blocos = ((p, ParquetStore.ler(cls.PARQUET_CONSOLIDADO, periodos=[p])) for p in periodos)
+                tmp_enriquecido = ParquetStore.novo_dataset(cls.PARQUET_ENRIQUECIDO)
+                tmp_estados = ParquetStore.novo_dataset(cls.PARQUET_ESTADOS)
+            else:
+                print("📖 Lendo consolidado da Etapa 1...")
+                blocos = [(None, CSVReader.ler(input_csv, sep=';'))]
+
+            # Agregação online (Item 2.3): o estado de cada trimestre é fundido no acumulado
+            estado = None
+            chaves_trimestre = ['ANO', 'TRIMESTRE'] + cls.CHAVES_AGREGADO
+            for periodo, df in PipelineProfiler.iterar("leitura", blocos, linhas=lambda b: len(b[1])):
+                if periodo:
+                    print(f"📖 Trimestre {periodo[1]}T{periodo[0]}: {len(df)} linhas")
+                with PipelineProfiler.etapa("merge_cadop", agregar=True) as m:
+                    df_merged = cls._enriquecer(df, dim)
+                    df_enriquecido = df_merged[cls.COLS_FINAIS_CONSOLIDADO]
+                    m.contar(entrada=len(df), saida=len(df_merged))
+
+                with PipelineProfiler.etapa("groupby", agregar=True) as m:
+                    df_merged['VALORDESPESAS'] = pd.to_numeric(df_merged['VALORDESPESAS'], errors='coerce').fillna(0)
+                    estado_trimestre = EstatisticasOnline.estados(df_merged, chaves_trimestre, 'VALORDESPESAS')
+                    estado = EstatisticasOnline.acumular(estado, estado_trimestre, chaves_trimestre)
+                    m.contar(entrada=len(df_merged), saida=len(estado_trimestre))
+
+                with PipelineProfiler.etapa("gravacao", agregar=True) as m:
+                    if usar_parquet:
+                        # Intermediário que o Banco de Dados (Step 3) vai ler + estado persistido do trimestre
+                        ParquetStore.anexar(tmp_enriquecido, ParquetStore.tipar_despesas(df_enriquecido))
+                        ParquetStore.anexar(tmp_estados, cls._tipar_estados(estado_trimestre))
+                    else:
+                        # Sobrescrevemos o arquivo CSV que o Banco de Dados (Step 3) vai ler
+                        df_enriquecido.to_csv(input_csv, index=False, sep=';', encoding='utf-8-sig')
+                    m.contar(entrada=len(df_enriquecido))
+
+            if usar_parquet:
+                with PipelineProfiler.etapa("publicacao") as m:
+                    if incremental:
+                        ParquetStore.substituir_particoes(cls.PARQUET_ENRIQUECIDO, tmp_enriquecido, alvo)
+                        ParquetStore.substituir_particoes(cls.PARQUET_ESTADOS, tmp_estados, alvo)
+                    else:
+                        ParquetStore.publicar_dataset(tmp_enriquecido, cls.PARQUET_ENRIQUECIDO)
+                        ParquetStore.publicar_dataset(tmp_estados, cls.PARQUET_ESTADOS)
+                    m.contar(gravados=PipelineProfiler.tamanho(cls.PARQUET_ENRIQUECIDO, cls.PARQUET_ESTADOS))
+                # Sobrescrevemos o arquivo CSV (entregável)
+                if ParquetStore.EXPORTAR_CSV:
+                    with PipelineProfiler.etapa("exportar_csv") as m:
+                        cls._exportar_csv_do_parquet(input_csv)
+                        m.contar(gravados=PipelineProfiler.tamanho(input_csv))
+
+        # 7. Agregado final: no incremental, funde os estados salvos de todos os trimestres
+        # (trimestre novo = só o estado dele é calculado; o histórico não é relido)
+        print("📊 Calculando Estatísticas...")
+        with PipelineProfiler.etapa("agregado_final") as m:
+            if incremental:
+                estado = ParquetStore.ler(cls.PARQUET_ESTADOS)
+            agregado = cls._finalizar_agregado(estado)
+            m.contar(entrada=0 if estado is None else len(estado), saida=len(agregado))
+
+        # 8. Salvar
+        if ParquetStore.disponivel():
+            ParquetStore.salvar_tabela(agregado, cls.PARQUET_AGREGADO)
+
+        if not ParquetStore.EXPORTAR_CSV and ParquetStore.disponivel():
+            print(f"✅ [FIM ETAPA 2] Arquivo final: {cls.PARQUET_AGREGADO}")
+            print(agregado.head())
+            return True
+
+        output_csv = os.path.join(cls.DATA_DIR, "despesas_agregadas.csv")
+        agregado.to_csv(output_csv, index=False, sep=';', encoding='utf-8-sig')
+        
+        output_zip = os.path.join(cls.DATA_DIR, "Teste_Talita_Mendonca.zip")
+        with zipfile.ZipFile(output_zip, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(output_csv, arcname="despesas_agregadas.csv")
 
-        # 1. Carregar Consolidado da Etapa 1
-        print("📖 Lendo consolidado da Etapa 1...")
-        df = pd.read_csv(input_csv, sep=';', dtype=str)
+        print(f"✅ [FIM ETAPA 2] Arquivo final: {output_zip}")
+        print(agregado.head())
+        return True
 
-        # 2. Baixar CADOP
-        caminho_cadop = ANSScraper.baixar_cadop(cls.DATA_DIR, cls.URL_CADOP)
+    @classmethod
+    def _carregar_cadop(cls, caminho_cadop=None):
+        # Baixar CADOP (pulado pelo manifesto de downloads se não mudou no servidor)
+        caminho_cadop = caminho_cadop or ANSScraper.baixar_cadop(cls.DATA_DIR, cls.URL_CADOP)
         if not caminho_cadop:
             print("❌ Falha ao baixar CADOP. Abortando Etapa 2.")
-            return
+            return None
 
-        # 3. Carregar e Preparar CADOP para Join
+        # Índice de operadoras (limpo e serializado; refeito só quando o CADOP muda)
         print("📚 Preparando Cadastro de Operadoras...")
-        cadop = pd.read_csv(caminho_cadop, sep=';',
-                            encoding='utf-8-sig', dtype=str, quotechar='"')
-        cadop.columns = [c.upper().strip() for c in cadop.columns]
-
-        # Identificar colunas do CADOP
-        col_reg = next(c for c in cadop.columns if 'REGISTRO' in c)
-        col_cnpj = next(c for c in cadop.columns if 'CNPJ' in c)
-        col_razao = next(c for c in cadop.columns if 'RAZAO' in c)
-        col_uf = next(c for c in cadop.columns if 'UF' in c)
-        col_mod = next(c for c in cadop.columns if 'MODALIDADE' in c)
-
-        # Limpeza Chaves CADOP
-        cadop['KEY_JOIN'] = cadop[col_reg].str.replace(r'\D', '', regex=True).str.zfill(6)
-        cadop['CNPJ_CLEAN'] = cadop[col_cnpj].str.replace(r'\D', '', regex=True).str.zfill(14)
-        
-        # Selecionar apenas o necessário (Lookup Table)
-        cadop_lookup = cadop[['KEY_JOIN', 'CNPJ_CLEAN', col_razao, col_uf, col_mod]].copy()
-        cadop_lookup.columns = ['KEY', 'CNPJ_REAL', 'RAZAO_REAL', 'UF', 'MODALIDADE']
+        return CadopIndex.carregar(caminho_cadop)
 
-        # 4. Preparar Consolidado para Join
+    @classmethod
+    def _enriquecer(cls, df, dim):
+        """Cruza o consolidado com o CADOP (CNPJ de 14 dígitos, razão social, UF e modalidade)."""
+        # 4. JOIN (Enriquecimento)
         # O consolidado da Etapa 1 pode ter CNPJ ou REG_ANS na coluna 'CNPJ'
-        # Vamos assumir que é o REG_ANS (comum nos arquivos 411) e limpar
-        df['KEY'] = df['CNPJ'].str.replace(r'\D', '', regex=True).str.zfill(6)
-
-        # 5. JOIN (Enriquecimento)
-        print("🔗 Cruzando dados (Join Consolidado x CADOP)...")
-        df_merged = pd.merge(df, cadop_lookup, on='KEY', how='left')
+        # Vamos assumir que é o REG_ANS (comum nos arquivos 411): lookup vetorizado no índice
+        print("🔗 Cruzando dados (Consolidado x índice do CADOP)...")
+        cadastro = CadopIndex.enriquecer(dim, df['CNPJ'])
+        df_merged = df
 
-        # 6. Substituição e Correção
+        # 5. Substituição e Correção
         # Se achou no CADOP, usa o dado do CADOP. Se não, mantém o original (com flag)
-        df_merged['CNPJ_FINAL'] = df_merged['CNPJ_REAL'].fillna(df_merged['CNPJ'])
-        df_merged['RAZAO_FINAL'] = df_merged['RAZAO_REAL'].fillna("NAO ENCONTRADA NO CADASTRO")
-        df_merged['UF'] = df_merged['UF'].fillna("N/I")
-        df_merged['MODALIDADE'] = df_merged['MODALIDADE'].fillna("DESCONHECIDA")
+        df_merged['RAZAO_FINAL'] = cadastro['razao_social'].fillna("NAO ENCONTRADA NO CADASTRO")
+        df_merged['UF'] = cadastro['uf'].fillna("N/I")
+        df_merged['MODALIDADE'] = cadastro['modalidade'].fillna("DESCONHECIDA")
 
-        # 6.1. Atualizar o consolidado com dados reais de 14 dígitos (Mão na massa!)
+        # 6. Atualizar o consolidado com dados reais de 14 dígitos (Mão na massa!)
         # Isso garante que o banco de dados (Etapa 3) consiga ligar as tabelas corretamente.
         print("💾 Atualizando consolidado com CNPJs de 14 dígitos e Nomes Reais...")
-
-        # Substituímos as colunas originais pelas enriquecidas do CADOP
-        df_merged['CNPJ'] = df_merged['CNPJ_FINAL']
+        df_merged['CNPJ'] = cadastro['cnpj'].fillna(df_merged['CNPJ'])
         df_merged['RAZAOSOCIAL'] = df_merged['RAZAO_FINAL']
 
-        # Sobrescrevemos o arquivo CSV que o Banco de Dados (Step 3) vai ler
-        # Mantendo as colunas exigidas no item 1.3 do desafio
-        cols_finais_consolidado = [
-            'CNPJ', 'RAZAOSOCIAL', 'ANO', 'TRIMESTRE', 'VALORDESPESAS']
-        df_merged[cols_finais_consolidado].to_csv(
-            input_csv, index=False, sep=';', encoding='utf-8-sig')
+        return df_merged
 
-        # 7. Agregação (Item 2.3)
-        print("📊 Calculando Estatísticas...")
-        df_merged['VALORDESPESAS'] = pd.to_numeric(df_merged['VALORDESPESAS'], errors='coerce').fillna(0)
-        
-        agregado = df_merged.groupby(['RAZAO_FINAL', 'UF'])['VALORDESPESAS'].agg(
-            TOTAL=('sum'),  # Total de despesas
-            MEDIA=('mean'),  # Média por trimestre
-            DESVIO=('std')  # Desvio padrão
-        ).reset_index().sort_values(by='TOTAL', ascending=False)
+    @staticmethod
+    def _tipar_estados(estado):
+        estado = estado.copy()
+        estado['ANO'] = pd.to_numeric(estado['ANO'], errors='coerce').fillna(0).astype('int16')
+        estado['TRIMESTRE'] = pd.to_numeric(estado['TRIMESTRE'], errors='coerce').fillna(0).astype('int8')
+        return estado
 
-        # 8. Salvar
-        output_csv = os.path.join(cls.DATA_DIR, "despesas_agregadas.csv")
-        agregado.to_csv(output_csv, index=False, sep=';', encoding='utf-8-sig')
-        
-        output_zip = os.path.join(cls.DATA_DIR, "Teste_Talita_Mendonca.zip")
-        with zipfile.ZipFile(output_zip, 'w', zipfile.ZIP_DEFLATED) as z:
-            z.write(output_csv, arcname="despesas_agregadas.csv")
+    @classmethod
+    def _finalizar_agregado(cls, estado):
+        """TOTAL, MEDIA e DESVIO por (RAZAO_FINAL, UF) a partir dos estados por trimestre."""
+        if estado is None:
+            estado = pd.DataFrame(columns=cls.CHAVES_AGREGADO + EstatisticasOnline.COLUNAS)
+        t = EstatisticasOnline.combinar(estado, cls.CHAVES_AGREGADO)
+        agregado = t[cls.CHAVES_AGREGADO].copy()
+        agregado['TOTAL'] = t['SOMA']  # Total de despesas
+        agregado['MEDIA'] = t['MEDIA']  # Média por trimestre
+        agregado['DESVIO'] = EstatisticasOnline.desvio_padrao(t)  # Desvio padrão
+        return agregado.sort_values(by='TOTAL', ascending=False).reset_index(drop=True)
 
-        print(f"✅ [FIM ETAPA 2] Arquivo final: {output_zip}")
-        print(agregado.head())
+    @classmethod
+    def _exportar_csv_do_parquet(cls, destino):
+        """Regera o CSV enriquecido completo a partir do dataset, um trimestre por vez."""
+        tmp = destino + ".tmp"
+        periodos = sorted(ParquetStore.periodos(cls.PARQUET_ENRIQUECIDO))
+        with open(tmp, 'w', encoding='utf-8-sig', newline='') as saida:
+            if not periodos:
+                saida.write(';'.join(cls.COLS_FINAIS_CONSOLIDADO) + '\n')
+            for i, periodo in enumerate(periodos):
+                df = ParquetStore.ler(cls.PARQUET_ENRIQUECIDO, periodos=[periodo])
+                df[cls.COLS_FINAIS_CONSOLIDADO].to_csv(saida, index=False, sep=';', header=(i == 0))
+        os.replace(tmp, destino)
 
 if __name__ == "__main__":
     Step2Transformation.execute()
\ No newline at end of file
@@ -1,9 +1,16 @@
 # backend/app/services/step3_db_ingestion.py
 
+import io
 import os
+import time
 import pandas as pd
 import logging
-from app.db.connection import get_db_connection
+from app.db.connection import get_db_connection, release_db_connection
+from app.services.csv_reader import CSVReader
+from app.services.parquet_store import ParquetStore
+from app.services.pipeline_manifest import PipelineManifest
+from app.services.cadop_index import CadopIndex
+from app.services.pipeline_profiler import PipelineProfiler
 
 # Configuração de Logs para vermos o que está acontecendo
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +36,9 @@ class Step3DBIngestion:
     FILE_CONSOLIDADO = os.path.join(DATA_DIR, "consolidado_despesas.csv")
     FILE_CADOP = os.path.join(DATA_DIR, "Relatorio_Cadop.csv")
     FILE_AGREGADO = os.path.join(DATA_DIR, "despesas_agregadas.csv")
+    # Intermediários Parquet da Etapa 2 (preferidos quando existem: já vêm tipados)
+    PARQUET_ENRIQUECIDO = os.path.join(DATA_DIR, "despesas_enriquecidas")
+    PARQUET_AGREGADO = os.path.join(DATA_DIR, "despesas_agregadas.parquet")
     # Arquivo SQL
     FILE_CREATE_TABLES = os.path.join(SQL_DIR, "create_tables.sql")
 
@@ -40,34 +50,67 @@ class Step3DBIngestion:
         """Executa o pipeline completo da Etapa 3."""
         print("\n🚀 [ETAPA 3] Ingestão no PostgreSQL...")
 
-        if not os.path.exists(cls.FILE_CONSOLIDADO) or not os.path.exists(cls.FILE_CADOP):
+        tem_despesas = ParquetStore.existe(cls.PARQUET_ENRIQUECIDO) or os.path.exists(cls.FILE_CONSOLIDADO)
+        if not tem_despesas or not os.path.exists(cls.FILE_CADOP):
             print(
                 "❌ Arquivos necessários não encontrados na pasta data/. Rode Etapa 1 e 2.")
-            return
+            return False
+
+        # 1. Estrutura do banco | 2. Operadoras | 3-6. Despesas e derivados
+        # (o ANSService roda esses blocos como tarefas separadas do grafo do pipeline)
+        if not cls.preparar_banco() or not cls.processar_e_inserir_operadoras():
+            print("❌ [ETAPA 3] Interrompida antes da carga das despesas.")
+            return False
+        if not cls.carregar_fatos():
+            print("❌ [ETAPA 3] Carga concluída com falhas (veja os erros acima).")
+            return False
+
+        print("✅ [FIM ETAPA 3] Banco de dados populado com sucesso!")
+        return True
 
+
+    @classmethod
+    def preparar_banco(cls):
+        """Retorna False se o schema ou a Dummy não puderam ser garantidos (o orquestrador cancela o resto)."""
         # 1. Garantir que as tabelas existem (Lê o arquivo .sql e executa)
-        cls.criar_tabelas()
+        if not cls.criar_tabelas():
+            return False
 
         # [NOVO] Garante que existe a operadora para receber despesas órfãs
-        cls._criar_operadora_dummy()
-
-        # 2. Processar Operadoras 
-        cls.processar_e_inserir_operadoras()
+        return cls._criar_operadora_dummy()
 
-        # 3. Processar Despesas (Brutas)
-        cls.processar_e_inserir_despesas()
+    @classmethod
+    def carregar_fatos(cls):
+        """
+        Despesas, agregados e tudo que é derivado deles (depende das operadoras já carregadas).
+        Retorna False se alguma parte falhou; falha na carga das despesas interrompe o resto.
+        """
+        # 3. Processar Despesas (Brutas): só os trimestres pendentes, substituídos por inteiro
+        despesas = cls.processar_e_inserir_despesas()
+        if despesas is None:
+            return False
+        sucesso = True
 
         # 4. Inserir Agregados 
-        cls.processar_e_inserir_agregados()
+        sucesso = cls.processar_e_inserir_agregados() and sucesso
 
-        print("✅ [FIM ETAPA 3] Banco de dados populado com sucesso!")
+        # 5. REFRESH do rollup trimestral (lido pela API e pelas queries analíticas)
+        if despesas:
+            sucesso = cls.atualizar_rollup_trimestral() and sucesso
+
+        # 5.1 Atualizar o resumo de atividade usado pelos filtros da API (lê o rollup)
+        sucesso = cls.atualizar_atividade_operadoras() and sucesso
+
+        # 6. Nova versão dos dados (invalida o cache da API): roda mesmo com falha parcial,
+        # porque as despesas já podem ter mudado
+        return cls.registrar_nova_versao() and sucesso
 
 
     @classmethod
     def _criar_operadora_dummy(cls):
         conn = get_db_connection()
         if not conn:
-                return
+            return False
         try:
             cursor = conn.cursor()
             # Insere a operadora "Lixeira" para despesas órfãs
@@ -78,11 +121,13 @@ class Step3DBIngestion:
             """, (cls.CNPJ_DUMMY,))
             conn.commit()
             print("👻 Operadora 'Dummy' (Desconhecida) verificada.")
+            return True
         except Exception as e:
             conn.rollback()
             print(f"❌ Erro ao criar dummy: {e}")
+            return False
         finally:
-            conn.close()
+            release_db_connection(conn)
 
 
     @classmethod
@@ -91,7 +136,7 @@ class Step3DBIngestion:
         print("🏗️ Verificando estrutura do banco...")
         conn = get_db_connection()
         if not conn:
-            return
+            return False
 
         try:
             with open(cls.FILE_CREATE_TABLES, "r", encoding="utf-8-sig") as f:
@@ -101,93 +146,68 @@ class Step3DBIngestion:
                 cursor.execute(sql_script)
                 conn.commit()
                 logger.info("🚀 Tabelas criadas/verificadas com sucesso!")
+            return True
         except Exception as e:
+            conn.rollback()
             logger.error(f"❌ Erro ao criar tabelas: {e}")
+            return False
         finally:
-            conn.close()
+            release_db_connection(conn)
 
 
     @classmethod
+    @PipelineProfiler.medir("carga_operadoras")
     def processar_e_inserir_operadoras(cls):
         print("📚 Lendo e tratando arquivo CADOP...")
         try:
-            # Lendo CADOP com tratamento de encoding para corrigir o "SAÚDE"
-            # 1. Resiliência de Encoding
-            try:
-                cadop = pd.read_csv(cls.FILE_CADOP, sep=';', encoding='utf-8-sig', dtype=str, quotechar='"')
-            except UnicodeDecodeError:
-                logger.warning("⚠️ Falha com UTF-8, tentando Latin-1...")
-                cadop = pd.read_csv(cls.FILE_CADOP, sep=';', encoding='latin-1', dtype=str, quotechar='"')
-
-            # 2. Normalização de Colunas
-            cadop.columns = [c.upper().strip() for c in cadop.columns]
-            
-            # 3. Mapeamento Inteligente das Colunas (Acha a coluna certa mesmo se o nome variar)
-            try:
-                col_cnpj = next(c for c in cadop.columns if 'CNPJ' in c)
-                col_razao = next(
-                    c for c in cadop.columns if 'RAZAO' in c or 'RAZÃO' in c)
-                # Pega REGISTRO_OPERADORA mas evita DATA_REGISTRO
-                col_reg = next(
-                    c for c in cadop.columns if 'REGISTRO' in c and 'DATA' not in c)
-                col_mod = next(c for c in cadop.columns if 'MODALIDADE' in c)
-                col_uf = next(c for c in cadop.columns if 'UF' in c)
-            except StopIteration:
-                logger.error(
-                    "❌ Colunas obrigatórias não encontradas no CADOP.")
-                return
-
-            # 4. Limpeza Crítica de Strings
-            cadop['CNPJ_CLEAN'] = cadop[col_cnpj].str.replace(r'\D', '', regex=True).str.zfill(14)
-            cadop['REG_CLEAN'] = cadop[col_reg].str.replace(r'\D', '', regex=True).str.zfill(6)
-            
-            # 5. Preparar DataFrame final
-            df_ops = pd.DataFrame()
-            df_ops['registro_ans'] = cadop['REG_CLEAN']
-            df_ops['cnpj'] = cadop['CNPJ_CLEAN']
-            df_ops['razao_social'] = cadop[col_razao]
-            df_ops['modalidade'] = cadop[col_mod]
-            df_ops['uf'] = cadop[col_uf]
-
-            # Preenche colunas extras (Opcionais)
-            # Mapeamos Logradouro, Bairro, etc se existirem
-            extras = {
-                'logradouro': 'LOGRADOURO', 'numero': 'NUMERO',
-                'complemento': 'COMPLEMENTO', 'bairro': 'BAIRRO',
-                'cidade': 'CIDADE', 'cep': 'CEP',
-                'telefone': 'TELEFONE', 'email': 'ELETRONICO'  # Endereco_eletronico
-            }
-
-            for db_col, csv_keyword in extras.items():
-                try:
-                    csv_col = next(
-                        c for c in cadop.columns if csv_keyword in c)
-                    df_ops[db_col] = cadop[csv_col]
-                except StopIteration:
-                    df_ops[db_col] = None
-
-            # Colunas que não existem no CSV
-            df_ops['nome_fantasia'] = None               
-            # 6. Remove duplicados (CNPJ é PK)
-            df_ops = df_ops.drop_duplicates(subset=['cnpj'])
-            colunas_ordenadas = [
-                'registro_ans', 'cnpj', 'razao_social', 'nome_fantasia',
-                'modalidade', 'logradouro', 'numero', 'complemento',
-                'bairro', 'cidade', 'uf', 'cep', 'telefone', 'email'
-            ]
-            df_ops = df_ops[colunas_ordenadas]
+            # Mesma dimensão já limpa pela Etapa 2 (índice em cache: não re-parseia o CSV)
+            df_ops = CadopIndex.carregar(cls.FILE_CADOP)
+            if df_ops.empty:
+                # Sem operadoras, o anti-join dos órfãos mandaria todas as despesas para a Dummy
+                print("❌ CADOP sem operadoras: carga abortada.")
+                return False
+
             # --- INSERÇÃO NO POSTGRES ---
-            cls._bulk_insert_operadoras(df_ops)
+            if not cls._bulk_insert_operadoras(df_ops):
+                return False
             print(f"    ✅ {len(df_ops)} operadoras inseridas.")
+            return True
         except Exception as e:
             print(f"❌ Erro no processamento do CADOP: {e}")
+            return False
+
+
+    @classmethod
+    def _copy_dataframe(cls, cursor, df, tabela, colunas):
+        """
+        Carrega o DataFrame via COPY FROM STDIN (CSV em memória).
+        Uma única viagem ao banco no lugar de uma por linha (executemany).
+        Retorna (linhas, linhas/segundo).
+        """
+        inicio = time.perf_counter()
+        with PipelineProfiler.etapa(f"copy_{tabela}") as medicao:
+            buffer = io.StringIO()
+            # Campo vazio sem aspas = NULL no COPY CSV (NaN/None viram vazio)
+            df[colunas].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+
+            cursor.copy_expert(
+                f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            # Caracteres do CSV enviado (~bytes: o conteúdo é quase todo ASCII)
+            medicao.contar(entrada=len(df), gravados=buffer.tell())
+
+        duracao = time.perf_counter() - inicio
+        taxa = len(df) / duracao if duracao > 0 else float(len(df))
+        logger.info(
+            f"⚡ COPY {tabela}: {len(df)} linhas em {duracao:.2f}s ({taxa:,.0f} linhas/s)")
+        return len(df), taxa
 
 
     @classmethod
     def _bulk_insert_operadoras(cls, df):
         conn = get_db_connection()
         if not conn:
-            return
+            return False
         
         try:
             # 1. Conexão com Banco
@@ -196,109 +216,75 @@ class Step3DBIngestion:
             logger.info(
                 f"🚀 Inserindo/Atualizando {len(df)} operadoras no Postgres...")
 
-            # Query Postgres com ON CONFLICT (Atualiza se já existir)
-            query = """
-                INSERT INTO operadoras (
-                    registro_ans, cnpj, razao_social, nome_fantasia, 
-                    modalidade, logradouro, numero, complemento, 
-                    bairro, cidade, uf, cep, telefone, email
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            colunas = CadopIndex.COLUNAS
+
+            # 2. Staging: tabela temporária que some no COMMIT
+            cursor.execute("""
+                CREATE TEMP TABLE operadoras_staging
+                (LIKE operadoras INCLUDING DEFAULTS) ON COMMIT DROP;
+            """)
+            cls._copy_dataframe(cursor, df, "operadoras_staging", colunas)
+
+            # 3. Merge único com ON CONFLICT (Atualiza se já existir)
+            cursor.execute(f"""
+                INSERT INTO operadoras ({', '.join(colunas)})
+                SELECT {', '.join(colunas)} FROM operadoras_staging
                 ON CONFLICT (cnpj) DO UPDATE SET 
                     razao_social = EXCLUDED.razao_social,
                     data_atualizacao = CURRENT_TIMESTAMP;
-            """
-            # Prepara dados (None em vez de NaN)
-            dados = df.where(pd.notnull(df), None).values.tolist()
-            cursor.executemany(query, dados)
+            """)
             conn.commit()
             logger.info("✅ Operadoras sincronizadas!")
+            return True
         except Exception as e:
             conn.rollback()
             logger.error(f"❌ Erro SQL Operadoras: {e}")
+            return False
         finally:
-            conn.close()
+            release_db_connection(conn)
 
 
     @classmethod
+    @PipelineProfiler.medir("despesas")
     def processar_e_inserir_despesas(cls):
+        """True = trimestres regravados, False = nada pendente, None = falha na carga."""
         # 4. Inserir Despesas (Fato)
         print("💰 Inserindo Despesas...")
         try:
-            df_desp = pd.read_csv(cls.FILE_CONSOLIDADO, sep=';', dtype=str)
-            
-            # Limpeza e Conversão
-            df_desp['cnpj_operadora'] = df_desp['CNPJ'].str.replace(r'\D', '', regex=True).str.zfill(14)
-            # Se vier com vírgula converte, se vier com ponto mantém
-            df_desp['valor_despesa'] = pd.to_numeric(
-                df_desp['VALORDESPESAS'].str.replace(',', '.'), errors='coerce')
-            
-            # Converte Ano e Trimestre para int seguro
-            df_desp['ANO'] = pd.to_numeric(
-                df_desp['ANO'], errors='coerce').fillna(0).astype(int)
-            df_desp['TRIMESTRE'] = pd.to_numeric(
-                df_desp['TRIMESTRE'], errors='coerce').fillna(1).astype(int)
-
-            # Função de Data Segura
-            def get_data(row):
-                try:
-                    mes = int(row['TRIMESTRE']) * 3 - 2
-                    return f"{int(row['ANO']):04d}-{mes:02d}-01"
-                except:
-                    return None
-
-            df_desp['data_evento'] = df_desp.apply(get_data, axis=1)
-            # Remove datas inválidas
-            df_desp = df_desp.dropna(subset=['data_evento'])
-
-            # Montagem Final
-            df_final = pd.DataFrame()
-            df_final['data_evento'] = df_desp['data_evento']
-            df_final['cnpj_operadora'] = df_desp['cnpj_operadora']
-            df_final['cd_conta_contabil'] = df_desp.get('CONTA', '411')
-            df_final['descricao'] = df_desp.get(
-                'DESCRICAO', 'Despesa Assistencial')
-            df_final['valor_despesa'] = df_desp['valor_despesa']
-            df_final['ano'] = df_desp['ANO']
-            df_final['trimestre'] = df_desp['TRIMESTRE']
-
-            # Guardamos o REG_ANS original antes que ele possa ser substituído pelo Dummy
-            df_final['codigo_origem'] = df_desp['cnpj_operadora'].str.lstrip(
-                '0')
-
-            # --- FILTRAR DESPESAS ÓRFÃS ---
-            conn = get_db_connection()
-            if not conn:
-                return
-
-            cursor = conn.cursor()
-            print("🔍 Buscando CNPJs válidos no banco...")
-            cursor.execute("SELECT cnpj FROM operadoras")
-            # Cria um conjunto (set) com todos os CNPJs que existem no banco
-            valid_cnpjs = set(row[0] for row in cursor.fetchall())
-            conn.close()
-
-            # Identifica os Órfãos (quem tem REG_ANS mas não tem CNPJ cadastrado)
-            mask_orfams = ~df_final['cnpj_operadora'].isin(valid_cnpjs)
-            qtd_orfams = mask_orfams.sum()
-
-            if qtd_orfams > 0:
-                # 1. Auditoria: Identifica quais são os IDs problemáticos
-                ids_orfaos = df_final.loc[mask_orfams,
-                                          'cnpj_operadora'].unique()
-                logger.warning(
-                    f"⚠️ {qtd_orfams} despesas órfãs detectadas para os registros: {ids_orfaos}")
-                df_log_orfaos = df_final[mask_orfams].copy()
-                cls._salvar_em_quarentena(df_log_orfaos)
-
-                print(
-                    f"⚠️ {qtd_orfams} despesas órfãs redirecionadas e logadas em quarentena.")
-                # 2. Resiliência: Trata o dado para não quebrar a inserção no banco
-                df_final.loc[mask_orfams, 'cnpj_operadora'] = cls.CNPJ_DUMMY
-                
-
-            # Agora inserimos TUDO (pois todos os CNPJs agora são válidos: ou reais ou dummy)
-            cls._bulk_insert_despesas(df_final)
-            print(f"    ✅ {len(df_final)} registros de despesas inseridos.")
+            # Trimestres a (re)gravar: os pendentes do manifesto (None = sem manifesto, carrega tudo)
+            pendentes = PipelineManifest.pendentes(cls.DATA_DIR)
+            if pendentes == []:
+                print("⏭️ Nenhum trimestre pendente: despesas já estão no banco.")
+                return False
+
+            with PipelineProfiler.etapa("leitura") as m:
+                if ParquetStore.existe(cls.PARQUET_ENRIQUECIDO):
+                    df_desp = ParquetStore.ler(cls.PARQUET_ENRIQUECIDO, periodos=pendentes)
+                    m.contar(lidos=PipelineProfiler.tamanho(cls.PARQUET_ENRIQUECIDO))
+                else:
+                    df_desp = CSVReader.ler(cls.FILE_CONSOLIDADO, sep=';')
+                    m.contar(lidos=PipelineProfiler.tamanho(cls.FILE_CONSOLIDADO))
+                    if pendentes is not None:
+                        # CSV traz todos os trimestres: fica só com os pendentes
+                        df_desp = df_desp[cls._chave_periodo(df_desp).isin([a * 10 + t for a, t in pendentes])]
+                m.contar(saida=len(df_desp))
+
+            with PipelineProfiler.etapa("preparar_fatos") as m:
+                df_final = cls._preparar_fatos(df_desp)
+                m.contar(entrada=len(df_desp), saida=len(df_final))
+            if pendentes is None:
+                periodos = sorted(set(zip(df_final['ano'], df_final['trimestre'])))
+            else:
+                periodos = pendentes
+
+            # Órfãos (REG_ANS sem CNPJ cadastrado) são resolvidos no banco durante a carga
+            if cls._bulk_insert_despesas(df_final, periodos):
+                if pendentes is not None:
+                    PipelineManifest.concluir_pendentes(cls.DATA_DIR, periodos)
+                print(f"    ✅ {len(df_final)} registros de despesas inseridos "
+                      f"(trimestres {[f'{t}T{a}' for a, t in periodos]}).")
+                return True
+            return None
 
         except Exception as e:
             print(f"❌ Erro no processamento das Despesas: {e}")
@@ -306,81 +292,307 @@ class Step3DBIngestion:
             traceback.print_exc()
 
 
-    @classmethod
-    def _salvar_em_quarentena(cls, df_orfaos):
+    @staticmethod
+    def _por_valor_distinto(serie, funcao):
         """
-            Salva registros que falharam na integridade referencial para auditoria.
-            Segue o princípio de segregação de falhas.
-            """
-        if df_orfaos.empty:
-                return
-
-        quarentena_path = os.path.join(
-            cls.DATA_DIR, "quarentena_despesas_orfas.csv")
-
-        # Se o arquivo já existir, anexa sem repetir o cabeçalho (mode='a')
-        file_exists = os.path.isfile(quarentena_path)
+        Aplica uma transformação de texto só nos valores distintos e espalha o resultado pelas linhas.
+        Milhões de linhas, ~mil operadoras: o regex roda mil vezes, não milhões.
+        """
+        codigos, distintos = pd.factorize(serie)
+        convertidos = funcao(pd.Series(distintos, dtype=object).astype(str)).to_numpy(dtype=object)
+        return pd.Series(
+            pd.api.extensions.take(convertidos, codigos, allow_fill=True), index=serie.index, dtype=object)
 
-        try:
-            df_orfaos.to_csv(
-                quarentena_path,
-                mode='a',
-                index=False,
-                sep=';',
-                encoding='utf-8-sig',
-                header=not file_exists
-            )
-            logger.info(
-                f"📁 Registros órfãos salvos em quarentena: {quarentena_path}")
-        except Exception as e:
-            logger.error(f"❌ Falha ao salvar arquivo de quarentena: {e}")
+    @staticmethod
+    def _chave_periodo(df):
+        ano = pd.to_numeric(df['ANO'], errors='coerce').fillna(0).astype('int64')
+        trimestre = pd.to_numeric(df['TRIMESTRE'], errors='coerce').fillna(1).astype('int64')
+        return ano * 10 + trimestre
 
+    @classmethod
+    def _preparar_fatos(cls, df_desp):
+        """
+        Monta as linhas da tabela fato de forma vetorizada (sem apply por linha).
+        Colunas que já chegam tipadas do Parquet (ANO, TRIMESTRE, VALORDESPESAS) passam direto.
+        """
+        # Limpeza do CNPJ/Registro e REG_ANS original: só nos valores distintos
+        cnpj_operadora = cls._por_valor_distinto(
+            df_desp['CNPJ'], lambda s: s.str.replace(r'\D', '', regex=True).str.zfill(14))
+
+        if pd.api.types.is_numeric_dtype(df_desp['VALORDESPESAS']):
+            # Parquet: valor já vem numérico
+            valor = df_desp['VALORDESPESAS']
+        else:
+            # Se vier com vírgula converte, se vier com ponto mantém
+            valor = pd.to_numeric(df_desp['VALORDESPESAS'].str.replace(',', '.'), errors='coerce')
+
+        # Converte Ano e Trimestre para int seguro
+        ano = pd.to_numeric(df_desp['ANO'], errors='coerce').fillna(0).astype('int64')
+        trimestre = pd.to_numeric(df_desp['TRIMESTRE'], errors='coerce').fillna(1).astype('int64')
+
+        # Data do evento = 1º dia do trimestre, calculada em meses desde 1970 (datetime64[M])
+        # Remove datas inválidas (ano 0000 / trimestre fora de 1-4 que o nome do ZIP pode gerar)
+        valido = (ano > 0) & trimestre.between(1, 4)
+        meses = (ano[valido] - 1970) * 12 + (trimestre[valido] - 1) * 3
+        data_evento = pd.Series(meses.to_numpy().astype('datetime64[M]'), index=meses.index)
+
+        # Montagem Final
+        df_final = pd.DataFrame({
+            'data_evento': data_evento,
+            'cnpj_operadora': cnpj_operadora[valido],
+            'cd_conta_contabil': df_desp['CONTA'][valido] if 'CONTA' in df_desp.columns else '411',
+            'descricao': (df_desp['DESCRICAO'][valido] if 'DESCRICAO' in df_desp.columns
+                          else 'Despesa Assistencial'),
+            'valor_despesa': valor[valido],
+            'ano': ano[valido],
+            'trimestre': trimestre[valido],
+        })
+
+        # Guardamos o REG_ANS original antes que ele possa ser substituído pelo Dummy
+        df_final['codigo_origem'] = cls._por_valor_distinto(
+            df_final['cnpj_operadora'], lambda s: s.str.lstrip('0'))
+        return df_final
 
     @classmethod
-    def _bulk_insert_despesas(cls, df):
+    def _bulk_insert_despesas(cls, df, periodos):
+        """
+        Substitui os trimestres 'periodos' na tabela fato (particionada por ano/trimestre), em duas transações:
+        1. Carga: cada trimestre vai via COPY para uma tabela avulsa, que depois ganha os índices, a PK e a FK
+           da tabela fato. Nada aqui bloqueia despesas: a API continua lendo durante os COPYs.
+        2. Troca: DETACH + DROP da partição antiga e ATTACH da nova, para todos os trimestres de uma vez.
+           Com índices e FK já prontos o ATTACH só os associa, e o lock ACCESS EXCLUSIVE do DETACH dura só a troca.
+        Reexecutar a carga não duplica linhas, não há DELETE linha a linha e a API nunca vê o trimestre vazio.
+        """
         conn = get_db_connection()
         if not conn:
-            return
+            return False
         
         try:
             cursor = conn.cursor()
             logger.info(
-                f"🚀 Inserindo {len(df)} despesas no Postgres...")
-
-            query = """
-                INSERT INTO despesas (
-                    data_evento, cnpj_operadora, cd_conta_contabil, 
-                    descricao, valor_despesa, ano, trimestre, codigo_origem
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-            """
-            # [SEGURANÇA] Definimos a lista exata para bater com os %s da query acima
+                f"🚀 Inserindo {len(df)} despesas no Postgres ({len(periodos)} trimestre(s))...")
+
+            # [SEGURANÇA] Lista exata de colunas, NA ORDEM CERTA do COPY
             cols_ordem = [
                 'data_evento', 'cnpj_operadora', 'cd_conta_contabil',
                 'descricao', 'valor_despesa', 'ano', 'trimestre', 'codigo_origem'
             ]
 
-            # Filtramos o DF para ter apenas essas colunas, NA ORDEM CERTA.
-            # O .where converte NaN (Not a Number) para None (NULL do SQL)
-            dados = df[cols_ordem].where(pd.notnull(df), None).values.tolist()
+            # 1. Carga (transação longa, sem lock na tabela fato)
+            periodos = [(int(ano), int(trimestre)) for ano, trimestre in periodos]
+            linhas = {}
+            for ano, trimestre in periodos:
+                df_periodo = df[(df['ano'] == ano) & (df['trimestre'] == trimestre)]
+                with PipelineProfiler.etapa(f"carga_{ano}_t{trimestre}") as m:
+                    cls._carregar_particao(cursor, df_periodo, ano, trimestre, cols_ordem)
+                    m.contar(entrada=len(df_periodo))
+                linhas[(ano, trimestre)] = len(df_periodo)
+            with PipelineProfiler.etapa("commit_carga"):
+                conn.commit()
 
-            cursor.executemany(query, dados)
-            conn.commit()
+            # 2. Troca (transação curta)
+            with PipelineProfiler.etapa("troca_particoes"):
+                for ano, trimestre in periodos:
+                    cls._trocar_particao(cursor, ano, trimestre, linhas[(ano, trimestre)])
+                conn.commit()
             logger.info("✅ Despesas inseridas com sucesso!")
+            return True
         except Exception as e:
             conn.rollback()
+            # Tabelas de carga que sobrarem são recriadas (DROP IF EXISTS) na próxima execução
             logger.error(f"❌ Erro SQL Despesas: {e}")
             import traceback
             traceback.print_exc()
+            return False
+        finally:
+            release_db_connection(conn)
+
+
+    @classmethod
+    def _resolver_orfaos(cls, cursor, carga, ano, trimestre):
+        """
+        Despesas órfãs (REG_ANS sem CNPJ em operadoras), resolvidas com um anti-join na tabela de carga:
+        1. Auditoria: o trimestre é regravado em despesas_quarentena (codigo_origem, ano, trimestre).
+        2. Resiliência: as linhas passam para a operadora Dummy e a FK não quebra a carga.
+        """
+        cursor.execute(
+            "DELETE FROM despesas_quarentena WHERE ano = %s AND trimestre = %s", (ano, trimestre))
+        cursor.execute(f"""
+            INSERT INTO despesas_quarentena (codigo_origem, ano, trimestre, qtd_registros, valor_total)
+            SELECT COALESCE(c.codigo_origem, ''), c.ano, c.trimestre, COUNT(*), SUM(c.valor_despesa)
+            FROM {carga} c
+            WHERE NOT EXISTS (SELECT 1 FROM operadoras o WHERE o.cnpj = c.cnpj_operadora)
+            GROUP BY COALESCE(c.codigo_origem, ''), c.ano, c.trimestre
+        """)
+        qtd_codigos = cursor.rowcount
+        if qtd_codigos <= 0:
+            return
+
+        cursor.execute(f"""
+            UPDATE {carga} c SET cnpj_operadora = %s
+            WHERE NOT EXISTS (SELECT 1 FROM operadoras o WHERE o.cnpj = c.cnpj_operadora)
+        """, (cls.CNPJ_DUMMY,))
+        logger.warning(
+            f"⚠️ {trimestre}T{ano}: {cursor.rowcount} despesas órfãs ({qtd_codigos} registros ANS) "
+            f"redirecionadas para a Dummy e registradas em despesas_quarentena.")
+
+    @classmethod
+    def _carregar_particao(cls, cursor, df, ano, trimestre, colunas):
+        """Monta despesas_AAAA_tN_carga pronta para virar a partição (mesmo nome de criar_particao_despesas)."""
+        carga = f"despesas_{ano}_t{trimestre}_carga"
+
+        # Tabela avulsa com os mesmos tipos/defaults (o id continua vindo da sequence de despesas)
+        cursor.execute(f"DROP TABLE IF EXISTS {carga}")
+        cursor.execute(f"CREATE TABLE {carga} (LIKE despesas INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        # CHECK igual ao limite da partição: o ATTACH aproveita e não precisa varrer a tabela
+        cursor.execute(
+            f"ALTER TABLE {carga} ADD CONSTRAINT {carga}_periodo "
+            f"CHECK (ano = {ano} AND trimestre = {trimestre})")
+        if not df.empty:
+            cls._copy_dataframe(cursor, df, carga, colunas)
+        # Mesmo vazio: regrava a quarentena do trimestre
+        cls._resolver_orfaos(cursor, carga, ano, trimestre)
+        cls._replicar_indices_e_fks(cursor, carga)
+
+    @staticmethod
+    def _replicar_indices_e_fks(cursor, carga):
+        """
+        Cria na tabela de carga os índices, a PK e as FKs de despesas, depois do COPY.
+        O ATTACH associa os equivalentes em vez de construir índices e validar a FK com o lock na tabela fato.
+        """
+        # PK/UNIQUE precisam ser constraints na partição; os demais índices, índices simples
+        cursor.execute("""
+            SELECT pg_get_indexdef(i.indexrelid), pg_get_constraintdef(c.oid)
+            FROM pg_index i
+            LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid AND c.conrelid = i.indrelid
+            WHERE i.indrelid = 'despesas'::regclass
+        """)
+        for definicao_indice, definicao_constraint in cursor.fetchall():
+            if definicao_constraint:
+                cursor.execute(f"ALTER TABLE {carga} ADD {definicao_constraint}")
+            else:
+                # "CREATE INDEX nome ON ONLY public.despesas USING btree (...)" -> mesmo método/colunas na carga
+                unico = "UNIQUE " if definicao_indice.startswith("CREATE UNIQUE") else ""
+                cursor.execute(f"CREATE {unico}INDEX ON {carga} USING {definicao_indice.split(' USING ', 1)[1]}")
+
+        cursor.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = 'despesas'::regclass AND contype = 'f'")
+        for (definicao,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {carga} ADD {definicao}")
+
+    @staticmethod
+    def _trocar_particao(cursor, ano, trimestre, linhas):
+        """Troca despesas_AAAA_tN pela tabela de carga (ou só remove, se o trimestre veio vazio)."""
+        particao = f"despesas_{ano}_t{trimestre}"
+        carga = f"{particao}_carga"
+
+        # Sai a partição antiga
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (particao,))
+        if cursor.fetchone()[0]:
+            cursor.execute(f"ALTER TABLE despesas DETACH PARTITION {particao}")
+            cursor.execute(f"DROP TABLE {particao}")
+
+        if not linhas:
+            cursor.execute(f"DROP TABLE {carga}")
+            logger.info(f"🧹 Trimestre {trimestre}T{ano} removido (sem linhas na nova carga).")
+            return
+
+        # Entra a nova
+        cursor.execute(f"ALTER TABLE {carga} RENAME TO {particao}")
+        cursor.execute(
+            f"ALTER TABLE despesas ATTACH PARTITION {particao} "
+            f"FOR VALUES FROM ({ano}, {trimestre}) TO ({ano}, {trimestre + 1})")
+        logger.info(f"🧱 Partição {particao} substituída ({linhas} linhas).")
+
+
+    @classmethod
+    @PipelineProfiler.medir("rollup")
+    def atualizar_rollup_trimestral(cls):
+        """
+        REFRESH da materialized view despesas_trimestrais
+        (cnpj_operadora, ano, trimestre, codigo_origem) -> soma/quantidade.
+        CONCURRENTLY mantém a view legível pela API durante o refresh.
+        """
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            logger.info("🔄 Atualizando rollup trimestral (despesas_trimestrais)...")
+            cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY despesas_trimestrais")
+            conn.commit()
+            logger.info("✅ Rollup trimestral atualizado!")
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ Erro ao atualizar rollup trimestral: {e}")
+            return False
+        finally:
+            release_db_connection(conn)
+
+
+    @classmethod
+    @PipelineProfiler.medir("atividade")
+    def atualizar_atividade_operadoras(cls):
+        """
+        Recalcula operadoras_atividade (tem despesas?, 1º/último período, qtd de linhas).
+        Os filtros com_dados/sem_dados da API viram um lookup por PK em vez de
+        varrer a tabela fato a cada requisição.
+        """
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            logger.info("🧮 Atualizando resumo de atividade das operadoras...")
+
+            # Snapshot completo na mesma transação: a API nunca vê a tabela vazia
+            cursor.execute("DELETE FROM operadoras_atividade")
+            cursor.execute("""
+                INSERT INTO operadoras_atividade (
+                    cnpj, has_despesas, primeiro_periodo, ultimo_periodo, qtd_registros
+                )
+                SELECT
+                    o.cnpj,
+                    COALESCE(d.qtd, 0) > 0,
+                    d.primeiro_periodo,
+                    d.ultimo_periodo,
+                    COALESCE(d.qtd, 0)
+                FROM operadoras o
+                LEFT JOIN (
+                    SELECT
+                        cnpj_operadora,
+                        MIN(ano * 10 + trimestre) as primeiro_periodo,
+                        MAX(ano * 10 + trimestre) as ultimo_periodo,
+                        SUM(qtd_registros) as qtd
+                    FROM despesas_trimestrais
+                    GROUP BY cnpj_operadora
+                ) d ON d.cnpj_operadora = o.cnpj;
+            """)
+            conn.commit()
+            logger.info(f"✅ Resumo de atividade atualizado ({cursor.rowcount} operadoras).")
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ Erro ao atualizar atividade das operadoras: {e}")
+            return False
         finally:
-            conn.close()
+            release_db_connection(conn)
 
 
     @classmethod
+    @PipelineProfiler.medir("agregados")
     def processar_e_inserir_agregados(cls):
         print("📊 Importando Tabela Agregada (Item 3.1)...")
         try:
             # Lê o arquivo gerado na etapa 2
-            df_agg = pd.read_csv(cls.FILE_AGREGADO, sep=';')
+            if ParquetStore.existe(cls.PARQUET_AGREGADO):
+                df_agg = ParquetStore.ler_tabela(cls.PARQUET_AGREGADO)
+            else:
+                df_agg = CSVReader.ler(cls.FILE_AGREGADO, sep=';', dtype=None)
 
             # Mapeia colunas do CSV para o Banco
             # CSV: RAZAO_FINAL;UF;TOTAL;MEDIA;DESVIO
@@ -395,17 +607,18 @@ class Step3DBIngestion:
                 0)  # Trata NULL
 
             # Chama o método especialista em inserir
-            cls._bulk_insert_agregados(df_final)
+            return cls._bulk_insert_agregados(df_final)
 
         except Exception as e:
             logger.error(f"❌ Erro ao processar agregados: {e}")
+            return False
 
 
     @classmethod
     def _bulk_insert_agregados(cls, df_final):
         conn = get_db_connection()
         if not conn:
-            return
+            return False
         
         try:
             cursor = conn.cursor()
@@ -414,21 +627,50 @@ class Step3DBIngestion:
             # Limpa tabela antes (Overwrite strategy para snapshot)
             cursor.execute("TRUNCATE TABLE despesas_agregadas")
 
-            query = """
-                INSERT INTO despesas_agregadas (
-                    razao_social, uf, total_despesas,
-                    media_trimestral, desvio_padrao
-                ) VALUES (%s, %s, %s, %s, %s)
-            """
-            dados = df_final.values.tolist()
-            cursor.executemany(query, dados)
+            colunas = [
+                'razao_social', 'uf', 'total_despesas',
+                'media_trimestral', 'desvio_padrao'
+            ]
+            cls._copy_dataframe(cursor, df_final, "despesas_agregadas", colunas)
             conn.commit()
-            logger.info("✅ Agregados importados com sucesso!")          
+            logger.info("✅ Agregados importados com sucesso!")
+            return True
         except Exception as e:
             conn.rollback()
             logger.error(f"❌ Erro ao importar agregados: {e}")
+            return False
+        finally:
+            release_db_connection(conn)
+
+
+
+    @classmethod
+    @PipelineProfiler.medir("versao")
+    def registrar_nova_versao(cls):
+        """Incrementa data_version: os caches/ETags da API passam a valer para a nova carga."""
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO data_version (id, versao) VALUES (1, 1)
+                ON CONFLICT (id) DO UPDATE SET
+                    versao = data_version.versao + 1,
+                    atualizado_em = CURRENT_TIMESTAMP
+                RETURNING versao;
+            """)
+            versao = cursor.fetchone()[0]
+            conn.commit()
+            logger.info(f"🔖 Versão dos dados atualizada para {versao}.")
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ Erro ao registrar versão dos dados: {e}")
+            return False
         finally:
-            conn.close()
+            release_db_connection(conn)
 
             
 if __name__ == "__main__":
@@ -1,15 +1,33 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from app.api import metrics
 from app.api.routes import router as api_router
+from app.db.connection import init_db_pool, close_db_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de conexões criado uma única vez no startup e fechado no shutdown
+    try:
+        init_db_pool()
+    except Exception as e:
+        # Não derruba a API: o pool é recriado sob demanda na primeira requisição
+        print(f"⚠️ Pool de conexões não inicializado no startup: {e}")
+    yield
+    close_db_pool()
+
 
 app = FastAPI(
     title="EMPRESA_X - Health Analytics API",
     description="API para processamento e análise de dados de operadoras da ANS.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
    
@@ -23,8 +41,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas por rota (contagem, latência, em andamento) expostas em /metrics
+if metrics.ATIVO:
+    app.add_middleware(metrics.MetricasMiddleware)
+
 app.include_router(api_router, prefix="/api")
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metricas():
+    """Formato texto do Prometheus: HTTP por rota, queries nomeadas, pool e cache (por processo)."""
+    if not metrics.ATIVO:
+        return PlainTextResponse("# métricas desligadas (METRICS_ENABLED=false)\n", status_code=404)
+    return PlainTextResponse(metrics.registro.renderizar(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/", tags=["Root"])
 async def root():
     return {
@@ -32,7 +62,8 @@ async def root():
         "status": "online",
         "endpoints": {
             "docs": "/docs",
-            "operadoras": "/api/operadoras"
+            "operadoras": "/api/operadoras",
+            "metrics": "/metrics"
         }
     }
 
@@ -0,0 +1,139 @@
+"""
+Benchmark da busca de operadoras (/api/operadoras?search=...): ILIKE antigo x busca indexada.
+
+Monta uma tabela "operadoras" do tamanho do CADOP (ativas + canceladas) num schema
+temporário, com os mesmos índices do create_tables.sql, e mede COUNT + página para
+cada termo nas duas versões da query. Tudo roda numa transação desfeita no fim.
+
+    DATABASE_URL=postgresql://... python scripts/bench_busca_operadoras.py --linhas 5000
+"""
+import argparse
+import io
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+import psycopg2
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(RAIZ, "backend"))
+
+from app.api.routes import _condicao_busca  # noqa: E402
+
+CREATE_TABLES = os.path.join(RAIZ, "scripts_sql", "create_tables.sql")
+TERMOS = ["saude", "UNIMED", "odonto são", "assistência médica", "cooperativa de trabalho",
+          "3456", "12.345", "41"]
+
+PREFIXOS = ["UNIMED", "AMIL", "BRADESCO", "SUL AMÉRICA", "HAPVIDA", "NOTRE DAME", "PORTO SEGURO",
+            "GOLDEN CROSS", "CAIXA", "ODONTOPREV", "SÃO FRANCISCO", "SANTA CASA", "CASSI", "GEAP"]
+MEIOS = ["SAÚDE", "ASSISTÊNCIA MÉDICA", "ODONTO", "HOSPITALAR", "COOPERATIVA DE TRABALHO MÉDICO",
+         "PLANOS DE SAÚDE", "SERVIÇOS MÉDICOS", "ADMINISTRADORA DE BENEFÍCIOS", "MEDICINA DE GRUPO"]
+CIDADES = ["DE SÃO JOSÉ", "DO VALE DO PARAÍBA", "DE CAMPINAS", "DO NORDESTE", "DE MINAS", "DO SUL",
+           "DE BELÉM", "DE GOIÂNIA", "DO PARANÁ", ""]
+SUFIXOS = ["LTDA", "S.A.", "S/A", "COOPERATIVA", "EIRELI", ""]
+UFS = ["SP", "RJ", "MG", "RS", "PR", "BA", "PE", "CE", "GO", "PA", "SC", "ES", "DF", "AM"]
+
+
+def _ddl_operadoras():
+    """Trecho do create_tables.sql da tabela operadoras (função f_unaccent + tabela + índices)."""
+    with open(CREATE_TABLES, encoding="utf-8") as f:
+        sql = f.read()
+    inicio = sql.index("CREATE OR REPLACE FUNCTION f_unaccent")
+    fim = sql.index("-- 2. Tabela Fato")
+    return sql[inicio:fim]
+
+
+def _gerar_operadoras(qtd, semente=42):
+    aleatorio = random.Random(semente)
+    buffer = io.StringIO()
+    for i in range(qtd):
+        nome = " ".join(p for p in (
+            aleatorio.choice(PREFIXOS), aleatorio.choice(MEIOS),
+            aleatorio.choice(CIDADES), aleatorio.choice(SUFIXOS)) if p)
+        # Raiz do CNPJ espalhada mas única (7919 é primo com 10^8), como a PK exige
+        cnpj = f"{(i * 7919 + 13) % 10 ** 8:08d}0001{aleatorio.randint(0, 99):02d}"
+        registro = f"{300000 + i:06d}"
+        buffer.write(f"{registro}\t{cnpj}\t{nome} {i}\t{aleatorio.choice(UFS)}\tMedicina de Grupo\n")
+    buffer.seek(0)
+    return buffer
+
+
+def _consultas_antigas(termo):
+    like = f"%{termo}%"
+    where = "WHERE razao_social ILIKE %s OR cnpj ILIKE %s"
+    return (f"SELECT COUNT(*) FROM operadoras {where}", [like, like],
+            f"SELECT cnpj, razao_social, uf, modalidade FROM operadoras {where} "
+            "ORDER BY razao_social ASC LIMIT 10 OFFSET 0", [like, like])
+
+
+def _consultas_novas(termo):
+    condicao, params, texto = _condicao_busca(termo)
+    where = f"WHERE {condicao}"
+    ordem, ordem_params = "ORDER BY razao_social ASC", []
+    if texto:
+        ordem = ("ORDER BY similarity(f_unaccent(lower(razao_social)), f_unaccent(lower(%s))) DESC, "
+                 "razao_social ASC")
+        ordem_params = [termo.strip()]
+    return (f"SELECT COUNT(*) FROM operadoras {where}", params,
+            f"SELECT cnpj, razao_social, uf, modalidade FROM operadoras {where} {ordem} LIMIT 10 OFFSET 0",
+            params + ordem_params)
+
+
+def _medir(cursor, consultas, repeticoes):
+    sql_count, p_count, sql_page, p_page = consultas
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cursor.execute(sql_count, p_count)
+        total = cursor.fetchone()[0]
+        cursor.execute(sql_page, p_page)
+        cursor.fetchall()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    cursor.execute("EXPLAIN " + sql_count, p_count)
+    plano = " ".join(linha[0] for linha in cursor.fetchall())
+    acesso = "índice" if re.search(r"Index|Bitmap", plano) else "seq scan"
+    return statistics.median(tempos), total, acesso
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=5000, help="operadoras geradas (CADOP ~ 1.1k ativas)")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        sys.exit("Defina DATABASE_URL apontando para um PostgreSQL de teste.")
+
+    conn = psycopg2.connect(url)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent SCHEMA public")
+        cursor.execute("CREATE SCHEMA bench_busca")
+        cursor.execute("SET LOCAL search_path = bench_busca, public")
+        cursor.execute(_ddl_operadoras())
+        cursor.copy_expert(
+            "COPY operadoras (registro_ans, cnpj, razao_social, uf, modalidade) FROM STDIN",
+            _gerar_operadoras(args.linhas))
+        cursor.execute("ANALYZE operadoras")
+        print(f"🧪 {args.linhas} operadoras geradas (mediana de {args.repeticoes} execuções de COUNT + página)\n")
+
+        print(f"{'termo':<26} {'antes_ms':>9} {'acesso':>9} {'depois_ms':>10} {'acesso':>9} {'total_antes':>11} {'total_depois':>12}")
+        for termo in TERMOS:
+            antes, total_antes, acesso_antes = _medir(cursor, _consultas_antigas(termo), args.repeticoes)
+            depois, total_depois, acesso_depois = _medir(cursor, _consultas_novas(termo), args.repeticoes)
+            print(f"{termo:<26} {antes:>9.2f} {acesso_antes:>9} {depois:>10.2f} {acesso_depois:>9} "
+                  f"{total_antes:>11} {total_depois:>12}")
+        # Os totais diferem de propósito: a busca nova ignora acentos e trata dígitos como prefixo
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Teste de carga da API: latência p50/p99 por endpoint com 50 a 200 clientes simultâneos.
+
+Cada cliente é uma thread com sua própria sessão HTTP que repete as requisições do
+Dashboard (listagem, busca, detalhe e estatísticas) até completar a sua cota.
+Para comparar antes/depois, rode contra cada versão da API e salve com --saida:
+
+    python scripts/bench_carga_api.py --url http://localhost:8000 --saida antes.json
+    python scripts/bench_carga_api.py --url http://localhost:8000 --saida depois.json
+    python scripts/bench_carga_api.py --comparar antes.json depois.json
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+CLIENTES_PADRAO = (50, 100, 200)
+
+# (nome, caminho): o mesmo mix de chamadas que o frontend faz ao abrir o Dashboard
+ENDPOINTS = [
+    ("operadoras", "/api/operadoras?page=1&limit=10"),
+    ("operadoras_busca", "/api/operadoras?page=1&limit=10&search=saude"),
+    ("operadoras_keyset", "/api/operadoras?limit=10&pagination=keyset&count=none"),
+    ("estatisticas", "/api/estatisticas"),
+    ("detalhe", "/api/operadoras/{cnpj}/despesas"),
+]
+
+
+def _descobrir_cnpj(url):
+    """CNPJ real para a rota de detalhe (o primeiro da listagem)."""
+    resposta = requests.get(url + "/api/operadoras?page=1&limit=1", timeout=30)
+    resposta.raise_for_status()
+    dados = resposta.json().get("data") or []
+    return dados[0]["cnpj"] if dados else "00000000000000"
+
+
+def _cliente(url, caminhos, repeticoes, latencias, erros, lock):
+    sessao = requests.Session()
+    locais = {nome: [] for nome, _ in caminhos}
+    falhas = 0
+    for _ in range(repeticoes):
+        for nome, caminho in caminhos:
+            inicio = time.perf_counter()
+            try:
+                resposta = sessao.get(url + caminho, timeout=60)
+                ok = resposta.status_code < 500
+            except requests.RequestException:
+                ok = False
+            locais[nome].append(time.perf_counter() - inicio)
+            falhas += not ok
+    with lock:
+        for nome, valores in locais.items():
+            latencias[nome].extend(valores)
+        erros[0] += falhas
+
+
+def rodar_nivel(url, caminhos, clientes, repeticoes):
+    latencias = {nome: [] for nome, _ in caminhos}
+    erros = [0]
+    lock = threading.Lock()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        for _ in range(clientes):
+            executor.submit(_cliente, url, caminhos, repeticoes, latencias, erros, lock)
+    duracao = time.perf_counter() - inicio
+
+    total = sum(len(v) for v in latencias.values())
+    resultado = {
+        "clientes": clientes,
+        "requisicoes": total,
+        "erros": erros[0],
+        "rps": round(total / duracao, 1),
+        "endpoints": {},
+    }
+    for nome, valores in latencias.items():
+        ms = np.array(valores) * 1000
+        resultado["endpoints"][nome] = {
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        }
+    return resultado
+
+
+def imprimir(resultados):
+    for nivel in resultados:
+        print(f"\n👥 {nivel['clientes']} clientes | {nivel['requisicoes']} req | "
+              f"{nivel['rps']} req/s | erros: {nivel['erros']}")
+        for nome, valores in nivel["endpoints"].items():
+            print(f"   {nome:<20} p50 {valores['p50_ms']:>9.1f} ms   p99 {valores['p99_ms']:>9.1f} ms")
+
+
+def comparar(arquivo_antes, arquivo_depois):
+    with open(arquivo_antes, encoding="utf-8") as f:
+        antes = {n["clientes"]: n for n in json.load(f)}
+    with open(arquivo_depois, encoding="utf-8") as f:
+        depois = {n["clientes"]: n for n in json.load(f)}
+
+    for clientes in sorted(set(antes) & set(depois)):
+        print(f"\n👥 {clientes} clientes (antes -> depois)")
+        for nome, valores in depois[clientes]["endpoints"].items():
+            anterior = antes[clientes]["endpoints"].get(nome)
+            if not anterior:
+                continue
+            print(f"   {nome:<20} p50 {anterior['p50_ms']:>8.1f} -> {valores['p50_ms']:>8.1f} ms"
+                  f"   p99 {anterior['p99_ms']:>8.1f} -> {valores['p99_ms']:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clientes", type=int, nargs="+", default=list(CLIENTES_PADRAO))
+    parser.add_argument("--repeticoes", type=int, default=10, help="rodadas do mix de endpoints por cliente")
+    parser.add_argument("--saida", help="grava os resultados em JSON (para --comparar)")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"))
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    url = args.url.rstrip("/")
+    cnpj = _descobrir_cnpj(url)
+    caminhos = [(nome, caminho.format(cnpj=cnpj)) for nome, caminho in ENDPOINTS]
+
+    resultados = []
+    for clientes in args.clientes:
+        print(f"⏳ Rodando com {clientes} clientes simultâneos...")
+        resultados.append(rodar_nivel(url, caminhos, clientes, args.repeticoes))
+    imprimir(resultados)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\n💾 Resultados salvos em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark do crawler do portal da ANS (ANSScraper.identificar_arquivos_trimestrais).
+
+Sobe um http.server local com uma árvore de diretórios no formato do portal
+(raiz -> anos -> ZIPs, com alguns anos só em subpastas) e latência artificial por
+requisição, e compara quatro cenários para cada n_trimestres:
+
+  sequencial   MAX_CRAWL_WORKERS=1, sem cache (comportamento antigo)
+  paralelo     MAX_CRAWL_WORKERS padrão, sem cache
+  frio         paralelo com cache_dir vazio (preenche o cache de listagens)
+  cache        paralelo com cache_dir já preenchido (listagens revalidadas com 304)
+
+    python scripts/bench_crawl_ans.py --anos 18 --latencia-ms 80 --trimestres 3 12 40
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.ans_scrapper import ANSScraper  # noqa: E402
+
+ULTIMO_ANO = 2025
+
+
+def montar_arvore(qtd_anos):
+    """{caminho: [hrefs]} imitando o portal. Anos pares guardam os ZIPs numa subpasta."""
+    arvore = {"/": ["../"] + [f"{ano}/" for ano in range(ULTIMO_ANO - qtd_anos + 1, ULTIMO_ANO + 1)]}
+    for ano in range(ULTIMO_ANO - qtd_anos + 1, ULTIMO_ANO + 1):
+        # O ano corrente só tem os trimestres já publicados
+        trimestres = range(1, 3 if ano == ULTIMO_ANO else 5)
+        zips = [f"{t}T{ano}.zip" for t in trimestres]
+        if ano % 2 == 0:
+            arvore[f"/{ano}/"] = ["../", "dados/", "leiame.pdf"]
+            arvore[f"/{ano}/dados/"] = ["../"] + zips
+        else:
+            arvore[f"/{ano}/"] = ["../"] + zips
+    return arvore
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        s = self.server
+        with s.lock:
+            s.requisicoes += 1
+        time.sleep(s.latencia)
+        links = s.arvore.get(self.path)
+        if links is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{abs(hash(self.path))}"'
+        if self.headers.get('If-None-Match') == etag:
+            with s.lock:
+                s.nao_modificados += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        corpo = ("<html><body><pre>" + "".join(f'<a href="{h}">{h}</a>\n' for h in links)
+                 + "</pre></body></html>").encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def medir(base_url, servidor, n_trimestres, workers, cache_dir):
+    ANSScraper.MAX_CRAWL_WORKERS = workers
+    ANSScraper._session = None  # pool de conexões dimensionado para os workers do cenário
+    servidor.requisicoes = servidor.nao_modificados = 0
+    inicio = time.perf_counter()
+    arquivos = ANSScraper.identificar_arquivos_trimestrais(base_url, n_trimestres, cache_dir=cache_dir)
+    return time.perf_counter() - inicio, arquivos, servidor.requisicoes, servidor.nao_modificados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anos", type=int, default=18, help="anos publicados na árvore simulada")
+    parser.add_argument("--latencia-ms", type=float, default=80, help="latência por requisição do servidor")
+    parser.add_argument("--trimestres", type=int, nargs="+", default=[3, 12, 40])
+    args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    servidor.arvore = montar_arvore(args.anos)
+    servidor.latencia = args.latencia_ms / 1000
+    servidor.lock = threading.Lock()
+    servidor.requisicoes = servidor.nao_modificados = 0
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{servidor.server_address[1]}/"
+    workers_padrao = ANSScraper.MAX_CRAWL_WORKERS
+    cache_dir = tempfile.mkdtemp(prefix="bench_crawl_")
+
+    # A tabela sai no fim: o scraper imprime o progresso de cada listagem
+    tabela = []
+    try:
+        for n in args.trimestres:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            os.makedirs(cache_dir)
+            base, referencia, _, _ = medir(base_url, servidor, n, 1, None)
+            tabela.append(f"{n:>10} {'sequencial':>11} {base:>8.2f} {servidor.requisicoes:>12} {'-':>5} {1.0:>7.2f}x")
+            for cenario, pasta in (("paralelo", None), ("frio", cache_dir), ("cache", cache_dir)):
+                tempo, arquivos, reqs, nao_mod = medir(base_url, servidor, n, workers_padrao, pasta)
+                # A seleção tem de ser a mesma da busca sequencial, na mesma ordem
+                if arquivos != referencia:
+                    sys.exit(f"❌ {cenario} com {n} trimestres divergiu da busca sequencial")
+                tabela.append(f"{n:>10} {cenario:>11} {tempo:>8.2f} {reqs:>12} {nao_mod:>5} {base / tempo:>7.2f}x")
+    finally:
+        ANSScraper.MAX_CRAWL_WORKERS = workers_padrao
+        servidor.shutdown()
+        servidor.server_close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"\n🧪 {args.anos} anos simulados, {args.latencia_ms:.0f} ms por requisição, "
+          f"{workers_padrao} workers no modo paralelo")
+    print(f"{'trimestres':>10} {'cenário':>11} {'tempo_s':>8} {'requisições':>12} {'304':>5} {'speedup':>8}")
+    print("\n".join(tabela))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark do CSVReader: tempo de parse com engine pyarrow x engine C por arquivo.
+
+Gera CSVs sintéticos no formato dos arquivos do pipeline (consolidado em UTF-8 e
+CADOP em Latin-1), ou usa arquivos reais com --arquivos, e mede CSVReader.ler
+com CSV_ENGINE=c e CSV_ENGINE=pyarrow. Confere também se os dois engines
+devolvem os mesmos valores.
+
+    python scripts/bench_csv_reader.py --linhas 200000 1000000
+    python scripts/bench_csv_reader.py --arquivos data/consolidado_despesas.csv data/Relatorio_cadop.csv
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.csv_reader import CSVReader, PYARROW_DISPONIVEL  # noqa: E402
+
+UFS = ["SP", "RJ", "MG", "RS", "PR", "BA", "PE", "CE", "GO", "PA"]
+
+
+def gerar_consolidado(caminho, linhas, semente=42):
+    aleatorio = random.Random(semente)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("CNPJ;RazaoSocial;Trimestre;Ano;ValorDespesas\n")
+        for i in range(linhas):
+            # CNPJ com zeros à esquerda: o texto tem de chegar intacto nos dois engines
+            f.write(f"{aleatorio.randint(0, 10**14 - 1):014d};OPERADORA DE SAÚDE {i % 1500};"
+                    f"{aleatorio.randint(1, 4)};{aleatorio.randint(2015, 2025)};"
+                    f"{aleatorio.uniform(0, 1e7):.2f}\n")
+
+
+def gerar_cadop(caminho, linhas, semente=42):
+    aleatorio = random.Random(semente)
+    with open(caminho, "w", encoding="latin-1") as f:
+        f.write('"REGISTRO_OPERADORA";"CNPJ";"Razao_Social";"Modalidade";"UF"\n')
+        for i in range(linhas):
+            f.write(f'"{300000 + i}";"{aleatorio.randint(10**13, 10**14 - 1)}";"ASSISTÊNCIA MÉDICA {i}";'
+                    f'"Medicina de Grupo";"{aleatorio.choice(UFS)}"\n')
+
+
+def medir(caminho, engine, repeticoes):
+    CSVReader.ENGINE = engine
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df = CSVReader.ler(caminho, sep=";")
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos), df
+
+
+def mesmos_valores(a, b):
+    if a.shape != b.shape or list(a.columns) != list(b.columns):
+        return False
+    return all((a[c].astype(object).fillna("") == b[c].astype(object).fillna("")).all() for c in a.columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[200000, 1000000])
+    parser.add_argument("--arquivos", nargs="+", help="CSVs reais (separador ;) em vez dos sintéticos")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    if not PYARROW_DISPONIVEL:
+        sys.exit("pyarrow não está instalado: não há o que comparar.")
+
+    pasta = tempfile.mkdtemp(prefix="bench_csv_")
+    engine_original = CSVReader.ENGINE
+    try:
+        arquivos = args.arquivos
+        if not arquivos:
+            arquivos = []
+            for linhas in args.linhas:
+                for nome, gerar in (("consolidado", gerar_consolidado), ("cadop", gerar_cadop)):
+                    caminho = os.path.join(pasta, f"{nome}_{linhas}.csv")
+                    gerar(caminho, linhas)
+                    arquivos.append(caminho)
+
+        print(f"🧪 Mediana de {args.repeticoes} leituras por arquivo\n")
+        print(f"{'arquivo':<28} {'MB':>7} {'encoding':>10} {'c_s':>7} {'pyarrow_s':>10} {'speedup':>8} {'iguais':>7}")
+        for caminho in arquivos:
+            tempo_c, df_c = medir(caminho, "c", args.repeticoes)
+            tempo_pa, df_pa = medir(caminho, "pyarrow", args.repeticoes)
+            mb = os.path.getsize(caminho) / 1024 ** 2
+            print(f"{os.path.basename(caminho):<28} {mb:>7.1f} {CSVReader.detectar_encoding(caminho):>10} "
+                  f"{tempo_c:>7.2f} {tempo_pa:>10.2f} {tempo_c / tempo_pa:>7.2f}x "
+                  f"{'sim' if mesmos_valores(df_c, df_pa) else 'NÃO':>7}")
+    finally:
+        CSVReader.ENGINE = engine_original
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
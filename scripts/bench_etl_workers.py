@@ -0,0 +1,96 @@
+"""
+Benchmark do DataProcessor: modo serial x pool de processos (ETL_WORKERS) para 3, 8 e 12 trimestres.
+
+Gera ZIPs sintéticos no formato da ANS (ou usa ZIPs reais com --zips-dir) e mede o
+tempo para consumir todos os chunks normalizados, como a Etapa 1 faz.
+
+    python scripts/bench_etl_workers.py --linhas 300000 --workers 1 4 8
+    python scripts/bench_etl_workers.py --zips-dir data --trimestres 3 8
+"""
+import argparse
+import glob
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.data_processor import DataProcessor  # noqa: E402
+
+CABECALHO = "DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_INICIAL;VL_SALDO_FINAL"
+CONTAS = ("411", "4111", "41111", "311", "3111", "4.1.1", "46", "461")
+MEMBROS_POR_ZIP = 3
+
+
+def gerar_zips(pasta, trimestres, linhas):
+    """Um ZIP por trimestre (1T2015.zip, 2T2015.zip, ...), cada um com MEMBROS_POR_ZIP CSVs."""
+    aleatorio = random.Random(42)
+    caminhos = []
+    por_membro = linhas // MEMBROS_POR_ZIP
+    for n in range(trimestres):
+        ano, tri = 2015 + n // 4, n % 4 + 1
+        caminho = os.path.join(pasta, f"{tri}T{ano}.zip")
+        with zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED) as z:
+            for m in range(MEMBROS_POR_ZIP):
+                corpo = [CABECALHO]
+                for _ in range(por_membro):
+                    valor = f"{aleatorio.uniform(0, 1e6):.2f}".replace(".", ",")
+                    corpo.append(f"{ano}-{tri * 3:02d}-01;{aleatorio.randint(300000, 420000)};"
+                                 f"{aleatorio.choice(CONTAS)};EVENTOS/ SINISTROS CONHECIDOS;0;{valor}")
+                z.writestr(f"{tri}T{ano}_{m}.csv", "\n".join(corpo) + "\n")
+        caminhos.append(caminho)
+    return caminhos
+
+
+def medir(zips, data_dir, workers):
+    inicio = time.perf_counter()
+    linhas = 0
+    for chunk in DataProcessor.iterar_normalizado(zips, data_dir, workers=workers):
+        linhas += len(chunk)
+    return time.perf_counter() - inicio, linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trimestres", type=int, nargs="+", default=[3, 8, 12])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--linhas", type=int, default=150000, help="linhas por trimestre (ZIPs sintéticos)")
+    parser.add_argument("--zips-dir", help="usa os ZIPs reais desta pasta (NTAAAA.zip) em vez de gerar")
+    args = parser.parse_args()
+
+    print(f"🖥️ CPUs disponíveis: {os.cpu_count()}")
+    pasta = tempfile.mkdtemp(prefix="bench_etl_")
+    try:
+        if args.zips_dir:
+            todos = sorted(glob.glob(os.path.join(args.zips_dir, "*.zip")),
+                           key=lambda c: DataProcessor.periodo_numerico(c) or (0, 0))
+            todos = [c for c in todos if DataProcessor.periodo_numerico(c)]
+        else:
+            print(f"🧪 Gerando {max(args.trimestres)} trimestres sintéticos ({args.linhas} linhas cada)...")
+            todos = gerar_zips(pasta, max(args.trimestres), args.linhas)
+
+        # A tabela sai no fim: o DataProcessor (e os processos filhos) imprimem o progresso
+        tabela = []
+        for qtd in args.trimestres:
+            zips = todos[:qtd]
+            if len(zips) < qtd:
+                tabela.append(f"{qtd:>10}   (só há {len(zips)} ZIPs disponíveis)")
+                continue
+            base = None
+            for workers in args.workers:
+                tempo, linhas = medir(zips, pasta, workers)
+                base = base or tempo
+                tabela.append(f"{qtd:>10} {workers:>8} {tempo:>9.2f} {linhas:>10} {base / tempo:>7.2f}x")
+
+        print(f"\n{'trimestres':>10} {'workers':>8} {'tempo_s':>9} {'linhas':>10} {'speedup':>8}")
+        print("\n".join(tabela))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark do filtro da conta 411 (DataProcessor._mascara_411) por chunk.
+
+Compara, em chunks de 100k códigos de conta com N códigos distintos:
+
+  regex        contas.str.replace(r'\\D', '') == '411' (versão original)
+  dict         cache por código, mas a lista de válidos refeita a cada chunk
+  set          cache por código + set de válidos atualizado só em cache miss (atual)
+
+    python scripts/bench_filtro_411.py --distintos 50 2000 20000 --chunks 30
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.data_processor import DataProcessor  # noqa: E402
+
+VARIANTES = ("411", "4.1.1", "4-1-1", "4 1 1", "41.1")
+
+
+def gerar_chunks(distintos, chunks, tamanho, semente=42):
+    aleatorio = random.Random(semente)
+    # Plano de contas: ~10% de variantes da 411, o resto códigos de 1 a 9 dígitos
+    codigos = [aleatorio.choice(VARIANTES) if i % 10 == 0 else str(aleatorio.randint(1, 999_999_999))
+               for i in range(distintos)]
+    return [pd.Series(aleatorio.choices(codigos, k=tamanho)) for _ in range(chunks)]
+
+
+def mascara_regex(contas):
+    return contas.str.replace(r'\D', '', regex=True) == '411'
+
+
+def mascara_dict(contas, cache):
+    for codigo in pd.unique(contas.dropna()):
+        if codigo not in cache:
+            cache[codigo] = (codigo in DataProcessor.VARIANTES_411
+                             or ''.join(ch for ch in codigo if ch.isdigit()) == '411')
+    validos = [c for c, ok in cache.items() if ok]
+    return contas.isin(validos)
+
+
+def mascara_set(contas):
+    return DataProcessor._mascara_411(contas)
+
+
+def medir(funcao, chunks):
+    tempos, mascaras = [], []
+    for contas in chunks:
+        inicio = time.perf_counter()
+        mascaras.append(funcao(contas))
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    # O primeiro chunk paga os cache misses; a mediana mostra o regime estável
+    return tempos[0], statistics.median(tempos[1:] or tempos), mascaras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distintos", type=int, nargs="+", default=[50, 2000, 20000])
+    parser.add_argument("--chunks", type=int, default=30)
+    parser.add_argument("--tamanho", type=int, default=100000, help="linhas por chunk (igual ao chunksize do ETL)")
+    args = parser.parse_args()
+
+    print(f"🧪 {args.chunks} chunks de {args.tamanho} linhas (ms por chunk)\n")
+    print(f"{'distintos':>9} {'versão':>7} {'1º_chunk':>9} {'mediana':>9} {'speedup':>8}")
+    for distintos in args.distintos:
+        chunks = gerar_chunks(distintos, args.chunks, args.tamanho)
+        DataProcessor._contas_411.clear()
+        DataProcessor._contas_411_validas.clear()
+        cache = {}
+        resultados = [
+            ("regex", medir(mascara_regex, chunks)),
+            ("dict", medir(lambda c: mascara_dict(c, cache), chunks)),
+            ("set", medir(mascara_set, chunks)),
+        ]
+        referencia = resultados[0][1][2]
+        base = resultados[0][1][1]
+        for nome, (primeiro, mediana, mascaras) in resultados:
+            if not all(m.equals(r) for m, r in zip(mascaras, referencia)):
+                sys.exit(f"❌ {nome} divergiu do regex com {distintos} códigos distintos")
+            print(f"{distintos:>9} {nome:>7} {primeiro:>9.2f} {mediana:>9.2f} {base / mediana:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
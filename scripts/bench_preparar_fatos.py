@@ -0,0 +1,109 @@
+"""
+Benchmark da montagem da tabela fato na Etapa 3 (Step3DBIngestion._preparar_fatos).
+
+Compara a versão original (apply por linha para a data do evento, regex em todas as
+linhas) com a vetorizada atual, em DataFrames sintéticos no formato do consolidado:
+texto (vindo do CSV) ou já tipado (vindo do Parquet, --tipado). Confere também se as
+duas versões geram as mesmas linhas válidas.
+
+    python scripts/bench_preparar_fatos.py --linhas 1000000 5000000
+    python scripts/bench_preparar_fatos.py --linhas 5000000 --tipado
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.step3_db_ingestion import Step3DBIngestion  # noqa: E402
+
+
+def preparar_fatos_apply(df_desp):
+    """Versão original, com apply por linha (igual à referência de tests/test_preparar_fatos.py)."""
+    df_desp = df_desp.copy()
+    df_desp['cnpj_operadora'] = df_desp['CNPJ'].str.replace(r'\D', '', regex=True).str.zfill(14)
+    if pd.api.types.is_numeric_dtype(df_desp['VALORDESPESAS']):
+        df_desp['valor_despesa'] = df_desp['VALORDESPESAS']
+    else:
+        df_desp['valor_despesa'] = pd.to_numeric(df_desp['VALORDESPESAS'].str.replace(',', '.'), errors='coerce')
+    df_desp['ANO'] = pd.to_numeric(df_desp['ANO'], errors='coerce').fillna(0).astype(int)
+    df_desp['TRIMESTRE'] = pd.to_numeric(df_desp['TRIMESTRE'], errors='coerce').fillna(1).astype(int)
+
+    def get_data(row):
+        try:
+            mes = int(row['TRIMESTRE']) * 3 - 2
+            return f"{int(row['ANO']):04d}-{mes:02d}-01"
+        except Exception:
+            return None
+
+    df_desp['data_evento'] = df_desp.apply(get_data, axis=1)
+    df_desp = df_desp.dropna(subset=['data_evento'])
+
+    df_final = pd.DataFrame()
+    df_final['data_evento'] = df_desp['data_evento']
+    df_final['cnpj_operadora'] = df_desp['cnpj_operadora']
+    df_final['cd_conta_contabil'] = df_desp.get('CONTA', '411')
+    df_final['descricao'] = df_desp.get('DESCRICAO', 'Despesa Assistencial')
+    df_final['valor_despesa'] = df_desp['valor_despesa']
+    df_final['ano'] = df_desp['ANO']
+    df_final['trimestre'] = df_desp['TRIMESTRE']
+    df_final['codigo_origem'] = df_desp['cnpj_operadora'].str.lstrip('0')
+    return df_final
+
+
+def gerar_despesas(linhas, tipado, operadoras=1500, semente=42):
+    """~1500 operadoras, 12 trimestres e uma fração pequena de ano/trimestre inválidos."""
+    aleatorio = random.Random(semente)
+    gerador = np.random.default_rng(semente)
+    cnpjs = np.array([f"{aleatorio.randint(0, 99_999_999):08d}/0001-{aleatorio.randint(0, 99):02d}"
+                      for _ in range(operadoras)], dtype=object)
+    ano = gerador.integers(2023, 2026, linhas)
+    trimestre = gerador.integers(1, 5, linhas)
+    invalidos = gerador.random(linhas) < 0.001
+    trimestre[invalidos] = 5
+    valor = gerador.uniform(-1e5, 1e7, linhas).round(2)
+    df = pd.DataFrame({'CNPJ': cnpjs[gerador.integers(0, operadoras, linhas)]})
+    if tipado:
+        df['ANO'], df['TRIMESTRE'], df['VALORDESPESAS'] = ano, trimestre, valor
+    else:
+        df['ANO'] = ano.astype(str).astype(object)
+        df['TRIMESTRE'] = trimestre.astype(str).astype(object)
+        df['VALORDESPESAS'] = pd.Series(valor).map('{:.2f}'.format).str.replace('.', ',', regex=False)
+    return df
+
+
+def medir(funcao, df):
+    inicio = time.perf_counter()
+    resultado = funcao(df)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--tipado", action="store_true", help="ANO/TRIMESTRE/VALOR numéricos, como no Parquet")
+    args = parser.parse_args()
+
+    print(f"🧪 Entrada {'tipada (Parquet)' if args.tipado else 'em texto (CSV)'}\n")
+    print(f"{'linhas':>10} {'apply_s':>9} {'vetorizado_s':>13} {'speedup':>8} {'linhas_saida':>13} {'iguais':>7}")
+    for linhas in args.linhas:
+        df = gerar_despesas(linhas, args.tipado)
+        tempo_antigo, antigo = medir(preparar_fatos_apply, df)
+        tempo_novo, novo = medir(Step3DBIngestion._preparar_fatos, df)
+        # O apply mantinha trimestre 5 como texto "AAAA-13-01", que o banco rejeitava
+        antigo = antigo[antigo['trimestre'].between(1, 4) & (antigo['ano'] > 0)]
+        iguais = (novo.index.equals(antigo.index)
+                  and novo['data_evento'].dt.strftime('%Y-%m-%d').equals(antigo['data_evento'])
+                  and all(novo[c].astype(object).equals(antigo[c].astype(object))
+                          for c in ('cnpj_operadora', 'valor_despesa', 'codigo_origem')))
+        print(f"{linhas:>10} {tempo_antigo:>9.2f} {tempo_novo:>13.2f} {tempo_antigo / tempo_novo:>7.1f}x "
+              f"{len(novo):>13} {'sim' if iguais else 'NÃO':>7}")
+
+
+if __name__ == "__main__":
+    main()
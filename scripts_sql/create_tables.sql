@@ -1,6 +1,15 @@
 -- Criação do Schema e Tabelas
 -- Compatível com PostgreSQL e MySQL
 
+-- 0. Extensões da busca textual (trigram + remoção de acentos, ex: "SAÚDE" = "saude")
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() não é IMMUTABLE, então não pode ir direto em um índice: usamos um wrapper
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+    SELECT public.unaccent('public.unaccent', $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
 -- 1. Tabela Dimensão: Operadoras
 CREATE TABLE IF NOT EXISTS operadoras (
     registro_ans VARCHAR(10),
@@ -22,10 +31,37 @@ CREATE TABLE IF NOT EXISTS operadoras (
 
 CREATE INDEX IF NOT EXISTS idx_ops_razao ON operadoras(razao_social);
 CREATE INDEX IF NOT EXISTS idx_ops_uf ON operadoras(uf);
+-- Busca da API: substring sem acento na razão social (GIN trigram) e prefixo de CNPJ/Registro ANS
+CREATE INDEX IF NOT EXISTS idx_ops_razao_trgm ON operadoras USING gin (f_unaccent(lower(razao_social)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ops_cnpj_prefix ON operadoras(cnpj text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_ops_registro_prefix ON operadoras(registro_ans text_pattern_ops);
+-- Índices da paginação por cursor (keyset) da API: mesma expressão do ORDER BY
+CREATE INDEX IF NOT EXISTS idx_ops_keyset ON operadoras((COALESCE(razao_social, '')), cnpj);
+CREATE INDEX IF NOT EXISTS idx_ops_uf_keyset ON operadoras((COALESCE(uf, '')), (COALESCE(razao_social, '')), cnpj);
 
 -- 2. Tabela Fato: Despesas Financeiras
+-- Particionada por trimestre (RANGE em ano, trimestre): uma partição despesas_AAAA_tN por período.
+-- A Etapa 3 carrega cada trimestre numa tabela avulsa e troca a partição inteira (DETACH/DROP + ATTACH).
+
+-- 2.0 Migração: bancos criados antes do particionamento têm "despesas" como tabela comum.
+-- Renomeia a antiga (os dados são copiados para as partições logo abaixo) e libera os nomes dos índices.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE relname = 'despesas' AND relkind = 'r' AND relnamespace = 'public'::regnamespace
+    ) THEN
+        DROP MATERIALIZED VIEW IF EXISTS despesas_trimestrais;
+        ALTER TABLE despesas RENAME TO despesas_legado;
+        ALTER INDEX IF EXISTS despesas_pkey RENAME TO despesas_legado_pkey;
+        ALTER SEQUENCE IF EXISTS despesas_id_seq RENAME TO despesas_legado_id_seq;
+        DROP INDEX IF EXISTS idx_despesas_periodo;
+        DROP INDEX IF EXISTS idx_despesas_valor;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS despesas (
-    id SERIAL PRIMARY KEY, -- Use AUTO_INCREMENT no MySQL
+    id SERIAL, -- Use AUTO_INCREMENT no MySQL
     cnpj_operadora VARCHAR(14),
     ano INTEGER NOT NULL,
     trimestre INTEGER NOT NULL,
@@ -39,12 +75,106 @@ CREATE TABLE IF NOT EXISTS despesas (
     -- Útil apenas quando não conseguimos achar o CNPJ (Orfãos)
     codigo_origem VARCHAR(50),
     
+    -- Em tabela particionada a PK precisa conter a chave de partição
+    PRIMARY KEY (id, ano, trimestre),
     CONSTRAINT fk_operadora FOREIGN KEY (cnpj_operadora) REFERENCES operadoras(cnpj)
-);
+) PARTITION BY RANGE (ano, trimestre);
+
+-- Cria (se não existir) a partição de um trimestre e devolve o nome. Mesmo padrão de nome usado pela Etapa 3.
+CREATE OR REPLACE FUNCTION criar_particao_despesas(p_ano INTEGER, p_trimestre INTEGER) RETURNS text AS $$
+DECLARE
+    nome text := format('despesas_%s_t%s', p_ano, p_trimestre);
+BEGIN
+    IF to_regclass(nome) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF despesas FOR VALUES FROM (%s, %s) TO (%s, %s)',
+            nome, p_ano, p_trimestre, p_ano, p_trimestre + 1);
+    END IF;
+    RETURN nome;
+END;
+$$ LANGUAGE plpgsql;
 
+-- 2.0.1 Copia os dados da tabela antiga para as partições e descarta a antiga
+DO $$
+DECLARE
+    periodo RECORD;
+BEGIN
+    IF to_regclass('despesas_legado') IS NOT NULL THEN
+        FOR periodo IN SELECT DISTINCT ano, trimestre FROM despesas_legado LOOP
+            PERFORM criar_particao_despesas(periodo.ano, periodo.trimestre);
+        END LOOP;
+        INSERT INTO despesas (
+            id, cnpj_operadora, ano, trimestre, data_evento, cd_conta_contabil,
+            descricao, valor_despesa, data_carga, codigo_origem
+        )
+        SELECT
+            id, cnpj_operadora, ano, trimestre, data_evento, cd_conta_contabil,
+            descricao, valor_despesa, data_carga, codigo_origem
+        FROM despesas_legado;
+        PERFORM setval(pg_get_serial_sequence('despesas', 'id'), GREATEST((SELECT MAX(id) FROM despesas), 1));
+        DROP TABLE despesas_legado;
+    END IF;
+END $$;
+
+-- Índices particionados (replicados em cada partição, inclusive nas anexadas pela Etapa 3)
 CREATE INDEX IF NOT EXISTS idx_despesas_periodo ON despesas(ano, trimestre);
 CREATE INDEX IF NOT EXISTS idx_despesas_valor ON despesas(valor_despesa);
+-- Consultas por operadora e checagem da FK ao alterar/remover operadoras: sem ele cada uma varre todas as partições
+CREATE INDEX IF NOT EXISTS idx_despesas_operadora_periodo ON despesas(cnpj_operadora, ano, trimestre);
+
+-- 2.1 Rollup por Operadora x Trimestre (REFRESH no fim da Etapa 3)
+-- Serve o histórico da API, o ranking de crescimento e as queries analíticas sem varrer a tabela fato
+CREATE MATERIALIZED VIEW IF NOT EXISTS despesas_trimestrais AS
+SELECT
+    cnpj_operadora,
+    ano,
+    trimestre,
+    COALESCE(codigo_origem, '') as codigo_origem,
+    SUM(valor_despesa) as valor_total,
+    COUNT(*) as qtd_registros
+FROM despesas
+GROUP BY cnpj_operadora, ano, trimestre, COALESCE(codigo_origem, '');
+
+-- Índice único: obrigatório para o REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rollup_pk ON despesas_trimestrais(cnpj_operadora, ano, trimestre, codigo_origem);
+CREATE INDEX IF NOT EXISTS idx_rollup_periodo ON despesas_trimestrais(ano, trimestre);
+
+-- 2.2 Resumo de Atividade por Operadora (mantido pela Etapa 3 a cada carga)
+-- Evita o "cnpj IN (SELECT DISTINCT cnpj_operadora FROM despesas)" a cada requisição da API
+CREATE TABLE IF NOT EXISTS operadoras_atividade (
+    cnpj VARCHAR(14) PRIMARY KEY REFERENCES operadoras(cnpj),
+    has_despesas BOOLEAN NOT NULL DEFAULT FALSE,
+    primeiro_periodo INTEGER, -- ano * 10 + trimestre (ex: 20251)
+    ultimo_periodo INTEGER,
+    qtd_registros BIGINT NOT NULL DEFAULT 0,
+    data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
+CREATE INDEX IF NOT EXISTS idx_atividade_ativas ON operadoras_atividade(cnpj) WHERE has_despesas;
+
+
+-- 2.3 Quarentena de Despesas Órfãs (REG_ANS sem CNPJ no cadastro), regravada por trimestre pela Etapa 3
+-- As linhas em si vão para a operadora Dummy; aqui fica a auditoria consultável pela API (aba "desconhecidas")
+CREATE TABLE IF NOT EXISTS despesas_quarentena (
+    codigo_origem VARCHAR(50) NOT NULL, -- REG_ANS original
+    ano INTEGER NOT NULL,
+    trimestre INTEGER NOT NULL,
+    qtd_registros BIGINT NOT NULL DEFAULT 0,
+    valor_total DECIMAL(18, 2),
+    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (codigo_origem, ano, trimestre)
+);
+
+CREATE INDEX IF NOT EXISTS idx_quarentena_periodo ON despesas_quarentena(ano, trimestre);
+
+-- Bancos carregados antes da quarentena: os órfãos já estão na tabela fato, sob a Dummy
+INSERT INTO despesas_quarentena (codigo_origem, ano, trimestre, qtd_registros, valor_total)
+SELECT COALESCE(codigo_origem, ''), ano, trimestre, COUNT(*), SUM(valor_despesa)
+FROM despesas
+WHERE cnpj_operadora = '00000000000000'
+  AND NOT EXISTS (SELECT 1 FROM despesas_quarentena)
+GROUP BY COALESCE(codigo_origem, ''), ano, trimestre
+ON CONFLICT (codigo_origem, ano, trimestre) DO NOTHING;
 
 -- 3. Tabela de Agregados (Solicitada no Item 3.2)
 -- Para performance da API de dashboard (Query 2 e 4.2.3)
@@ -59,4 +189,14 @@ CREATE TABLE IF NOT EXISTS despesas_agregadas (
 );
 
 -- Índice para consultas rápidas
-CREATE INDEX IF NOT EXISTS idx_agregados_uf ON despesas_agregadas(uf);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_agregados_uf ON despesas_agregadas(uf);
+
+-- 4. Versão dos Dados (incrementada pela Etapa 3 ao fim de cada carga)
+-- A API usa essa versão para invalidar o cache de /api/estatisticas e gerar o ETag
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_version (id, versao) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
@@ -1,3 +1,6 @@
+-- Todas as queries leem o rollup despesas_trimestrais (operadora x trimestre),
+-- atualizado no fim da Etapa 3, em vez de varrer a tabela fato despesas.
+
 -- =================================================================
 -- QUERY 1: Top 5 operadoras com maior crescimento de despesas
 -- (Último trimestre vs Primeiro trimestre)
@@ -7,14 +10,14 @@ WITH limites AS (
     SELECT 
         MIN(ano * 10 + trimestre) as periodo_ini, 
         MAX(ano * 10 + trimestre) as periodo_fim 
-    FROM despesas
+    FROM despesas_trimestrais
 ),
 valores_pontas AS (
     SELECT 
         d.cnpj_operadora,
-        SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_ini THEN d.valor_despesa ELSE 0 END) as vlr_inicial,
-        SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_fim THEN d.valor_despesa ELSE 0 END) as vlr_final
-    FROM despesas d, limites l
+        SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_ini THEN d.valor_total ELSE 0 END) as vlr_inicial,
+        SUM(CASE WHEN (d.ano * 10 + d.trimestre) = l.periodo_fim THEN d.valor_total ELSE 0 END) as vlr_final
+    FROM despesas_trimestrais d, limites l
     GROUP BY d.cnpj_operadora
 )
 SELECT 
@@ -33,10 +36,10 @@ LIMIT 5;
 -- =================================================================
 SELECT 
     o.uf,
-    SUM(d.valor_despesa) as total_despesas,
+    SUM(d.valor_total) as total_despesas,
     -- Total do Estado / Número de Operadoras distintas
-    ROUND(SUM(d.valor_despesa) / NULLIF(COUNT(DISTINCT o.cnpj), 0), 2) as media_por_operadora
-FROM despesas d
+    ROUND(SUM(d.valor_total) / NULLIF(COUNT(DISTINCT o.cnpj), 0), 2) as media_por_operadora
+FROM despesas_trimestrais d
 JOIN operadoras o ON d.cnpj_operadora = o.cnpj
 WHERE o.uf IS NOT NULL
 GROUP BY o.uf
@@ -48,8 +51,9 @@ LIMIT 5;
 -- =================================================================
 WITH media_por_trimestre AS (
     -- 1. Calcula a média geral de despesas de TODO O MERCADO por trimestre
-    SELECT ano, trimestre, AVG(valor_despesa) as media_mercado
-    FROM despesas
+    -- (média por lançamento = soma / quantidade de linhas do rollup)
+    SELECT ano, trimestre, SUM(valor_total) / NULLIF(SUM(qtd_registros), 0) as media_mercado
+    FROM despesas_trimestrais
     GROUP BY ano, trimestre
 ),
 performance_operadora AS (
@@ -58,9 +62,9 @@ performance_operadora AS (
         d.cnpj_operadora,
         d.ano,
         d.trimestre,
-        SUM(d.valor_despesa) as total_op,
+        SUM(d.valor_total) as total_op,
         m.media_mercado
-    FROM despesas d
+    FROM despesas_trimestrais d
     JOIN media_por_trimestre m ON d.ano = m.ano AND d.trimestre = m.trimestre
     GROUP BY d.cnpj_operadora, d.ano, d.trimestre, m.media_mercado
 )
@@ -72,5 +76,5 @@ FROM performance_operadora p
 JOIN operadoras o ON p.cnpj_operadora = o.cnpj
 WHERE p.total_op > p.media_mercado
 GROUP BY p.cnpj_operadora, o.razao_social
-HAVING COUNT(*) >= 2; -- Filtro final: Pelo menos 2 trimestres
+HAVING COUNT(*) >= 2 -- Filtro final: Pelo menos 2 trimestres
 ORDER BY qtd_trimestres_acima DESC;
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Os módulos do backend são importados como pacote "app" (mesmo layout do container)
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# tests/inspect_zip.py é um script manual (roda ao ser importado), não um teste
+collect_ignore = ["inspect_zip.py"]
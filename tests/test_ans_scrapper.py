@@ -0,0 +1,169 @@
+import io
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.ans_scrapper import ANSScraper
+
+ETAG = '"v1"'
+
+
+def _zip_fixture():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        # Conteúdo pouco compressível para o ZIP ter alguns KB
+        z.writestr("1T2025.csv", "\n".join(f"{i};{i * 7919 % 10007};411;{i * 31 % 997},00" for i in range(4000)))
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Servidor de fixtures: comportamento controlado pelos atributos do servidor."""
+
+    def log_message(self, *args):
+        pass
+
+    def _corpo_e_status(self):
+        s = self.server
+        corpo = s.arquivo
+        faixa = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if faixa and s.aceita_range and (if_range is None or if_range == s.etag):
+            inicio = int(faixa.split('=')[1].rstrip('-'))
+            if inicio >= len(corpo):
+                return b"", 416, {'Content-Range': f"bytes */{len(corpo)}"}
+            return corpo[inicio:], 206, {'Content-Range': f"bytes {inicio}-{len(corpo) - 1}/{len(corpo)}"}
+        if s.truncar_gets > 0:
+            # Resposta íntegra do ponto de vista HTTP, mas menor que o Content-Length do HEAD
+            s.truncar_gets -= 1
+            return corpo[:len(corpo) // 2], 200, {}
+        return corpo, 200, {}
+
+    def _cabecalhos(self, status, tamanho, extras):
+        self.send_response(status)
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Last-Modified', 'Wed, 01 Oct 2025 10:00:00 GMT')
+        self.send_header('Content-Length', str(tamanho))
+        for chave, valor in extras.items():
+            self.send_header(chave, valor)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.log.append(('HEAD', None, None))
+        self._cabecalhos(200, len(self.server.arquivo), {})
+
+    def do_GET(self):
+        corpo, status, extras = self._corpo_e_status()
+        self.server.log.append(('GET', self.headers.get('Range'), self.headers.get('If-Range'), status))
+        self._cabecalhos(status, len(corpo), extras)
+        self.wfile.write(corpo)
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    monkeypatch.setattr(ANSScraper, "BACKOFF_BASE", 0)
+    monkeypatch.setattr(ANSScraper, "_session", None)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.arquivo = _zip_fixture()
+    httpd.etag = ETAG
+    httpd.aceita_range = True
+    httpd.truncar_gets = 0
+    httpd.log = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/2025/1T2025.zip"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _gets(servidor):
+    return [e for e in servidor.log if e[0] == 'GET']
+
+
+def _conteudo(caminho):
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+def test_baixa_e_pula_quando_o_manifesto_nao_mudou(servidor, tmp_path):
+    destino = str(tmp_path / "1T2025.zip")
+
+    assert ANSScraper._download_file(servidor.url, destino)
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    assert _conteudo(destino) == servidor.arquivo
+    assert len(_gets(servidor)) == 1
+    assert [e[0] for e in servidor.log] == ['HEAD', 'GET', 'HEAD']
+    assert not os.path.exists(destino + ".part")
+
+
+def test_arquivo_alterado_no_servidor_e_baixado_de_novo(servidor, tmp_path):
+    destino = str(tmp_path / "1T2025.zip")
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    servidor.etag = '"v2"'
+    servidor.arquivo = servidor.arquivo + b"novo"
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    assert _conteudo(destino) == servidor.arquivo
+    assert len(_gets(servidor)) == 2
+
+
+def test_retoma_parcial_com_range_e_if_range(servidor, tmp_path):
+    destino = str(tmp_path / "1T2025.zip")
+    metade = len(servidor.arquivo) // 3
+    with open(destino + ".part", 'wb') as f:
+        f.write(servidor.arquivo[:metade])
+
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    assert _conteudo(destino) == servidor.arquivo
+    assert _gets(servidor) == [('GET', f"bytes={metade}-", ETAG, 206)]
+
+
+def test_servidor_que_ignora_range_responde_200_e_o_parcial_e_sobrescrito(servidor, tmp_path):
+    servidor.aceita_range = False
+    destino = str(tmp_path / "1T2025.zip")
+    with open(destino + ".part", 'wb') as f:
+        f.write(b"lixo de um download antigo")
+
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    assert _conteudo(destino) == servidor.arquivo
+    assert [e[3] for e in _gets(servidor)] == [200]
+
+
+def test_range_alem_do_fim_416_descarta_o_parcial_e_recomeca(servidor, tmp_path):
+    destino = str(tmp_path / "1T2025.zip")
+    with open(destino + ".part", 'wb') as f:
+        f.write(servidor.arquivo + b"sobra")
+
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    assert _conteudo(destino) == servidor.arquivo
+    assert [(e[1] is not None, e[3]) for e in _gets(servidor)] == [(True, 416), (False, 200)]
+
+
+def test_tamanho_diferente_do_content_length_tenta_de_novo_e_retoma(servidor, tmp_path):
+    servidor.truncar_gets = 1
+    destino = str(tmp_path / "1T2025.zip")
+
+    assert ANSScraper._download_file(servidor.url, destino)
+
+    assert _conteudo(destino) == servidor.arquivo
+    metade = len(servidor.arquivo) // 2
+    assert _gets(servidor) == [('GET', None, None, 200), ('GET', f"bytes={metade}-", ETAG, 206)]
+
+
+def test_desiste_apos_max_tentativas(servidor, tmp_path):
+    servidor.truncar_gets = 10
+    servidor.aceita_range = False
+    destino = str(tmp_path / "1T2025.zip")
+
+    assert ANSScraper._download_file(servidor.url, destino) is False
+
+    assert len(_gets(servidor)) == ANSScraper.MAX_TENTATIVAS
+    assert not os.path.exists(destino)
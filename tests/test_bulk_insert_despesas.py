@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from app.services import step3_db_ingestion
+from app.services.step3_db_ingestion import Step3DBIngestion
+
+INDICES_DESPESAS = [
+    ("CREATE UNIQUE INDEX despesas_pkey ON ONLY public.despesas USING btree (id, ano, trimestre)",
+     "PRIMARY KEY (id, ano, trimestre)"),
+    ("CREATE INDEX idx_despesas_valor ON ONLY public.despesas USING btree (valor_despesa)", None),
+]
+FK_DESPESAS = [("FOREIGN KEY (cnpj_operadora) REFERENCES operadoras(cnpj)",)]
+
+
+class CursorFalso:
+    def __init__(self, log, particoes_existentes):
+        self.log = log
+        self.particoes = particoes_existentes
+        self.rowcount = 0
+        self._resultado = []
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.log.append(sql)
+        if sql.startswith("SELECT to_regclass"):
+            self._resultado = [(params[0] in self.particoes,)]
+        elif "FROM pg_index" in sql:
+            self._resultado = INDICES_DESPESAS
+        elif "contype = 'f'" in sql:
+            self._resultado = FK_DESPESAS
+
+    def fetchone(self):
+        return self._resultado[0]
+
+    def fetchall(self):
+        return self._resultado
+
+    def copy_expert(self, sql, buffer):
+        self.log.append(sql.split(" (")[0])
+
+
+class ConexaoFalsa:
+    def __init__(self, particoes_existentes):
+        self.log = []
+        self._cursor = CursorFalso(self.log, particoes_existentes)
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+@pytest.fixture
+def conexao(monkeypatch):
+    conn = ConexaoFalsa({"despesas_2024_t1", "despesas_2024_t2"})
+    monkeypatch.setattr(step3_db_ingestion, "get_db_connection", lambda: conn)
+    monkeypatch.setattr(step3_db_ingestion, "release_db_connection", lambda c: None)
+    return conn
+
+
+def _fatos(periodos):
+    linhas = [(a, t) for a, t, qtd in periodos for _ in range(qtd)]
+    return pd.DataFrame({
+        'data_evento': pd.Timestamp('2024-01-01'), 'cnpj_operadora': '12345678000190',
+        'cd_conta_contabil': '411', 'descricao': 'EVENTOS', 'valor_despesa': 1.0,
+        'ano': [a for a, _ in linhas], 'trimestre': [t for _, t in linhas], 'codigo_origem': '1',
+    })
+
+
+def test_copy_e_indices_antes_do_commit_e_troca_numa_transacao_curta(conexao):
+    assert Step3DBIngestion._bulk_insert_despesas(_fatos([(2024, 1, 3), (2024, 2, 2)]), [(2024, 1), (2024, 2)])
+
+    log = conexao.log
+    assert log.count("COMMIT") == 2
+    commit_carga = log.index("COMMIT")
+    carga, troca = log[:commit_carga], log[commit_carga + 1:-1]
+
+    # Nenhum lock na tabela fato durante a carga
+    assert not any("despesas DETACH" in sql or "despesas ATTACH" in sql for sql in carga)
+    assert [sql for sql in carga if sql.startswith("COPY")] == [
+        "COPY despesas_2024_t1_carga", "COPY despesas_2024_t2_carga"]
+    for trimestre in (1, 2):
+        carga_tn = f"despesas_2024_t{trimestre}_carga"
+        posicao_copy = carga.index(f"COPY {carga_tn}")
+        ddl = [sql for sql in carga[posicao_copy:] if carga_tn in sql and not sql.startswith("COPY")]
+        assert f"ALTER TABLE {carga_tn} ADD PRIMARY KEY (id, ano, trimestre)" in ddl
+        assert f"CREATE INDEX ON {carga_tn} USING btree (valor_despesa)" in ddl
+        assert f"ALTER TABLE {carga_tn} ADD FOREIGN KEY (cnpj_operadora) REFERENCES operadoras(cnpj)" in ddl
+
+    # A troca só tem DDL de partição (nada de COPY ou índice)
+    assert [sql.split(" FOR VALUES")[0] for sql in troca if not sql.startswith("SELECT")] == [
+        "ALTER TABLE despesas DETACH PARTITION despesas_2024_t1", "DROP TABLE despesas_2024_t1",
+        "ALTER TABLE despesas_2024_t1_carga RENAME TO despesas_2024_t1",
+        "ALTER TABLE despesas ATTACH PARTITION despesas_2024_t1",
+        "ALTER TABLE despesas DETACH PARTITION despesas_2024_t2", "DROP TABLE despesas_2024_t2",
+        "ALTER TABLE despesas_2024_t2_carga RENAME TO despesas_2024_t2",
+        "ALTER TABLE despesas ATTACH PARTITION despesas_2024_t2",
+    ]
+
+
+def test_trimestre_sem_linhas_so_remove_a_particao(conexao):
+    assert Step3DBIngestion._bulk_insert_despesas(_fatos([(2024, 1, 2)]), [(2024, 1), (2024, 2)])
+
+    troca = conexao.log[conexao.log.index("COMMIT") + 1:-1]
+    assert "ALTER TABLE despesas DETACH PARTITION despesas_2024_t2" in troca
+    assert "DROP TABLE despesas_2024_t2_carga" in troca
+    assert not any("RENAME TO despesas_2024_t2" in sql for sql in troca)
+    # A quarentena do trimestre vazio também é regravada
+    assert any(sql.startswith("DELETE FROM despesas_quarentena") for sql in conexao.log[:conexao.log.index("COMMIT")])
@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+
+from app.services.csv_reader import CSVReader
+
+CONTEUDO = (
+    'CNPJ;RazaoSocial;ValorDespesas\n'
+    '01234567000189;"OPERADORA; SAÚDE";10.50\n'
+    '00000000000191;;2,0\n'
+)
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    caminho = tmp_path / "consolidado.csv"
+    caminho.write_text(CONTEUDO, encoding='utf-8')
+    return str(caminho)
+
+
+def _valores(df):
+    return [[None if v != v else v for v in linha] for linha in df.astype(object).values.tolist()]
+
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_dtype_str_preserva_o_texto_do_arquivo(monkeypatch, arquivo, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(CSVReader, "ENGINE", engine)
+
+    df = CSVReader.ler(arquivo, sep=';')
+
+    assert list(df.columns) == ['CNPJ', 'RazaoSocial', 'ValorDespesas']
+    assert _valores(df) == [
+        ['01234567000189', 'OPERADORA; SAÚDE', '10.50'],
+        ['00000000000191', None, '2,0'],
+    ]
+
+
+def test_tempo_de_leitura_vai_para_o_log_em_debug(monkeypatch, arquivo, caplog, capsys):
+    monkeypatch.setattr(CSVReader, "ENGINE", "c")
+
+    with caplog.at_level(logging.DEBUG, logger="app.services.csv_reader"):
+        CSVReader.ler(arquivo, sep=';')
+
+    assert capsys.readouterr().out == ""
+    assert [r.levelno for r in caplog.records] == [logging.DEBUG]
+    assert "2 linhas" in caplog.records[0].getMessage()
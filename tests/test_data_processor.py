@@ -0,0 +1,77 @@
+import io
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+from app.services.data_processor import DataProcessor
+
+LINHAS = [
+    '"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_FINAL"',
+    '"123456";"411";"EVENTOS";"10,50"',
+    '"654321";"311";"RECEITAS";"99,00"',
+]
+
+
+def _processar(texto, bom):
+    bruto = texto.encode('utf-8')
+    if bom:
+        bruto = b'\xef\xbb\xbf' + bruto
+    colunas = DataProcessor._colunas_do_cabecalho(bruto[:DataProcessor.TAMANHO_SNIFF])
+    return colunas, list(DataProcessor._iterar_chunks(io.BytesIO(bruto), '1T2025.zip', colunas))
+
+
+@pytest.mark.parametrize('bom', [False, True])
+def test_primeira_coluna_com_bom_nao_e_descartada(bom):
+    colunas, chunks = _processar('\n'.join(LINHAS) + '\n', bom)
+
+    assert colunas[0] == 'REG_ANS'
+    assert len(chunks) == 1
+    df = chunks[0]
+    assert df['CNPJ'].tolist() == ['123456']
+    assert df['VALORDESPESAS'].tolist() == ['10,50']
+    assert (df['ANO'].tolist(), df['TRIMESTRE'].tolist()) == (['2025'], ['1'])
+
+
+
+def _zip_trimestre(pasta, nome, linhas_por_membro):
+    caminho = pasta / nome
+    with zipfile.ZipFile(caminho, 'w') as z:
+        for i, linhas in enumerate(linhas_por_membro):
+            z.writestr(f"{nome[:-4]}_{i}.csv", '\n'.join(linhas) + '\n')
+    return str(caminho)
+
+
+def test_processos_geram_as_mesmas_linhas_e_ordem_do_modo_serial(tmp_path):
+    pytest.importorskip("pyarrow")
+    cabecalho = '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_FINAL"'
+    membros = []
+    for m in range(3):
+        linhas = [cabecalho]
+        for i in range(250):
+            conta = '411' if i % 3 else '311'
+            linhas.append(f'"2025-01-01";"{m}{i:05d}";"{conta}";"EVENTOS";"{i},{m}0"')
+        membros.append(linhas)
+    zips = [_zip_trimestre(tmp_path, "1T2025.zip", membros[:2]),
+            _zip_trimestre(tmp_path, "2T2025.zip", membros[2:])]
+
+    serial = list(DataProcessor.iterar_normalizado(zips, str(tmp_path), workers=1))
+    paralelo = list(DataProcessor.iterar_normalizado(zips, str(tmp_path), workers=2))
+
+    esperado = pd.concat(serial, ignore_index=True)
+    obtido = pd.concat(paralelo, ignore_index=True)
+    assert len(esperado) == 3 * 166
+    pd.testing.assert_frame_equal(obtido, esperado)
+    assert not os.listdir(tmp_path / "temp_partes")
+
+
+def test_mascara_411_igual_ao_regex_e_cache_zerado_por_execucao(tmp_path):
+    contas = pd.Series(['411', '4.1.1', '4-1-1', '41.1', '4111', '311', None, '411', ' 4 1 1 ', 'x411'])
+    esperado = contas.str.replace(r'\D', '', regex=True) == '411'
+
+    assert DataProcessor._mascara_411(contas).tolist() == esperado.tolist()
+    assert DataProcessor._contas_411_validas == {'411', '4.1.1', '4-1-1', '41.1', ' 4 1 1 ', 'x411'}
+
+    list(DataProcessor.iterar_normalizado([], str(tmp_path), workers=1))
+    assert DataProcessor._contas_411 == {} and DataProcessor._contas_411_validas == set()
@@ -0,0 +1,121 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from psycopg2 import extensions as pg_ext
+
+from app.db import connection
+
+
+class ConexaoFalsa:
+    def __init__(self, viva=True):
+        self.closed = 0
+        self.viva = viva
+        self.status = pg_ext.TRANSACTION_STATUS_IDLE
+        self.pings = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.pings += 1
+                if not conn.viva:
+                    raise Exception("server closed the connection unexpectedly")
+
+        return Cursor()
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = pg_ext.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def abertas(monkeypatch):
+    """Conexões abertas pelo pool (psycopg2.connect substituído por uma falsa)."""
+    lista = []
+
+    def conectar(dsn):
+        conn = ConexaoFalsa()
+        lista.append(conn)
+        return conn
+
+    monkeypatch.setattr(connection.psycopg2, "connect", conectar)
+    return lista
+
+
+@pytest.fixture
+def pool(abertas):
+    return connection.DBPool("dsn", minconn=1, maxconn=3, timeout=1, ping_idle=30.0)
+
+
+def _envelhecer(pool, segundos):
+    pool._ociosas = [(conn, t - segundos) for conn, t in pool._ociosas]
+
+
+def test_devolvidas_alem_de_minconn_ficam_ociosas(pool, abertas):
+    # Mesmo padrão de um asyncio.gather da API: várias conexões em paralelo por requisição
+    for _ in range(3):
+        conns = [pool.getconn() for _ in range(3)]
+        for conn in conns:
+            pool.putconn(conn)
+
+    assert len(abertas) == 3
+    assert not any(c.closed for c in abertas)
+    stats = pool.stats()
+    assert (stats["open"], stats["idle"], stats["in_use"]) == (3, 3, 0)
+
+
+def test_conexao_usada_ha_pouco_nao_leva_ping_nem_rollback(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert (conn.pings, conn.rollbacks) == (0, 0)
+
+
+def test_transacao_aberta_e_desfeita_na_devolucao(pool):
+    conn = pool.getconn()
+    conn.status = pg_ext.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+
+    assert conn.rollbacks == 1
+    assert not conn.closed
+
+
+def test_ociosas_mortas_sao_descartadas_ate_achar_uma_viva(pool):
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        conn.viva = False
+        pool.putconn(conn)
+    _envelhecer(pool, 60)
+
+    nova = pool.getconn()
+
+    assert nova not in conns
+    assert all(c.closed for c in conns)
+    stats = pool.stats()
+    assert (stats["discarded"], stats["open"]) == (3, 1)
+
+
+def test_ociosa_antiga_e_viva_e_reaproveitada_apos_o_ping(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    _envelhecer(pool, 60)
+
+    assert pool.getconn() is conn
+    assert conn.pings == 1
+    assert pool.stats()["discarded"] == 0
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.estatisticas_online import EstatisticasOnline
+
+CHAVES = ['RAZAO_FINAL', 'UF']
+
+
+def _dados():
+    rng = np.random.default_rng(42)
+    n = 5000
+    df = pd.DataFrame({
+        'RAZAO_FINAL': rng.choice(['OP A', 'OP B', 'OP C', 'OP D'], n),
+        'UF': rng.choice(['SP', 'RJ', 'MG'], n),
+        # Valores grandes com variância pequena: onde soma dos quadrados perde precisão
+        'VALORDESPESAS': 1e9 + rng.normal(0, 1000, n),
+    })
+    # Grupos com uma linha só (desvio deve ser NaN, como o std do pandas com ddof=1)
+    unicos = pd.DataFrame({
+        'RAZAO_FINAL': ['SOLITARIA', 'OUTRA SOLITARIA'],
+        'UF': ['AC', 'RR'],
+        'VALORDESPESAS': [123.45, 1e12],
+    })
+    return pd.concat([df, unicos], ignore_index=True)
+
+
+def _acumular_em_blocos(df, tamanhos):
+    estado = None
+    inicio = 0
+    for tamanho in tamanhos:
+        bloco = df.iloc[inicio:inicio + tamanho]
+        inicio += tamanho
+        if bloco.empty:
+            continue
+        novo = EstatisticasOnline.estados(bloco, CHAVES, 'VALORDESPESAS')
+        estado = EstatisticasOnline.acumular(estado, novo, CHAVES)
+    assert inicio >= len(df)
+    return estado
+
+
+def _esperado(df):
+    return df.groupby(CHAVES)['VALORDESPESAS'].agg(['sum', 'mean', 'std'])
+
+
+@pytest.mark.parametrize("tamanhos", [
+    [10**9],                     # um bloco só
+    [1000] * 6,                  # todos os grupos divididos entre blocos
+    [1, 2, 3, 4997, 1, 1],       # blocos minúsculos (estados com N=1 sendo combinados)
+])
+def test_acumular_em_blocos_igual_groupby_do_pandas(tamanhos):
+    df = _dados()
+    estado = _acumular_em_blocos(df, tamanhos).set_index(CHAVES).sort_index()
+    esperado = _esperado(df).sort_index()
+
+    assert list(estado.index) == list(esperado.index)
+    assert (estado['N'] == df.groupby(CHAVES).size().sort_index()).all()
+    np.testing.assert_allclose(estado['SOMA'], esperado['sum'], rtol=1e-12)
+    np.testing.assert_allclose(estado['MEDIA'], esperado['mean'], rtol=1e-12)
+    np.testing.assert_allclose(
+        EstatisticasOnline.desvio_padrao(estado), esperado['std'], rtol=1e-9, equal_nan=True)
+
+
+def test_grupo_de_uma_linha_tem_desvio_nan():
+    df = _dados()
+    estado = _acumular_em_blocos(df, [2500, 2502]).set_index(CHAVES)
+    desvio = EstatisticasOnline.desvio_padrao(estado)
+    assert np.isnan(desvio.loc[('SOLITARIA', 'AC')])
+    assert np.isnan(desvio.loc[('OUTRA SOLITARIA', 'RR')])
+    assert estado.loc[('SOLITARIA', 'AC'), 'MEDIA'] == 123.45
+
+
+def test_combinar_estados_por_trimestre_igual_ao_total():
+    # Como a Etapa 2: um estado por trimestre, recombinado no agregado final
+    df = _dados()
+    df['TRIMESTRE'] = np.arange(len(df)) % 3 + 1
+    chaves_trimestre = ['TRIMESTRE'] + CHAVES
+    estados = pd.concat([
+        EstatisticasOnline.estados(parte, chaves_trimestre, 'VALORDESPESAS')
+        for _, parte in df.groupby('TRIMESTRE')
+    ], ignore_index=True)
+    total = EstatisticasOnline.combinar(estados, CHAVES).set_index(CHAVES).sort_index()
+    esperado = _esperado(df).sort_index()
+
+    np.testing.assert_allclose(total['SOMA'], esperado['sum'], rtol=1e-12)
+    np.testing.assert_allclose(total['MEDIA'], esperado['mean'], rtol=1e-12)
+    np.testing.assert_allclose(
+        EstatisticasOnline.desvio_padrao(total), esperado['std'], rtol=1e-9, equal_nan=True)
+
+
+def test_combinar_vazio():
+    vazio = EstatisticasOnline.combinar(pd.DataFrame(columns=CHAVES + EstatisticasOnline.COLUNAS), CHAVES)
+    assert vazio.empty
+    assert list(vazio.columns) == CHAVES + EstatisticasOnline.COLUNAS
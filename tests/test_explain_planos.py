@@ -0,0 +1,164 @@
+"""
+Regressão de planos (EXPLAIN) da tabela fato particionada e das queries da API.
+Precisa de um PostgreSQL de teste em DATABASE_URL: sem ele, o módulo é pulado.
+
+Tudo roda numa única transação desfeita no fim (schema, massa e ANALYZE).
+Com enable_seqscan = off o planner só cai em Seq Scan quando nenhum índice
+serve a query, então um Seq Scan no plano indica índice faltando ou não casando.
+"""
+import os
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    pytest.skip("DATABASE_URL não definida: testes de plano precisam de um PostgreSQL", allow_module_level=True)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CREATE_TABLES = os.path.join(RAIZ, "scripts_sql", "create_tables.sql")
+
+# Ano fora da faixa real da ANS: as partições de teste não colidem com as carregadas
+ANO = 2099
+QTD_OPERADORAS = 5000
+QTD_DESPESAS_POR_TRIMESTRE = 20000
+CNPJ_DUMMY = "00000000000000"
+CNPJ_ALVO = "00000000001234"
+
+
+@pytest.fixture(scope="module")
+def cursor():
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    try:
+        with open(CREATE_TABLES, "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+
+        cur.execute("""
+            INSERT INTO operadoras (registro_ans, cnpj, razao_social, uf, modalidade)
+            SELECT lpad(i::text, 6, '0'), lpad(i::text, 14, '0'),
+                   'OPERADORA ' || i || ' SAÚDE', (ARRAY['SP', 'RJ', 'MG', 'RS'])[i %% 4 + 1], 'Medicina de Grupo'
+            FROM generate_series(1, %s) AS i
+            ON CONFLICT (cnpj) DO NOTHING
+        """, (QTD_OPERADORAS,))
+        cur.execute("""
+            INSERT INTO operadoras (cnpj, razao_social, uf)
+            VALUES (%s, 'OPERADORA DESCONHECIDA / INATIVA', 'BR')
+            ON CONFLICT (cnpj) DO NOTHING
+        """, (CNPJ_DUMMY,))
+
+        for trimestre in (1, 2):
+            cur.execute("SELECT criar_particao_despesas(%s, %s)", (ANO, trimestre))
+            cur.execute("""
+                INSERT INTO despesas (cnpj_operadora, ano, trimestre, data_evento, cd_conta_contabil,
+                                      descricao, valor_despesa, codigo_origem)
+                SELECT lpad((i %% %s + 1)::text, 14, '0'), %s, %s, make_date(%s, %s * 3, 1), '41',
+                       'EVENTOS/SINISTROS', (i %% 1000) * 10.5, lpad((i %% %s + 1)::text, 6, '0')
+                FROM generate_series(1, %s) AS i
+            """, (QTD_OPERADORAS, ANO, trimestre, ANO, trimestre, QTD_OPERADORAS, QTD_DESPESAS_POR_TRIMESTRE))
+
+        cur.execute("""
+            INSERT INTO operadoras_atividade (cnpj, has_despesas, qtd_registros)
+            SELECT cnpj_operadora, TRUE, COUNT(*) FROM despesas WHERE ano = %s GROUP BY cnpj_operadora
+            ON CONFLICT (cnpj) DO NOTHING
+        """, (ANO,))
+        cur.execute("REFRESH MATERIALIZED VIEW despesas_trimestrais")
+        cur.execute("ANALYZE operadoras, despesas, operadoras_atividade, despesas_trimestrais")
+        cur.execute("SET LOCAL enable_seqscan = off")
+        yield cur
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+def _plano(cursor, sql, params=None):
+    """Nós do plano (EXPLAIN FORMAT JSON) achatados em lista."""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    raiz = cursor.fetchone()[0][0]["Plan"]
+    nos, pendentes = [], [raiz]
+    while pendentes:
+        no = pendentes.pop()
+        nos.append(no)
+        pendentes.extend(no.get("Plans", []))
+    return nos
+
+
+def _tabelas(nos):
+    return {no["Relation Name"] for no in nos if "Relation Name" in no}
+
+
+def _seq_scans_proibidos(nos):
+    """Seq Scans em operadoras, nas partições de despesas ou no rollup despesas_trimestrais."""
+    return [
+        no["Relation Name"] for no in nos
+        if no["Node Type"] == "Seq Scan"
+        and (no["Relation Name"] == "operadoras" or no["Relation Name"].startswith("despesas_"))
+    ]
+
+
+def test_filtro_por_trimestre_le_uma_particao(cursor):
+    nos = _plano(cursor, "SELECT SUM(valor_despesa) FROM despesas WHERE ano = %s AND trimestre = %s", (ANO, 1))
+
+    particoes = {t for t in _tabelas(nos) if t.startswith("despesas_")}
+    assert particoes == {f"despesas_{ANO}_t1"}
+    assert _seq_scans_proibidos(nos) == []
+
+
+def test_despesas_de_uma_operadora_no_trimestre_usa_indice(cursor):
+    nos = _plano(cursor, """
+        SELECT data_evento, valor_despesa FROM despesas
+        WHERE cnpj_operadora = %s AND ano = %s AND trimestre = %s
+    """, (CNPJ_ALVO, ANO, 2))
+
+    assert {t for t in _tabelas(nos) if t.startswith("despesas_")} == {f"despesas_{ANO}_t2"}
+    assert _seq_scans_proibidos(nos) == []
+
+
+def test_checagem_da_fk_por_operadora_usa_indice_em_todas_as_particoes(cursor):
+    # Mesma forma da query que o PostgreSQL roda ao alterar/remover uma operadora
+    nos = _plano(cursor, "SELECT 1 FROM despesas WHERE cnpj_operadora = %s", (CNPJ_ALVO,))
+
+    assert _seq_scans_proibidos(nos) == []
+
+
+@pytest.mark.parametrize("sql, params", [
+    # detail
+    ("SELECT * FROM operadoras WHERE cnpj = %s", (CNPJ_ALVO,)),
+    # busca por prefixo de CNPJ / Registro ANS (idx_ops_cnpj_prefix / idx_ops_registro_prefix)
+    ("""SELECT cnpj, razao_social, uf, modalidade FROM operadoras
+        WHERE (cnpj LIKE %s OR registro_ans LIKE %s) ORDER BY razao_social ASC LIMIT 10 OFFSET 0""",
+     ("0000000000123%", "00123%")),
+    # busca textual sem acento (idx_ops_razao_trgm)
+    ("""SELECT COUNT(*) as total FROM operadoras
+        WHERE f_unaccent(lower(razao_social)) LIKE f_unaccent(lower(%s))""",
+     ("%1234 saude%",)),
+    # página offset padrão (idx_ops_razao)
+    ("""SELECT cnpj, razao_social, uf, modalidade FROM operadoras
+        ORDER BY razao_social ASC LIMIT 10 OFFSET 100""", None),
+    # página keyset com cursor (idx_ops_keyset)
+    ("""SELECT cnpj, razao_social, uf, modalidade FROM operadoras
+        WHERE (COALESCE(razao_social, ''), cnpj) > (%s, %s)
+        ORDER BY COALESCE(razao_social, '') ASC, cnpj ASC LIMIT 11""",
+     ("OPERADORA 2000 SAÚDE", "00000000002000")),
+    # página keyset por UF (idx_ops_uf_keyset)
+    ("""SELECT cnpj, razao_social, uf, modalidade FROM operadoras
+        WHERE (COALESCE(uf, ''), COALESCE(razao_social, ''), cnpj) > (%s, %s, %s)
+        ORDER BY COALESCE(uf, '') ASC, COALESCE(razao_social, '') ASC, cnpj ASC LIMIT 11""",
+     ("RJ", "OPERADORA 2000 SAÚDE", "00000000002000")),
+    # filtro com_dados (operadoras_atividade) + busca por prefixo
+    ("""SELECT COUNT(*) as total FROM operadoras
+        WHERE (cnpj LIKE %s OR registro_ans LIKE %s)
+        AND EXISTS (SELECT 1 FROM operadoras_atividade a WHERE a.cnpj = operadoras.cnpj AND a.has_despesas)
+        AND cnpj != %s""",
+     ("0000000000123%", "00123%", CNPJ_DUMMY)),
+    # detail_despesas (rollup, idx_rollup_pk)
+    ("""SELECT ano, trimestre, SUM(valor_total) as valor_despesa FROM despesas_trimestrais
+        WHERE cnpj_operadora = %s GROUP BY ano, trimestre ORDER BY ano DESC, trimestre DESC""",
+     (CNPJ_ALVO,)),
+], ids=["detail", "busca_prefixo", "busca_texto", "page", "page_keyset", "page_keyset_uf",
+        "count_com_dados", "detail_despesas"])
+def test_queries_da_api_sem_seq_scan(cursor, sql, params):
+    nos = _plano(cursor, sql, params)
+
+    assert _seq_scans_proibidos(nos) == []
@@ -0,0 +1,97 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # TestClient
+pytest.importorskip("psycopg2")
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from app.api import metrics
+
+
+@pytest.fixture
+def cliente():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricasMiddleware)
+
+    @app.get("/itens/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    @app.get("/metrics")
+    async def metricas():
+        return PlainTextResponse(metrics.registro.renderizar(), media_type=metrics.CONTENT_TYPE)
+
+    return TestClient(app)
+
+
+def _linhas(cliente):
+    resposta = cliente.get("/metrics")
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"] == metrics.CONTENT_TYPE
+    return resposta.text.splitlines()
+
+
+def _valor(linhas, prefixo):
+    for linha in linhas:
+        if linha.startswith(prefixo + " "):
+            return float(linha.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_rota_e_exposta_pelo_template_com_contador_e_histograma(cliente):
+    contagem = 'http_requests_total{method="GET",route="/itens/{item_id}",status="200"}'
+    bucket_inf = 'http_request_duration_seconds_bucket{method="GET",route="/itens/{item_id}",le="+Inf"}'
+    antes = _linhas(cliente)
+
+    for item_id in ("1", "2", "abc"):
+        assert cliente.get(f"/itens/{item_id}").status_code == 200
+    linhas = _linhas(cliente)
+
+    assert "# TYPE http_requests_total counter" in linhas
+    assert "# TYPE http_request_duration_seconds histogram" in linhas
+    assert _valor(linhas, contagem) - _valor(antes, contagem) == 3
+    assert _valor(linhas, bucket_inf) - _valor(antes, bucket_inf) == 3
+    # Buckets cumulativos: cada limite conta pelo menos o anterior
+    buckets = [_valor(linhas, f'http_request_duration_seconds_bucket{{method="GET",route="/itens/{{item_id}}",le="{le}"}}')
+               for le in (repr(float(b)) for b in metrics.BUCKETS_LATENCIA)]
+    assert buckets == sorted(buckets)
+    assert not any('route="/itens/1"' in linha for linha in linhas)
+
+
+def test_caminho_sem_rota_nao_cria_serie_por_url(cliente):
+    assert cliente.get("/nao/existe").status_code == 404
+
+    linhas = _linhas(cliente)
+    assert any('route="<sem_rota>",status="404"' in linha for linha in linhas)
+    assert not any("/nao/existe" in linha for linha in linhas)
+
+
+def test_eventos_acumulados_sao_contadores(cliente):
+    linhas = _linhas(cliente)
+
+    assert "# TYPE db_pool_events_total counter" in linhas
+    assert "# TYPE db_query_duration_seconds histogram" in linhas
+
+
+def test_observar_query_alimenta_latencia_linhas_e_erros(cliente):
+    metrics.observar_query("teste_bench", espera=0.001, duracao=0.02, linhas=3)
+    metrics.observar_query("teste_bench", espera=None, duracao=0.3, erro=True)
+    linhas = _linhas(cliente)
+
+    assert _valor(linhas, 'db_query_duration_seconds_bucket{query="teste_bench",le="0.025"}') == 1
+    assert _valor(linhas, 'db_query_duration_seconds_count{query="teste_bench"}') == 2
+    assert _valor(linhas, 'db_query_rows_bucket{query="teste_bench",le="5.0"}') == 1
+    assert _valor(linhas, 'db_query_errors_total{query="teste_bench"}') == 1
+
+
+def test_template_da_rota_e_resolvido_uma_vez_por_caminho(monkeypatch):
+    middleware = metrics.MetricasMiddleware(app=None)
+    chamadas = []
+    monkeypatch.setattr(middleware, "_resolver_rota", lambda scope: chamadas.append(scope["path"]) or "/x")
+    scope = {"type": "http", "method": "GET", "path": "/itens/9"}
+
+    assert middleware._rota(scope) == middleware._rota(scope) == "/x"
+    assert chamadas == ["/itens/9"]
@@ -0,0 +1,132 @@
+import os
+import time
+
+import pytest
+
+from app.services.pipeline_dag import PipelineDAG, Tarefa
+
+
+def _registrar(chamadas, nome, retorno=None):
+    def funcao(resultados):
+        chamadas.append(nome)
+        return retorno
+    return funcao
+
+
+def _explodir(resultados):
+    raise RuntimeError("falha simulada")
+
+
+@pytest.mark.parametrize("falha", [lambda r: False, _explodir])
+def test_falha_upstream_cancela_dependentes(falha):
+    chamadas = []
+    dag = PipelineDAG([
+        Tarefa("transformar", falha),
+        Tarefa("operadoras", _registrar(chamadas, "operadoras")),
+        Tarefa("fatos", _registrar(chamadas, "fatos"), depende=["transformar", "operadoras"]),
+        Tarefa("depois", _registrar(chamadas, "depois"), depende=["fatos"]),
+    ], max_workers=2)
+
+    assert dag.executar() is False
+    assert dag.status["transformar"] == PipelineDAG.FALHOU
+    assert dag.status["operadoras"] == PipelineDAG.OK
+    assert dag.status["fatos"] == PipelineDAG.CANCELADA
+    assert dag.status["depois"] == PipelineDAG.CANCELADA
+    # Só a tarefa independente rodou
+    assert chamadas == ["operadoras"]
+
+
+def test_resultados_chegam_as_dependentes():
+    dag = PipelineDAG([
+        Tarefa("a", lambda r: 2),
+        Tarefa("b", lambda r: 3),
+        Tarefa("soma", lambda r: r["a"] + r["b"], depende=["a", "b"]),
+    ])
+    assert dag.executar() is True
+    assert dag.resultados["soma"] == 5
+
+
+def test_ciclo_e_dependencia_inexistente():
+    with pytest.raises(ValueError):
+        PipelineDAG([Tarefa("a", lambda r: 1, depende=["b"]), Tarefa("b", lambda r: 1, depende=["a"])])
+    with pytest.raises(ValueError):
+        PipelineDAG([Tarefa("a", lambda r: 1, depende=["x"])])
+
+
+def test_pipeline_nao_carrega_fatos_quando_etapa2_falha(monkeypatch, tmp_path):
+    # ANSService importa a Etapa 3 (psycopg2)
+    pytest.importorskip("psycopg2")
+    from app.services import ans_service
+    from app.services.ans_service import ANSService
+
+    chamadas = []
+    monkeypatch.setattr(ans_service.Step1ETL, "baixar_zips", classmethod(lambda cls: []))
+    monkeypatch.setattr(ans_service.Step1ETL, "consolidar", classmethod(lambda cls, zips: None))
+    # A tarefa "consolidar" confere se a Etapa 1 deixou o consolidado no disco
+    monkeypatch.setattr(ans_service.Step1ETL, "PARQUET_CONSOLIDADO", str(tmp_path))
+    monkeypatch.setattr(ans_service.ANSScraper, "baixar_cadop",
+                        classmethod(lambda cls, d, u: "Relatorio_Cadop.csv"))
+    monkeypatch.setattr(ans_service.CadopIndex, "carregar", classmethod(lambda cls, caminho: None))
+    monkeypatch.setattr(ans_service.Step2Transformation, "execute",
+                        classmethod(lambda cls, caminho_cadop=None: False))
+    monkeypatch.setattr(ans_service.Step3DBIngestion, "preparar_banco", classmethod(lambda cls: True))
+    monkeypatch.setattr(ans_service.Step3DBIngestion, "processar_e_inserir_operadoras",
+                        classmethod(lambda cls: chamadas.append("operadoras") or True))
+    monkeypatch.setattr(ans_service.Step3DBIngestion, "carregar_fatos",
+                        classmethod(lambda cls: chamadas.append("fatos") or True))
+
+    dag = PipelineDAG(ANSService.montar_tarefas())
+    assert dag.executar() is False
+    assert dag.status["transformar"] == PipelineDAG.FALHOU
+    assert dag.status["fatos"] == PipelineDAG.CANCELADA
+    assert chamadas == ["operadoras"]
+
+
+def _tocar(caminho, mtime):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w') as f:
+        f.write("x")
+    os.utime(caminho, (mtime, mtime))
+
+
+def test_pula_tarefa_apos_troca_incremental_de_particao(tmp_path):
+    entrada = tmp_path / "consolidado"
+    saida = tmp_path / "enriquecido"
+    chamadas = []
+
+    def transformar(resultados):
+        chamadas.append("transformar")
+        # Só a partição alterada é regravada; a antiga mantém o mtime antigo
+        _tocar(str(saida / "ANO=2025" / "TRIMESTRE=2" / "parte.parquet"), time.time())
+
+    def montar():
+        return PipelineDAG(
+            [Tarefa("transformar", transformar, entradas=[str(entrada)], saidas=[str(saida)])],
+            dir_carimbos=str(tmp_path / ".carimbos"))
+
+    antigo = time.time() - 3600
+    _tocar(str(entrada / "ANO=2025" / "TRIMESTRE=1" / "parte.parquet"), antigo)
+    _tocar(str(saida / "ANO=2025" / "TRIMESTRE=1" / "parte.parquet"), antigo - 10)
+    for raiz, _, _ in os.walk(tmp_path):
+        os.utime(raiz, (antigo, antigo))
+
+    # 1ª execução: sem carimbo, roda
+    montar().executar()
+    # Consolidado muda (novo trimestre): roda de novo
+    _tocar(str(entrada / "ANO=2025" / "TRIMESTRE=2" / "parte.parquet"), time.time())
+    montar().executar()
+    # Nada mudou: pulada, mesmo com a partição de 1T mais antiga que as entradas
+    dag = montar()
+    dag.executar()
+
+    assert chamadas == ["transformar", "transformar"]
+    assert dag.status["transformar"] == PipelineDAG.PULADA
+
+
+def test_sem_dir_carimbos_nunca_pula(tmp_path):
+    entrada, saida = tmp_path / "in.csv", tmp_path / "out.csv"
+    _tocar(str(entrada), time.time() - 60)
+    _tocar(str(saida), time.time())
+    dag = PipelineDAG([Tarefa("t", lambda r: None, entradas=[str(entrada)], saidas=[str(saida)])])
+    dag.executar()
+    assert dag.status["t"] == PipelineDAG.OK
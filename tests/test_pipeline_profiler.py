@@ -0,0 +1,152 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from app.services.pipeline_profiler import PipelineProfiler
+
+CAMPOS_ETAPA = {
+    'etapa', 'thread', 'status', 'erro', 'chamadas', 'inicio_s', 'duracao_s',
+    'cpu_thread_s', 'cpu_processo_s', 'cpu_filhos_s', 'rss_inicio_mb', 'rss_fim_mb',
+    'pico_rss_processo_mb', 'pico_tracemalloc_mb', 'linhas_entrada', 'linhas_saida',
+    'bytes_lidos', 'bytes_gravados', 'extras',
+}
+
+
+@pytest.fixture(autouse=True)
+def execucao(monkeypatch, tmp_path):
+    monkeypatch.setattr(PipelineProfiler, "ATIVO", True)
+    monkeypatch.setattr(PipelineProfiler, "TRACEMALLOC", False)
+    monkeypatch.setattr(PipelineProfiler, "DUMP", "")
+    # Estado da execução é de classe: restaurado no fim para não vazar para outros testes
+    for atributo in ("_medicoes", "_agregadas", "_abertas", "_execucao_id", "_inicio_execucao",
+                     "_inicio_wall", "_data_dir", "_dump_execucao"):
+        monkeypatch.setattr(PipelineProfiler, atributo, getattr(PipelineProfiler, atributo))
+    PipelineProfiler.iniciar_execucao(str(tmp_path))
+    return tmp_path
+
+
+def _etapas():
+    return {e['etapa']: e for e in PipelineProfiler.relatorio()['etapas']}
+
+
+def test_etapas_aninhadas_viram_caminhos():
+    with PipelineProfiler.etapa("consolidar"):
+        with PipelineProfiler.etapa("extracao") as m:
+            m.contar(entrada=10, saida=4, lidos=100)
+            with PipelineProfiler.etapa("filtro_411"):
+                pass
+    with PipelineProfiler.etapa("transformar"):
+        pass
+
+    etapas = _etapas()
+    assert set(etapas) == {"consolidar", "consolidar/extracao", "consolidar/extracao/filtro_411", "transformar"}
+    extracao = etapas["consolidar/extracao"]
+    assert (extracao['linhas_entrada'], extracao['linhas_saida'], extracao['bytes_lidos']) == (10, 4, 100)
+    assert etapas["consolidar"]['duracao_s'] >= extracao['duracao_s']
+
+
+def test_agregar_soma_as_chamadas_numa_linha_so():
+    with PipelineProfiler.etapa("consolidar"):
+        for tamanho in (3, 5, 7):
+            with PipelineProfiler.etapa("chunk", agregar=True) as m:
+                m.contar(entrada=tamanho, saida=1)
+        for _ in range(2):
+            with PipelineProfiler.etapa("sem_agregar"):
+                pass
+
+    relatorio = PipelineProfiler.relatorio()['etapas']
+    chunks = [e for e in relatorio if e['etapa'] == "consolidar/chunk"]
+    assert len(chunks) == 1
+    assert (chunks[0]['chamadas'], chunks[0]['linhas_entrada'], chunks[0]['linhas_saida']) == (3, 15, 3)
+    assert len([e for e in relatorio if e['etapa'] == "consolidar/sem_agregar"]) == 2
+
+
+def test_iterar_mede_so_a_producao_dos_itens():
+    blocos = [[1, 2], [3], [4, 5, 6]]
+    consumidos = []
+    with PipelineProfiler.etapa("consolidar"):
+        for bloco in PipelineProfiler.iterar("leitura", iter(blocos)):
+            # O consumo fica fora da medição de leitura, mas dentro da etapa externa
+            with PipelineProfiler.etapa("processar", agregar=True):
+                consumidos.append(bloco)
+
+    etapas = _etapas()
+    assert consumidos == blocos
+    leitura = etapas["consolidar/leitura"]
+    assert leitura['extras'] == {'itens': 3}
+    assert leitura['linhas_saida'] == 6
+    # Uma chamada por item + a que encontra o fim do gerador
+    assert leitura['chamadas'] == 4
+    # "processar" é irmã de "leitura", não filha
+    assert etapas["consolidar/processar"]['chamadas'] == 3
+
+
+def test_erro_marca_a_etapa_e_propaga():
+    with pytest.raises(ValueError):
+        with PipelineProfiler.etapa("falha"):
+            raise ValueError("arquivo corrompido")
+
+    etapa = _etapas()["falha"]
+    assert (etapa['status'], etapa['erro']) == ("erro", "ValueError: arquivo corrompido")
+
+
+def test_etapa_em_outra_thread_nao_herda_a_pilha():
+    def trabalho():
+        with PipelineProfiler.etapa("paralela"):
+            pass
+
+    with PipelineProfiler.etapa("principal"):
+        thread = threading.Thread(target=trabalho)
+        thread.start()
+        thread.join()
+
+    assert set(_etapas()) == {"principal", "paralela"}
+
+
+def test_relatorio_json_tem_o_formato_esperado(execucao):
+    with PipelineProfiler.etapa("consolidar") as m:
+        m.extras['zips'] = 2
+
+    caminho = PipelineProfiler.salvar_relatorio()
+
+    assert os.path.dirname(caminho) == str(execucao / PipelineProfiler.PASTA_RELATORIOS)
+    with open(caminho, encoding='utf-8') as f:
+        relatorio = json.load(f)
+    with open(os.path.join(os.path.dirname(caminho), "pipeline_ultimo.json"), encoding='utf-8') as f:
+        assert json.load(f) == relatorio
+    assert set(relatorio) == {'execucao_id', 'inicio', 'duracao_s', 'python', 'pid', 'config', 'etapas'}
+    assert set(relatorio['config']) == {
+        'dump', 'tracemalloc', 'pipeline_incremental', 'pipeline_workers', 'etl_workers'}
+    assert len(relatorio['etapas']) == 1
+    etapa = relatorio['etapas'][0]
+    assert set(etapa) == CAMPOS_ETAPA
+    assert (etapa['etapa'], etapa['chamadas'], etapa['extras']) == ("consolidar", 1, {'zips': 2})
+
+
+def test_pyinstrument_ausente_desliga_o_dump_so_na_execucao(monkeypatch, execucao):
+    monkeypatch.setattr(PipelineProfiler, "DUMP", "pyinstrument")
+    # None em sys.modules faz o import falhar com ImportError
+    monkeypatch.setitem(sys.modules, "pyinstrument", None)
+    PipelineProfiler.iniciar_execucao(str(execucao))
+
+    with PipelineProfiler.etapa("consolidar"):
+        pass
+
+    assert PipelineProfiler.DUMP == "pyinstrument"
+    assert PipelineProfiler.relatorio()['config']['dump'] is None
+    assert not os.path.exists(execucao / PipelineProfiler.PASTA_RELATORIOS / "perfis")
+
+
+def test_dump_cprofile_por_etapa_de_primeiro_nivel(monkeypatch, execucao):
+    monkeypatch.setattr(PipelineProfiler, "DUMP", "cprofile")
+    execucao_id = PipelineProfiler.iniciar_execucao(str(execucao))
+
+    with PipelineProfiler.etapa("consolidar"):
+        with PipelineProfiler.etapa("extracao"):
+            sum(range(1000))
+
+    pasta = execucao / PipelineProfiler.PASTA_RELATORIOS / "perfis" / execucao_id
+    assert os.listdir(pasta) == ["consolidar.prof"]
@@ -0,0 +1,114 @@
+import re
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from app.services.step3_db_ingestion import Step3DBIngestion
+
+
+def _preparar_fatos_apply(df_desp):
+    """Referência: a montagem original da tabela fato, com apply por linha."""
+    df_desp = df_desp.copy()
+    df_desp['cnpj_operadora'] = df_desp['CNPJ'].str.replace(r'\D', '', regex=True).str.zfill(14)
+    if pd.api.types.is_numeric_dtype(df_desp['VALORDESPESAS']):
+        df_desp['valor_despesa'] = df_desp['VALORDESPESAS']
+    else:
+        df_desp['valor_despesa'] = pd.to_numeric(df_desp['VALORDESPESAS'].str.replace(',', '.'), errors='coerce')
+    df_desp['ANO'] = pd.to_numeric(df_desp['ANO'], errors='coerce').fillna(0).astype(int)
+    df_desp['TRIMESTRE'] = pd.to_numeric(df_desp['TRIMESTRE'], errors='coerce').fillna(1).astype(int)
+
+    def get_data(row):
+        try:
+            mes = int(row['TRIMESTRE']) * 3 - 2
+            return f"{int(row['ANO']):04d}-{mes:02d}-01"
+        except Exception:
+            return None
+
+    df_desp['data_evento'] = df_desp.apply(get_data, axis=1)
+    df_desp = df_desp.dropna(subset=['data_evento'])
+
+    df_final = pd.DataFrame()
+    df_final['data_evento'] = df_desp['data_evento']
+    df_final['cnpj_operadora'] = df_desp['cnpj_operadora']
+    df_final['cd_conta_contabil'] = df_desp.get('CONTA', '411')
+    df_final['descricao'] = df_desp.get('DESCRICAO', 'Despesa Assistencial')
+    df_final['valor_despesa'] = df_desp['valor_despesa']
+    df_final['ano'] = df_desp['ANO']
+    df_final['trimestre'] = df_desp['TRIMESTRE']
+    df_final['codigo_origem'] = df_desp['cnpj_operadora'].str.lstrip('0')
+    return df_final
+
+
+def _despesas(**extras):
+    df = pd.DataFrame({
+        'CNPJ': ['12.345.678/0001-90', '419', '419', None, '00.000.000/0001-91', '123', '123', '77'],
+        'ANO': ['2024', '2024', 'abc', '2023', '', '2025', '2025', '2024'],
+        'TRIMESTRE': ['1', '4', '2', '5', '3', 'x', '0', '2'],
+        'VALORDESPESAS': ['10,50', '3.25', '1,0', '7', 'n/d', '2,5', '4', '-1,75'],
+    })
+    for coluna, valores in extras.items():
+        df[coluna] = valores
+    return df
+
+
+def _data_aceita_pelo_banco(texto):
+    partes = re.fullmatch(r'(\d{4})-(\d{2})-01', texto)
+    return bool(partes) and int(partes[1]) >= 1 and 1 <= int(partes[2]) <= 12
+
+
+def _comparar(df_desp):
+    antigo = _preparar_fatos_apply(df_desp)
+    novo = Step3DBIngestion._preparar_fatos(df_desp)
+
+    # O apply gerava texto para qualquer ano/trimestre ("0000-01-01", "2023-13-01", "2025--2-01"),
+    # que o PostgreSQL rejeitava no COPY; a versão vetorizada descarta essas linhas antes
+    esperado = antigo[antigo['data_evento'].map(_data_aceita_pelo_banco)]
+
+    assert list(novo.columns) == list(esperado.columns)
+    assert novo.index.tolist() == esperado.index.tolist()
+    assert novo['data_evento'].dt.strftime('%Y-%m-%d').tolist() == esperado['data_evento'].tolist()
+    pd.testing.assert_frame_equal(
+        novo.drop(columns='data_evento').astype(object), esperado.drop(columns='data_evento').astype(object))
+    return novo
+
+
+def test_ano_e_trimestre_invalidos_sao_descartados():
+    novo = _comparar(_despesas())
+
+    # Linhas 2 (ano "abc"), 3 (trimestre 5), 4 (ano vazio) e 6 (trimestre 0) saem;
+    # trimestre "x" vira 1, como no apply
+    assert novo.index.tolist() == [0, 1, 5, 7]
+    assert novo.loc[5, 'trimestre'] == 1
+    assert novo['cnpj_operadora'].tolist() == ['12345678000190', '00000000000419', '00000000000123',
+                                               '00000000000077']
+    assert novo['codigo_origem'].tolist() == ['12345678000190', '419', '123', '77']
+
+
+def test_sem_conta_e_descricao_usa_os_valores_padrao():
+    novo = _comparar(_despesas())
+
+    assert set(novo['cd_conta_contabil']) == {'411'}
+    assert set(novo['descricao']) == {'Despesa Assistencial'}
+
+
+def test_conta_e_descricao_do_arquivo_sao_mantidas():
+    contas = ['411', '4111', '41111', '411', '411', '4119', '411', '41']
+    descricoes = [f"EVENTO {i}" for i in range(8)]
+    novo = _comparar(_despesas(CONTA=contas, DESCRICAO=descricoes))
+
+    assert novo['cd_conta_contabil'].tolist() == ['411', '4111', '4119', '41']
+    assert novo['descricao'].tolist() == ['EVENTO 0', 'EVENTO 1', 'EVENTO 5', 'EVENTO 7']
+
+
+def test_colunas_tipadas_do_parquet():
+    df = _despesas()
+    df['ANO'] = pd.array([2024, 2024, None, 2023, 2022, 2025, 2025, 2024], dtype='Int64')
+    df['TRIMESTRE'] = pd.array([1, 4, 2, 5, 3, None, 0, 2], dtype='Int64')
+    df['VALORDESPESAS'] = [10.5, 3.25, 1.0, 7.0, None, 2.5, 4.0, -1.75]
+
+    novo = _comparar(df)
+
+    assert novo.index.tolist() == [0, 1, 4, 5, 7]
+    assert novo['valor_despesa'].tolist()[:2] == [10.5, 3.25]
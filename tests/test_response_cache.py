@@ -0,0 +1,16 @@
+from app.api.cache import ResponseCache
+
+
+def test_troca_de_versao_invalida_a_entrada_antiga():
+    cache = ResponseCache(ttl=60)
+    cache.set("estatisticas", 1, {"total": 10})
+    assert cache.get("estatisticas", 1)["payload"] == {"total": 10}
+
+    # Mesmo fluxo de obter_estatisticas quando a Etapa 3 incrementa data_version
+    assert cache.versao_em_cache("estatisticas") == 1
+    cache.invalidate("estatisticas")
+
+    assert cache.versao_em_cache("estatisticas") is None
+    assert cache.get("estatisticas", 2) is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["invalidations"]) == (0, 1, 1, 1)